@@ -67,10 +67,21 @@ def create_app(config_name=None):
     app.register_blueprint(nutritionist_bp)
     app.register_blueprint(patient_meal_plan_bp)
     
+    # Register admin routes (ADMIN_UIDS only)
+    from .routes.admin import admin_bp
+    app.register_blueprint(admin_bp)
+    
     # Register public routes (no authentication required)
     from .routes.public import public_bp
     app.register_blueprint(public_bp)
     
+    # Register background job handlers and catalog change listeners
+    from .services import plan_repair  # noqa: F401
+    
+    # Register CLI commands (flask plans ...)
+    from .commands import register_commands
+    register_commands(app)
+    
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
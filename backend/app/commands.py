@@ -0,0 +1,132 @@
+"""
+Flask CLI commands for scheduled maintenance (cron-friendly).
+
+Usage:
+    flask --app "app:create_app" plans rollover --within-days 3
+    flask --app "app:create_app" plans regenerate --workers 8
+    flask --app "app:create_app" catalog coverage --max-subset-size 2
+"""
+import json
+
+import click
+from flask import Flask
+from flask.cli import AppGroup
+
+plans_cli = AppGroup('plans', help='Meal plan maintenance commands.')
+catalog_cli = AppGroup('catalog', help='Recipe catalog reports.')
+
+
+@plans_cli.command('rollover')
+@click.option('--within-days', default=3, show_default=True, help='Roll over approved plans ending within N days.')
+@click.option('--chunk-size', default=100, show_default=True, help='Patients per transaction.')
+@click.option('--pause', 'pause_seconds', default=0.5, show_default=True, help='Seconds to sleep between chunks.')
+@click.option('--max-plans', type=int, default=None, help='Stop after checking this many plans.')
+@click.option('--after-patient-id', default=0, show_default=True, help='Resume after this patient id.')
+@click.option('--dry-run', is_flag=True, help='Only count the plans that are due.')
+@click.option('--json', 'as_json', is_flag=True, help='Print the summary as JSON.')
+def rollover_command(within_days, chunk_size, pause_seconds, max_plans, after_patient_id, dry_run, as_json):
+    """Pre-generate draft successor plans for patients whose plan is ending."""
+    from app.services.plan_rollover import plan_rollover_service
+
+    def report_progress(summary):
+        if not as_json:
+            click.echo(
+                f"  chunk {summary['chunks']}: checked {summary['checked']}, "
+                f"generated {summary['generated']}, failed {summary['failed']} "
+                f"(last patient {summary['last_patient_id']})"
+            )
+
+    summary = plan_rollover_service.rollover(
+        within_days=within_days,
+        chunk_size=chunk_size,
+        pause_seconds=pause_seconds,
+        max_plans=max_plans,
+        after_patient_id=after_patient_id,
+        dry_run=dry_run,
+        progress=report_progress
+    )
+
+    if as_json:
+        click.echo(json.dumps(summary, indent=2))
+        return
+
+    click.echo(f"{'🔍 Dry run' if dry_run else '✅ Rollover complete'}: {summary['checked']} plans due")
+    click.echo(f"   Generated: {summary['generated']}  Failed: {summary['failed']}  "
+               f"Elapsed: {summary['elapsed_seconds']}s")
+    for patient_id, error in summary['errors'].items():
+        click.echo(f"   ❌ Patient {patient_id}: {error}")
+    if max_plans is not None and summary['checked'] >= max_plans:
+        click.echo(f"ℹ️  Resume with --after-patient-id {summary['last_patient_id']}")
+
+
+@plans_cli.command('regenerate')
+@click.option('--workers', type=int, default=None, help='Worker processes (default: CPU count; 1 runs in-process).')
+@click.option('--patient-id', 'patient_ids', type=int, multiple=True, help='Only regenerate these patients.')
+@click.option('--shard-size', default=250, show_default=True, help='Plans per worker task.')
+@click.option('--chunk-size', default=500, show_default=True, help='Plans per transaction.')
+@click.option('--seed', type=int, default=None, help='Random seed for reproducible plans.')
+@click.option('--dry-run', is_flag=True, help='Only count the plans that would be regenerated.')
+@click.option('--json', 'as_json', is_flag=True, help='Print the summary as JSON.')
+def regenerate_command(workers, patient_ids, shard_size, chunk_size, seed, dry_run, as_json):
+    """Regenerate the latest plan of every active patient as a new draft version."""
+    from app.services.plan_regeneration import plan_regeneration_service
+
+    def report_progress(summary):
+        if not as_json:
+            click.echo(f"  saved {summary['generated']} plans, failed {summary['failed']}")
+
+    summary = plan_regeneration_service.regenerate(
+        patient_ids=patient_ids or None,
+        workers=workers,
+        shard_size=shard_size,
+        chunk_size=chunk_size,
+        seed=seed,
+        dry_run=dry_run,
+        progress=report_progress
+    )
+
+    if as_json:
+        click.echo(json.dumps(summary, indent=2))
+        return
+
+    click.echo(f"{'🔍 Dry run' if dry_run else '✅ Regeneration complete'}: {summary['checked']} plans checked "
+               f"({summary['restriction_groups']} restriction groups, {summary['shards']} shards, "
+               f"{summary['workers']} workers)")
+    click.echo(f"   Generated: {summary['generated']}  Failed: {summary['failed']}  "
+               f"Elapsed: {summary['elapsed_seconds']}s (writes {summary['persist_seconds']}s)")
+    for patient_id, error in summary['errors'].items():
+        click.echo(f"   ❌ Patient {patient_id}: {error}")
+
+
+@catalog_cli.command('coverage')
+@click.option('--max-subset-size', default=0, show_default=True,
+              help='Also check every combination of up to N restrictions.')
+@click.option('--required-per-type', type=int, default=None, help='Recipes needed per meal type (default: weekly plan).')
+@click.option('--limit', default=50, show_default=True, help='Combinations to print (0 prints all).')
+@click.option('--json', 'as_json', is_flag=True, help='Print the full report as JSON.')
+def coverage_command(max_subset_size, required_per_type, limit, as_json):
+    """Report restriction combinations without enough compatible recipes."""
+    from app.services.catalog_coverage import catalog_coverage_analyzer
+
+    report = catalog_coverage_analyzer.analyze(
+        max_subset_size=max_subset_size,
+        required_per_type=required_per_type
+    )
+
+    if as_json:
+        click.echo(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+
+    click.echo(f"{'✅' if not report['uncovered'] else '⚠️ '} {report['uncovered']} of "
+               f"{report['combinations_checked']} combinations have fewer than {report['required_per_type']} "
+               f"recipes for some meal type ({report['uncovered_patients']} patients affected, "
+               f"{report['elapsed_seconds']}s)")
+    for entry in report['combinations'][:limit or None]:
+        counts = ', '.join(f"{meal_type} {count}" for meal_type, count in entry['recipe_counts'].items())
+        click.echo(f"   {entry['patients']:>5} patients  [{counts}]  {' + '.join(entry['restrictions']) or 'no restrictions'}")
+
+
+def register_commands(app: Flask):
+    """Register CLI command groups on the app."""
+    app.cli.add_command(plans_cli)
+    app.cli.add_command(catalog_cli)
@@ -16,6 +16,41 @@ class Config:
     FIREBASE_SERVICE_ACCOUNT_BASE64 = os.getenv('FIREBASE_SERVICE_ACCOUNT_BASE64')
     FIREBASE_SERVICE_ACCOUNT_FILE = os.getenv('FIREBASE_SERVICE_ACCOUNT_FILE', 'serviceAccountKey.json')
     
+    # Recipe catalog indexes (seconds between cross-process change checks)
+    CATALOG_VERSION_TTL = float(os.getenv('CATALOG_VERSION_TTL', 5))
+    COMPATIBLE_RECIPE_CACHE_SIZE = int(os.getenv('COMPATIBLE_RECIPE_CACHE_SIZE', 256))
+    # Directory where the recipe snapshot is published as .npy files that every worker
+    # memory-maps read-only (unset keeps a private in-memory copy per process)
+    RECIPE_SNAPSHOT_DIR = os.getenv('RECIPE_SNAPSHOT_DIR')
+    RECIPE_SNAPSHOT_KEEP = int(os.getenv('RECIPE_SNAPSHOT_KEEP', 3))
+    
+    # Rendered public meal plan views ('memory' per process, 'redis' shared via PUBLIC_PLAN_CACHE_URL, 'none');
+    # use 'redis' with several workers so tag invalidation reaches every process
+    PUBLIC_PLAN_CACHE_BACKEND = os.getenv('PUBLIC_PLAN_CACHE_BACKEND', 'memory')
+    PUBLIC_PLAN_CACHE_URL = os.getenv('PUBLIC_PLAN_CACHE_URL', os.getenv('REDIS_URL'))
+    PUBLIC_PLAN_CACHE_SIZE = int(os.getenv('PUBLIC_PLAN_CACHE_SIZE', 1024))
+    PUBLIC_PLAN_CACHE_TTL = float(os.getenv('PUBLIC_PLAN_CACHE_TTL', 24 * 3600))
+    
+    # Meal plan generation ('optimized' targets daily macros, 'random' shuffles)
+    MEAL_PLAN_DISTRIBUTION_MODE = os.getenv('MEAL_PLAN_DISTRIBUTION_MODE', 'optimized')
+    MEAL_PLAN_OPTIMIZER_BUDGET_MS = float(os.getenv('MEAL_PLAN_OPTIMIZER_BUDGET_MS', 50))
+    # A recipe is not repeated within this many days in plans longer than a week
+    MEAL_PLAN_NO_REPEAT_DAYS = int(os.getenv('MEAL_PLAN_NO_REPEAT_DAYS', 7))
+    
+    # Background jobs ('thread' runs them in-process, 'worker' leaves them to run_worker.py,
+    # 'inline' runs them inside the request; serverless deployments cannot keep threads alive)
+    JOB_QUEUE_MODE = os.getenv('JOB_QUEUE_MODE', 'inline' if os.getenv('VERCEL') else 'thread')
+    JOB_QUEUE_THREADS = int(os.getenv('JOB_QUEUE_THREADS', 2))
+    JOB_RETRY_BASE_SECONDS = float(os.getenv('JOB_RETRY_BASE_SECONDS', 10))
+    JOB_LOCK_TIMEOUT_SECONDS = float(os.getenv('JOB_LOCK_TIMEOUT_SECONDS', 300))
+    
+    # Repair latest plans when recipes are deactivated or ingredients gain intolerances
+    PLAN_REPAIR_ON_CATALOG_CHANGE = os.getenv('PLAN_REPAIR_ON_CATALOG_CHANGE', 'true').lower() == 'true'
+    PLAN_REPAIR_CHUNK_SIZE = int(os.getenv('PLAN_REPAIR_CHUNK_SIZE', 200))
+    
+    # Firebase UIDs allowed to use the /api/admin endpoints (comma-separated)
+    ADMIN_UIDS = [uid.strip() for uid in os.getenv('ADMIN_UIDS', '').split(',') if uid.strip()]
+    
     # CORS Configuration
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*').split(',')
 
@@ -3,8 +3,8 @@ SQLAlchemy models for the meal planning system.
 """
 from datetime import datetime, timedelta
 import secrets
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Date, Enum, DECIMAL, ForeignKey, Time
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Date, Enum, DECIMAL, ForeignKey, Time, UniqueConstraint, JSON, Index
+from sqlalchemy.orm import relationship, backref
 from sqlalchemy.ext.declarative import declarative_base
 from app.services.database_service import db
 
@@ -132,7 +132,7 @@ class Patient(BaseModel):
     is_active = Column(Boolean, default=True)
     
     # Relationships
-    invitation = relationship("PatientInvitation", backref="patient")
+    invitation = relationship("PatientInvitation", backref=backref("patient", uselist=False))
     medical_conditions = relationship("PatientMedicalCondition", back_populates="patient", cascade="all, delete-orphan")
     intolerances = relationship("PatientIntolerance", back_populates="patient", cascade="all, delete-orphan")
     dietary_preferences = relationship("PatientDietaryPreference", back_populates="patient", cascade="all, delete-orphan")
@@ -191,6 +191,33 @@ class MedicalCondition(BaseModel):
             'created_at': self.created_at.isoformat()
         }
 
+# Medical Condition Dietary Rules (per meal)
+class MedicalConditionRule(BaseModel):
+    __tablename__ = 'medical_condition_rules'
+
+    condition_id = Column(Integer, ForeignKey('medical_conditions.id'), nullable=False, index=True)
+    rule_type = Column(Enum('max_nutrient', 'min_nutrient', 'exclude_category', name='condition_rule_type'), nullable=False)
+    nutrient = Column(Enum('calories', 'protein', 'carbs', 'fat', name='rule_nutrient'))  # For max/min rules
+    value = Column(DECIMAL(8, 2))  # Threshold per meal
+    category = Column(String(100))  # Ingredient.category for exclude rules
+    is_active = Column(Boolean, default=True)
+
+    # Relationships
+    condition = relationship("MedicalCondition")
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'condition_id': self.condition_id,
+            'condition_name': self.condition.condition_name if self.condition else None,
+            'rule_type': self.rule_type,
+            'nutrient': self.nutrient,
+            'value': float(self.value) if self.value is not None else None,
+            'category': self.category,
+            'is_active': self.is_active,
+            'created_at': self.created_at.isoformat()
+        }
+
 # Food Intolerances Catalog
 class FoodIntolerance(BaseModel):
     __tablename__ = 'food_intolerances'
@@ -318,6 +345,30 @@ class Ingredient(BaseModel):
             'created_at': self.created_at.isoformat()
         }
 
+# Food Intolerance Ingredients (Many-to-Many)
+class IntoleranceIngredient(BaseModel):
+    __tablename__ = 'intolerance_ingredients'
+    __table_args__ = (
+        UniqueConstraint('intolerance_id', 'ingredient_id', name='uq_intolerance_ingredient'),
+    )
+    
+    intolerance_id = Column(Integer, ForeignKey('food_intolerances.id'), nullable=False)
+    ingredient_id = Column(Integer, ForeignKey('ingredients.id'), nullable=False, index=True)
+    
+    # Relationships
+    intolerance = relationship("FoodIntolerance")
+    ingredient = relationship("Ingredient")
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'intolerance_id': self.intolerance_id,
+            'ingredient_id': self.ingredient_id,
+            'intolerance_name': self.intolerance.intolerance_name if self.intolerance else None,
+            'ingredient_name': self.ingredient.ingredient_name if self.ingredient else None,
+            'created_at': self.created_at.isoformat()
+        }
+
 # Recipe Tags Catalog
 class RecipeTag(BaseModel):
     __tablename__ = 'recipe_tags'
@@ -355,6 +406,7 @@ class Recipe(BaseModel):
     image_url = Column(String(500))
     is_active = Column(Boolean, default=True)
     created_by_uid = Column(String(255))  # Firebase UID
+    view_fragments = Column(JSON)  # Tags, ingredient lines and steps for the public view (maintained on write)
     
     # Relationships
     ingredients = relationship("RecipeIngredient", back_populates="recipe", cascade="all, delete-orphan")
@@ -396,7 +448,7 @@ class RecipeIngredient(BaseModel):
     __tablename__ = 'recipe_ingredients'
     
     recipe_id = Column(Integer, ForeignKey('recipes.id'), nullable=False)
-    ingredient_id = Column(Integer, ForeignKey('ingredients.id'), nullable=False)
+    ingredient_id = Column(Integer, ForeignKey('ingredients.id'), nullable=False, index=True)
     quantity = Column(DECIMAL(8,2), nullable=False)
     unit = Column(String(50), nullable=False)
     
@@ -430,6 +482,32 @@ class RecipeTagAssignment(BaseModel):
     recipe = relationship("Recipe", back_populates="tag_assignments")
     tag = relationship("RecipeTag")
 
+# Dietary Preference → Recipe Tag rules
+class DietaryPreferenceTag(BaseModel):
+    __tablename__ = 'dietary_preference_tags'
+    __table_args__ = (
+        UniqueConstraint('preference_id', 'tag_id', name='uq_dietary_preference_tag'),
+    )
+    
+    preference_id = Column(Integer, ForeignKey('dietary_preferences.id'), nullable=False, index=True)
+    tag_id = Column(Integer, ForeignKey('recipe_tags.id'), nullable=False)
+    mode = Column(Enum('require', 'forbid', name='preference_tag_mode'), nullable=False)
+    
+    # Relationships
+    preference = relationship("DietaryPreference")
+    tag = relationship("RecipeTag")
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'preference_id': self.preference_id,
+            'tag_id': self.tag_id,
+            'mode': self.mode,
+            'preference_name': self.preference.preference_name if self.preference else None,
+            'tag_name': self.tag.tag_name if self.tag else None,
+            'created_at': self.created_at.isoformat()
+        }
+
 # Meal Plans
 class MealPlan(BaseModel):
     __tablename__ = 'meal_plans'
@@ -454,6 +532,8 @@ class MealPlan(BaseModel):
     patient = relationship("Patient", back_populates="meal_plans")
     nutritionist = relationship("Nutritionist", back_populates="meal_plans")
     meals = relationship("MealPlanMeal", back_populates="meal_plan", cascade="all, delete-orphan")
+    nutrition_days = relationship("MealPlanNutrition", back_populates="meal_plan", cascade="all, delete-orphan",
+                                  order_by="MealPlanNutrition.day_index")
     
     # Self-referencing relationship for versioning
     parent_plan = relationship("MealPlan", remote_side="MealPlan.id", backref="versions")
@@ -555,6 +635,7 @@ class MealPlan(BaseModel):
                 plan_id=new_plan.id,
                 recipe_id=meal.recipe_id,
                 day_of_week=meal.day_of_week,
+                meal_date=meal.meal_date,
                 meal_type=meal.meal_type,
                 scheduled_time=meal.scheduled_time,
                 servings=meal.servings
@@ -564,6 +645,34 @@ class MealPlan(BaseModel):
         db.session.commit()
         return new_plan
 
+# Meal Plan Templates
+class MealPlanTemplate(BaseModel):
+    __tablename__ = 'meal_plan_templates'
+    
+    nutritionist_id = Column(Integer, ForeignKey('nutritionists.id'), nullable=False, index=True)
+    template_name = Column(String(200), nullable=False)
+    description = Column(Text)
+    days = Column(Integer, nullable=False, default=7)
+    # Slot grid: meal type -> recipe ID per day, e.g. {"breakfast": [12, 15, ...], "lunch": [...], "dinner": [...]}
+    slots = Column(JSON, nullable=False)
+    is_active = Column(Boolean, default=True)
+    
+    # Relationships
+    nutritionist = relationship("Nutritionist")
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'nutritionist_id': self.nutritionist_id,
+            'template_name': self.template_name,
+            'description': self.description,
+            'days': self.days,
+            'slots': self.slots,
+            'is_active': self.is_active,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat()
+        }
+
 # Meal Plan Tokens
 class MealPlanToken(BaseModel):
     __tablename__ = 'meal_plan_tokens'
@@ -600,8 +709,9 @@ class MealPlanMeal(BaseModel):
     __tablename__ = 'meal_plan_meals'
     
     plan_id = Column(Integer, ForeignKey('meal_plans.id'), nullable=False)
-    recipe_id = Column(Integer, ForeignKey('recipes.id'), nullable=False)
+    recipe_id = Column(Integer, ForeignKey('recipes.id'), nullable=False, index=True)
     day_of_week = Column(Enum('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday', name='day_of_week'), nullable=False)
+    meal_date = Column(Date)  # Calendar date; plans longer than a week repeat day_of_week
     meal_type = Column(Enum('breakfast', 'lunch', 'dinner', 'snack', name='meal_type'), nullable=False)
     scheduled_time = Column(Time)
     servings = Column(DECIMAL(3,1), default=1.0)
@@ -617,8 +727,79 @@ class MealPlanMeal(BaseModel):
             'recipe_id': self.recipe_id,
             'recipe_name': self.recipe.recipe_name if self.recipe else None,
             'day_of_week': self.day_of_week,
+            'meal_date': self.meal_date.isoformat() if self.meal_date else None,
             'meal_type': self.meal_type,
             'scheduled_time': self.scheduled_time.strftime('%H:%M') if self.scheduled_time else None,
             'servings': float(self.servings),
             'calories_per_serving': float(self.recipe.total_calories) if self.recipe and self.recipe.total_calories else None
         }
+
+
+# Per-day nutrition of each meal plan, maintained by app.services.plan_nutrition
+class MealPlanNutrition(BaseModel):
+    __tablename__ = 'meal_plan_nutrition'
+    __table_args__ = (
+        UniqueConstraint('plan_id', 'day_index', name='uq_meal_plan_nutrition_plan_day'),
+    )
+    
+    plan_id = Column(Integer, ForeignKey('meal_plans.id'), nullable=False)
+    day_index = Column(Integer, nullable=False)  # Days since the plan's start_date
+    meal_date = Column(Date, nullable=False)
+    day_of_week = Column(Enum('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday', name='day_of_week'), nullable=False)
+    meal_count = Column(Integer, nullable=False, default=0)
+    calories = Column(DECIMAL(8,2), nullable=False, default=0)
+    protein = Column(DECIMAL(7,2), nullable=False, default=0)
+    carbs = Column(DECIMAL(7,2), nullable=False, default=0)
+    fat = Column(DECIMAL(7,2), nullable=False, default=0)
+    fiber = Column(DECIMAL(7,2), nullable=False, default=0)
+    
+    # Relationships
+    meal_plan = relationship("MealPlan", back_populates="nutrition_days")
+    
+    def to_dict(self):
+        return {
+            'date': self.meal_date.isoformat(),
+            'day_of_week': self.day_of_week,
+            'meal_count': self.meal_count,
+            'calories': float(self.calories),
+            'protein': float(self.protein),
+            'carbs': float(self.carbs),
+            'fat': float(self.fat),
+            'fiber': float(self.fiber)
+        }
+
+
+# Background Jobs
+class BackgroundJob(BaseModel):
+    __tablename__ = 'background_jobs'
+    __table_args__ = (
+        Index('ix_background_jobs_status_run_after', 'status', 'run_after'),
+    )
+    
+    job_type = Column(String(50), nullable=False)
+    reference = Column(String(100), index=True)  # e.g. 'patient:42', used for status lookups
+    payload = Column(JSON, nullable=False, default=dict)
+    status = Column(Enum('pending', 'running', 'completed', 'failed', name='job_status'), nullable=False, default='pending')
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = Column(DateTime)
+    locked_by = Column(String(100))
+    last_error = Column(Text)
+    result = Column(JSON)
+    completed_at = Column(DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'reference': self.reference,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_after': self.run_after.isoformat() if self.run_after else None,
+            'last_error': self.last_error,
+            'result': self.result,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+            'created_at': self.created_at.isoformat()
+        }
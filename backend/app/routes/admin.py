@@ -0,0 +1,40 @@
+"""
+Admin routes for catalog maintenance reports.
+Restricted to the Firebase UIDs listed in ADMIN_UIDS.
+"""
+from flask import Blueprint, request
+from ..utils.auth_utils import require_admin
+from ..utils.responses import success_response, error_response
+from ..services.catalog_coverage import catalog_coverage_analyzer
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
+
+# Largest subset size accepted over HTTP (larger sizes belong in the CLI)
+MAX_COVERAGE_SUBSET_SIZE = 3
+
+
+@admin_bp.route('/catalog-coverage', methods=['GET'])
+@require_admin
+def get_catalog_coverage():
+    """List restriction combinations without enough compatible recipes for a weekly plan."""
+    try:
+        max_subset_size = request.args.get('max_subset_size', 0, type=int)
+        required_per_type = request.args.get('required_per_type', type=int)
+        limit = request.args.get('limit', 100, type=int)
+        include_covered = request.args.get('include_covered', 'false').lower() == 'true'
+        
+        if not 0 <= max_subset_size <= MAX_COVERAGE_SUBSET_SIZE:
+            return error_response(f"max_subset_size must be between 0 and {MAX_COVERAGE_SUBSET_SIZE}", 400)
+        if required_per_type is not None and required_per_type < 1:
+            return error_response("required_per_type must be positive", 400)
+        
+        report = catalog_coverage_analyzer.analyze(
+            max_subset_size=max_subset_size,
+            required_per_type=required_per_type,
+            include_covered=include_covered
+        )
+        report['combinations'] = report['combinations'][:max(0, limit)]
+        return success_response(report, "Catalog coverage analyzed successfully")
+    
+    except Exception as e:
+        return error_response(f"Failed to analyze catalog coverage: {str(e)}", 500)
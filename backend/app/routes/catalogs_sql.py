@@ -7,8 +7,8 @@ from ..middleware.auth import require_auth
 from ..utils.responses import success_response, error_response
 from ..services.database_service import db
 from ..models.sql_models import (
-    MedicalCondition, FoodIntolerance, DietaryPreference, 
-    Ingredient, RecipeTag
+    MedicalCondition, MedicalConditionRule, FoodIntolerance, DietaryPreference, DietaryPreferenceTag,
+    Ingredient, IntoleranceIngredient, RecipeTag
 )
 
 catalogs_bp = Blueprint('catalogs', __name__, url_prefix='/api/catalogs')
@@ -78,6 +78,75 @@ def update_medical_condition(condition_id):
     except Exception as e:
         return error_response(f"Error updating medical condition: {str(e)}", 500)
 
+@catalogs_bp.route('/medical-conditions/<int:condition_id>/rules', methods=['GET'])
+def get_medical_condition_rules(condition_id):
+    """Get the dietary rules applied to patients with a medical condition."""
+    try:
+        MedicalCondition.query.get_or_404(condition_id)
+        rules = MedicalConditionRule.query.filter_by(condition_id=condition_id).all()
+        return success_response([rule.to_dict() for rule in rules], "Medical condition rules retrieved successfully")
+    except Exception as e:
+        return error_response(f"Error retrieving medical condition rules: {str(e)}", 500)
+
+@catalogs_bp.route('/medical-conditions/<int:condition_id>/rules', methods=['POST'])
+@require_auth
+def create_medical_condition_rule(condition_id):
+    """Add a per-meal dietary rule to a medical condition."""
+    try:
+        MedicalCondition.query.get_or_404(condition_id)
+        data = request.get_json() or {}
+        
+        rule_type = data.get('rule_type')
+        if rule_type in ('max_nutrient', 'min_nutrient'):
+            if data.get('nutrient') not in ('calories', 'protein', 'carbs', 'fat'):
+                return error_response("nutrient must be one of: calories, protein, carbs, fat", 400)
+            if data.get('value') is None:
+                return error_response("Missing required field: value", 400)
+        elif rule_type == 'exclude_category':
+            if not data.get('category'):
+                return error_response("Missing required field: category", 400)
+        else:
+            return error_response("rule_type must be one of: max_nutrient, min_nutrient, exclude_category", 400)
+        
+        rule = MedicalConditionRule(
+            condition_id=condition_id,
+            rule_type=rule_type,
+            nutrient=data.get('nutrient') if rule_type != 'exclude_category' else None,
+            value=data.get('value') if rule_type != 'exclude_category' else None,
+            category=data.get('category') if rule_type == 'exclude_category' else None
+        )
+        
+        db.session.add(rule)
+        db.session.commit()
+        
+        return success_response(rule.to_dict(), "Medical condition rule created successfully", 201)
+        
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return error_response(f"Database error: {str(e)}", 500)
+    except Exception as e:
+        return error_response(f"Error creating medical condition rule: {str(e)}", 500)
+
+@catalogs_bp.route('/medical-conditions/<int:condition_id>/rules/<int:rule_id>', methods=['DELETE'])
+@require_auth
+def remove_medical_condition_rule(condition_id, rule_id):
+    """Remove a dietary rule from a medical condition."""
+    try:
+        rule = MedicalConditionRule.query.filter_by(id=rule_id, condition_id=condition_id).first()
+        if not rule:
+            return error_response("Medical condition rule not found", 404)
+        
+        db.session.delete(rule)
+        db.session.commit()
+        
+        return success_response(message="Medical condition rule removed successfully")
+        
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return error_response(f"Database error: {str(e)}", 500)
+    except Exception as e:
+        return error_response(f"Error removing medical condition rule: {str(e)}", 500)
+
 # Food Intolerances
 @catalogs_bp.route('/food-intolerances', methods=['GET'])
 def get_food_intolerances():
@@ -119,6 +188,81 @@ def create_food_intolerance():
     except Exception as e:
         return error_response(f"Error creating food intolerance: {str(e)}", 500)
 
+@catalogs_bp.route('/food-intolerances/<int:intolerance_id>/ingredients', methods=['GET'])
+def get_intolerance_ingredients(intolerance_id):
+    """Get the ingredients restricted by a food intolerance."""
+    try:
+        FoodIntolerance.query.get_or_404(intolerance_id)
+        mappings = IntoleranceIngredient.query.filter_by(intolerance_id=intolerance_id).all()
+        return success_response([mapping.to_dict() for mapping in mappings], "Intolerance ingredients retrieved successfully")
+    except Exception as e:
+        return error_response(f"Error retrieving intolerance ingredients: {str(e)}", 500)
+
+@catalogs_bp.route('/food-intolerances/<int:intolerance_id>/ingredients', methods=['POST'])
+@require_auth
+def add_intolerance_ingredients(intolerance_id):
+    """Map one or more ingredients to a food intolerance."""
+    try:
+        FoodIntolerance.query.get_or_404(intolerance_id)
+        data = request.get_json() or {}
+        
+        ingredient_ids = data.get('ingredient_ids')
+        if not ingredient_ids or not isinstance(ingredient_ids, list):
+            return error_response("Missing required field: ingredient_ids", 400)
+        
+        ingredients = Ingredient.query.filter(Ingredient.id.in_(ingredient_ids)).all()
+        found_ids = {ingredient.id for ingredient in ingredients}
+        missing = [ingredient_id for ingredient_id in ingredient_ids if ingredient_id not in found_ids]
+        if missing:
+            return error_response(f"Ingredients not found: {missing}", 404)
+        
+        existing_ids = {
+            mapping.ingredient_id for mapping in IntoleranceIngredient.query.filter(
+                IntoleranceIngredient.intolerance_id == intolerance_id,
+                IntoleranceIngredient.ingredient_id.in_(found_ids)
+            ).all()
+        }
+        
+        for ingredient_id in found_ids - existing_ids:
+            db.session.add(IntoleranceIngredient(
+                intolerance_id=intolerance_id,
+                ingredient_id=ingredient_id
+            ))
+        
+        db.session.commit()
+        
+        mappings = IntoleranceIngredient.query.filter_by(intolerance_id=intolerance_id).all()
+        return success_response([mapping.to_dict() for mapping in mappings], "Intolerance ingredients updated successfully", 201)
+        
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return error_response(f"Database error: {str(e)}", 500)
+    except Exception as e:
+        return error_response(f"Error updating intolerance ingredients: {str(e)}", 500)
+
+@catalogs_bp.route('/food-intolerances/<int:intolerance_id>/ingredients/<int:ingredient_id>', methods=['DELETE'])
+@require_auth
+def remove_intolerance_ingredient(intolerance_id, ingredient_id):
+    """Remove an ingredient from a food intolerance mapping."""
+    try:
+        mapping = IntoleranceIngredient.query.filter_by(
+            intolerance_id=intolerance_id,
+            ingredient_id=ingredient_id
+        ).first()
+        if not mapping:
+            return error_response("Intolerance ingredient mapping not found", 404)
+        
+        db.session.delete(mapping)
+        db.session.commit()
+        
+        return success_response(message="Intolerance ingredient removed successfully")
+        
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return error_response(f"Database error: {str(e)}", 500)
+    except Exception as e:
+        return error_response(f"Error removing intolerance ingredient: {str(e)}", 500)
+
 # Dietary Preferences
 @catalogs_bp.route('/dietary-preferences', methods=['GET'])
 def get_dietary_preferences():
@@ -160,6 +304,70 @@ def create_dietary_preference():
     except Exception as e:
         return error_response(f"Error creating dietary preference: {str(e)}", 500)
 
+@catalogs_bp.route('/dietary-preferences/<int:preference_id>/tags', methods=['GET'])
+def get_dietary_preference_tags(preference_id):
+    """Get the recipe tags required or forbidden by a dietary preference."""
+    try:
+        DietaryPreference.query.get_or_404(preference_id)
+        mappings = DietaryPreferenceTag.query.filter_by(preference_id=preference_id).all()
+        return success_response([mapping.to_dict() for mapping in mappings], "Dietary preference tags retrieved successfully")
+    except Exception as e:
+        return error_response(f"Error retrieving dietary preference tags: {str(e)}", 500)
+
+@catalogs_bp.route('/dietary-preferences/<int:preference_id>/tags', methods=['POST'])
+@require_auth
+def set_dietary_preference_tag(preference_id):
+    """Require or forbid a recipe tag for patients with a dietary preference."""
+    try:
+        DietaryPreference.query.get_or_404(preference_id)
+        data = request.get_json() or {}
+        
+        if not data.get('tag_id'):
+            return error_response("Missing required field: tag_id", 400)
+        if data.get('mode') not in ('require', 'forbid'):
+            return error_response("mode must be one of: require, forbid", 400)
+        
+        tag = RecipeTag.query.get(data['tag_id'])
+        if not tag:
+            return error_response("Recipe tag not found", 404)
+        
+        mapping = DietaryPreferenceTag.query.filter_by(preference_id=preference_id, tag_id=tag.id).first()
+        if mapping:
+            mapping.mode = data['mode']
+        else:
+            mapping = DietaryPreferenceTag(preference_id=preference_id, tag_id=tag.id, mode=data['mode'])
+            db.session.add(mapping)
+        
+        db.session.commit()
+        
+        return success_response(mapping.to_dict(), "Dietary preference tag saved successfully", 201)
+        
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return error_response(f"Database error: {str(e)}", 500)
+    except Exception as e:
+        return error_response(f"Error saving dietary preference tag: {str(e)}", 500)
+
+@catalogs_bp.route('/dietary-preferences/<int:preference_id>/tags/<int:tag_id>', methods=['DELETE'])
+@require_auth
+def remove_dietary_preference_tag(preference_id, tag_id):
+    """Remove a recipe tag rule from a dietary preference."""
+    try:
+        mapping = DietaryPreferenceTag.query.filter_by(preference_id=preference_id, tag_id=tag_id).first()
+        if not mapping:
+            return error_response("Dietary preference tag not found", 404)
+        
+        db.session.delete(mapping)
+        db.session.commit()
+        
+        return success_response(message="Dietary preference tag removed successfully")
+        
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return error_response(f"Database error: {str(e)}", 500)
+    except Exception as e:
+        return error_response(f"Error removing dietary preference tag: {str(e)}", 500)
+
 # Ingredients
 @catalogs_bp.route('/ingredients', methods=['GET'])
 def get_ingredients():
@@ -2,6 +2,7 @@ import time
 from flask import Blueprint
 from ..utils.responses import success_response, error_response
 from ..services.database_service import test_connection
+from ..services.compatibility_cache import compatible_recipe_cache
 
 health_bp = Blueprint('health', __name__)
 
@@ -36,4 +37,12 @@ def db_health_check():
             'database': 'PostgreSQL',
             'response_time_ms': round(response_time * 1000, 2)
         }
-        return error_response("Database connection failed", 503, data)
\ No newline at end of file
+        return error_response("Database connection failed", 503, data)
+
+@health_bp.route('/health/caches', methods=['GET'])
+def cache_health_check():
+    """In-memory cache statistics."""
+    data = {
+        'compatible_recipes': compatible_recipe_cache.stats()
+    }
+    return success_response(data, "Cache statistics")
@@ -5,8 +5,10 @@ Handles the dynamic link routing and workflow management.
 from flask import Blueprint, request, jsonify, send_file
 from io import BytesIO
 from ..utils.auth_utils import require_auth, get_current_user_uid
+from ..utils.conditional import not_modified_response, with_etag
 from ..utils.responses import success_response, error_response
 from ..services.meal_plan_workflow_service import MealPlanWorkflowService
+from ..services.plan_etags import plan_etags
 
 workflow_bp = Blueprint('meal_plan_workflow', __name__, url_prefix='/api/workflow')
 
@@ -86,10 +88,16 @@ def approve_meal_plan():
 def get_dynamic_link_content(token):
     """Get content for the dynamic patient link based on invitation status."""
     try:
+        # Only links showing an approved plan get an ETag
+        etag = plan_etags.for_workflow_token(token)
+        not_modified = not_modified_response(etag)
+        if not_modified is not None:
+            return not_modified
+        
         success, content_data, error = MealPlanWorkflowService.get_dynamic_link_content(token)
         
         if success:
-            return success_response(content_data, "Content retrieved successfully")
+            return with_etag(success_response(content_data, "Content retrieved successfully"), etag)
         else:
             return error_response(error, 404 if "not found" in error.lower() else 400)
     
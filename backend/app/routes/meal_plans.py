@@ -3,6 +3,7 @@ from datetime import datetime, date
 from ..middleware.auth import require_auth
 from ..models.sql_models import MealPlan, Patient, PatientInvitation, Nutritionist
 from ..services.meal_plan_service import MealPlanService
+from ..services.meal_plan_generator import meal_plan_generator
 from ..utils.responses import success_response, error_response
 from ..utils.auth_utils import get_current_user_uid
 from ..services.database_service import db
@@ -42,17 +43,49 @@ def generate_meal_plan():
         patient_id = data['patient_id']
         generated_by_uid = request.user.get('uid')
         preferences = data.get('preferences', {})
+        no_repeat_days = data.get('no_repeat_days', preferences.get('no_repeat_days'))
+        
+        if no_repeat_days is not None:
+            try:
+                no_repeat_days = int(no_repeat_days)
+            except (TypeError, ValueError):
+                return error_response('no_repeat_days must be an integer', 400)
+            if no_repeat_days < 1:
+                return error_response('no_repeat_days must be at least 1', 400)
+        
+        # Get nutritionist and verify the patient belongs to them
+        nutritionist = Nutritionist.query.filter_by(firebase_uid=generated_by_uid).first()
+        if not nutritionist:
+            return error_response('Nutritionist not found', 404)
         
-        # Generate meal plan
-        success, meal_plan, error_msg = MealPlanService.generate_meal_plan(
-            patient_id, start_date, end_date, generated_by_uid, preferences
-        )
+        patient = db.session.query(Patient)\
+            .join(PatientInvitation, Patient.invitation_id == PatientInvitation.id)\
+            .filter(
+                Patient.id == patient_id,
+                PatientInvitation.nutritionist_id == nutritionist.id
+            ).first()
         
-        if not success:
-            return error_response(error_msg, 400)
+        if not patient:
+            return error_response('Patient not found or access denied', 404)
         
+        # Generate meal plan
+        try:
+            result = meal_plan_generator.generate_plan(
+                patient_id=patient.id,
+                start_date=start_date,
+                end_date=end_date,
+                generated_by_uid=generated_by_uid,
+                nutritionist_id=nutritionist.id,
+                no_repeat_days=no_repeat_days
+            )
+        except Exception as generation_error:
+            return error_response(str(generation_error), 400)
+        
+        meal_plan = db.session.get(MealPlan, result['plan_id'])
         return success_response({
-            'meal_plan': meal_plan
+            'meal_plan': meal_plan.to_dict(include_relations=True),
+            'days': result['days'],
+            'no_repeat_days': result['no_repeat_days']
         }, 'Meal plan generated successfully')
         
     except Exception as e:
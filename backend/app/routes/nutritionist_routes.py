@@ -1,6 +1,7 @@
 """
 Nutritionist API Routes - Handles nutritionist-specific operations.
 """
+from datetime import datetime
 from flask import Blueprint, request, jsonify
 from app.services.nutritionist_service import NutritionistService
 from app.services.meal_plan_versioning_service import MealPlanVersioningService
@@ -8,6 +9,11 @@ from app.utils.auth_utils import require_auth, get_current_user_uid
 
 nutritionist_bp = Blueprint('nutritionist', __name__, url_prefix='/api/nutritionist')
 
+MAX_BATCH_PATIENTS = 1000
+MAX_BATCH_CHUNK_SIZE = 500
+MAX_SUBSTITUTES = 50
+MAX_SIMULATION_CHANGES = 200
+
 @nutritionist_bp.route('/profile', methods=['POST'])
 @require_auth
 def create_or_update_profile():
@@ -216,6 +222,72 @@ def create_meal_plan_version(patient_id):
             'message': f'Server error: {str(e)}'
         }), 500
 
+@nutritionist_bp.route('/meal-plans/batch-generate', methods=['POST'])
+@require_auth
+def batch_generate_meal_plans():
+    """Generate meal plans for many patients in one call."""
+    try:
+        firebase_uid = get_current_user_uid()
+        request_data = request.get_json() or {}
+        
+        patient_ids = request_data.get('patient_ids')
+        if not patient_ids or not isinstance(patient_ids, list):
+            return jsonify({
+                'success': False,
+                'message': 'patient_ids list is required'
+            }), 400
+        
+        if len(patient_ids) > MAX_BATCH_PATIENTS:
+            return jsonify({
+                'success': False,
+                'message': f'At most {MAX_BATCH_PATIENTS} patients per batch'
+            }), 400
+        
+        chunk_size = request_data.get('chunk_size', 100)
+        if isinstance(chunk_size, bool) or not isinstance(chunk_size, int) or not 1 <= chunk_size <= MAX_BATCH_CHUNK_SIZE:
+            return jsonify({
+                'success': False,
+                'message': f'chunk_size must be an integer between 1 and {MAX_BATCH_CHUNK_SIZE}'
+            }), 400
+        
+        # Get nutritionist
+        success, nutritionist, error = NutritionistService.create_or_get_nutritionist(
+            firebase_uid=firebase_uid,
+            profile_data={}
+        )
+        
+        if not success or not nutritionist:
+            return jsonify({
+                'success': False,
+                'message': 'Nutritionist not found'
+            }), 404
+        
+        # Generate plans
+        success, report, error = NutritionistService.batch_generate_meal_plans(
+            nutritionist_id=nutritionist.id,
+            patient_ids=patient_ids,
+            generated_by_uid=firebase_uid,
+            chunk_size=chunk_size
+        )
+        
+        if not success:
+            return jsonify({
+                'success': False,
+                'message': error
+            }), 400
+        
+        return jsonify({
+            'success': True,
+            'message': f"Generated {report['succeeded']} of {report['total']} meal plans",
+            'data': report
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Server error: {str(e)}'
+        }), 500
+
 @nutritionist_bp.route('/meal-plans/<int:plan_id>/approve', methods=['POST'])
 @require_auth
 def approve_meal_plan(plan_id):
@@ -360,6 +432,314 @@ def compare_meal_plan_versions():
             'message': f'Server error: {str(e)}'
         }), 500
 
+@nutritionist_bp.route('/meal-plans/<int:plan_id>/meals/<int:meal_id>/substitutes', methods=['GET'])
+@require_auth
+def get_meal_substitutes(plan_id, meal_id):
+    """Get the most similar compatible recipes to swap into a meal slot."""
+    try:
+        firebase_uid = get_current_user_uid()
+        limit = min(max(request.args.get('limit', 10, type=int), 1), MAX_SUBSTITUTES)
+        
+        # Get nutritionist
+        success, nutritionist, error = NutritionistService.create_or_get_nutritionist(
+            firebase_uid=firebase_uid,
+            profile_data={}
+        )
+        
+        if not success or not nutritionist:
+            return jsonify({
+                'success': False,
+                'message': 'Nutritionist not found'
+            }), 404
+        
+        success, substitutes, error = NutritionistService.get_meal_substitutes(
+            nutritionist_id=nutritionist.id,
+            plan_id=plan_id,
+            meal_id=meal_id,
+            limit=limit
+        )
+        
+        if not success:
+            return jsonify({
+                'success': False,
+                'message': error
+            }), 400
+        
+        return jsonify({
+            'success': True,
+            'data': substitutes
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Server error: {str(e)}'
+        }), 500
+
+@nutritionist_bp.route('/meal-plans/<int:plan_id>/simulate', methods=['POST'])
+@require_auth
+def simulate_meal_plan_changes(plan_id):
+    """Preview per-day and per-week nutrition deltas of proposed meal changes without saving them."""
+    try:
+        firebase_uid = get_current_user_uid()
+        request_data = request.get_json() or {}
+        
+        changes = request_data.get('changes')
+        if not changes or not isinstance(changes, list) or not all(isinstance(change, dict) for change in changes):
+            return jsonify({
+                'success': False,
+                'message': 'changes list is required'
+            }), 400
+        
+        if len(changes) > MAX_SIMULATION_CHANGES:
+            return jsonify({
+                'success': False,
+                'message': f'At most {MAX_SIMULATION_CHANGES} changes per simulation'
+            }), 400
+        
+        # Get nutritionist
+        success, nutritionist, error = NutritionistService.create_or_get_nutritionist(
+            firebase_uid=firebase_uid,
+            profile_data={}
+        )
+        
+        if not success or not nutritionist:
+            return jsonify({
+                'success': False,
+                'message': 'Nutritionist not found'
+            }), 404
+        
+        success, simulation, error = NutritionistService.simulate_meal_plan_changes(
+            nutritionist_id=nutritionist.id,
+            plan_id=plan_id,
+            changes=changes
+        )
+        
+        if not success:
+            return jsonify({
+                'success': False,
+                'message': error
+            }), 400
+        
+        return jsonify({
+            'success': True,
+            'data': simulation
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Server error: {str(e)}'
+        }), 500
+
+@nutritionist_bp.route('/meal-plans/<int:plan_id>/nutrition', methods=['GET'])
+@require_auth
+def get_meal_plan_nutrition(plan_id):
+    """Get per-day and per-week nutrition totals of a meal plan."""
+    try:
+        firebase_uid = get_current_user_uid()
+        
+        # Get nutritionist
+        success, nutritionist, error = NutritionistService.create_or_get_nutritionist(
+            firebase_uid=firebase_uid,
+            profile_data={}
+        )
+        
+        if not success or not nutritionist:
+            return jsonify({
+                'success': False,
+                'message': 'Nutritionist not found'
+            }), 404
+        
+        success, nutrition, error = NutritionistService.get_meal_plan_nutrition(
+            nutritionist_id=nutritionist.id,
+            plan_id=plan_id
+        )
+        
+        if not success:
+            return jsonify({
+                'success': False,
+                'message': error
+            }), 400
+        
+        return jsonify({
+            'success': True,
+            'data': nutrition
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Server error: {str(e)}'
+        }), 500
+
+@nutritionist_bp.route('/meal-plan-templates', methods=['GET'])
+@require_auth
+def get_meal_plan_templates():
+    """Get the nutritionist's meal plan templates."""
+    try:
+        firebase_uid = get_current_user_uid()
+        
+        # Get nutritionist
+        success, nutritionist, error = NutritionistService.create_or_get_nutritionist(
+            firebase_uid=firebase_uid,
+            profile_data={}
+        )
+        
+        if not success or not nutritionist:
+            return jsonify({
+                'success': False,
+                'message': 'Nutritionist not found'
+            }), 404
+        
+        success, templates, error = NutritionistService.get_meal_plan_templates(nutritionist.id)
+        
+        if not success:
+            return jsonify({
+                'success': False,
+                'message': error
+            }), 400
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'templates': templates
+            }
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Server error: {str(e)}'
+        }), 500
+
+@nutritionist_bp.route('/meal-plan-templates', methods=['POST'])
+@require_auth
+def create_meal_plan_template():
+    """Create a meal plan template from a slot grid or an existing plan."""
+    try:
+        firebase_uid = get_current_user_uid()
+        request_data = request.get_json() or {}
+        
+        if not request_data.get('template_name'):
+            return jsonify({
+                'success': False,
+                'message': 'template_name is required'
+            }), 400
+        
+        if not request_data.get('slots') and not request_data.get('plan_id'):
+            return jsonify({
+                'success': False,
+                'message': 'Either slots or plan_id is required'
+            }), 400
+        
+        # Get nutritionist
+        success, nutritionist, error = NutritionistService.create_or_get_nutritionist(
+            firebase_uid=firebase_uid,
+            profile_data={}
+        )
+        
+        if not success or not nutritionist:
+            return jsonify({
+                'success': False,
+                'message': 'Nutritionist not found'
+            }), 404
+        
+        success, template, error = NutritionistService.create_meal_plan_template(
+            nutritionist_id=nutritionist.id,
+            template_data=request_data
+        )
+        
+        if not success:
+            return jsonify({
+                'success': False,
+                'message': error
+            }), 400
+        
+        return jsonify({
+            'success': True,
+            'message': 'Meal plan template created successfully',
+            'data': {
+                'template': template.to_dict()
+            }
+        }), 201
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Server error: {str(e)}'
+        }), 500
+
+@nutritionist_bp.route('/meal-plan-templates/<int:template_id>/assign', methods=['POST'])
+@require_auth
+def assign_meal_plan_template(template_id):
+    """Create meal plans from a template for many patients in one call."""
+    try:
+        firebase_uid = get_current_user_uid()
+        request_data = request.get_json() or {}
+        
+        patient_ids = request_data.get('patient_ids')
+        if not patient_ids or not isinstance(patient_ids, list):
+            return jsonify({
+                'success': False,
+                'message': 'patient_ids list is required'
+            }), 400
+        
+        if len(patient_ids) > MAX_BATCH_PATIENTS:
+            return jsonify({
+                'success': False,
+                'message': f'At most {MAX_BATCH_PATIENTS} patients per batch'
+            }), 400
+        
+        start_date = None
+        if request_data.get('start_date'):
+            try:
+                start_date = datetime.strptime(request_data['start_date'], '%Y-%m-%d').date()
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'message': 'start_date must be YYYY-MM-DD'
+                }), 400
+        
+        # Get nutritionist
+        success, nutritionist, error = NutritionistService.create_or_get_nutritionist(
+            firebase_uid=firebase_uid,
+            profile_data={}
+        )
+        
+        if not success or not nutritionist:
+            return jsonify({
+                'success': False,
+                'message': 'Nutritionist not found'
+            }), 404
+        
+        success, report, error = NutritionistService.assign_meal_plan_template(
+            nutritionist_id=nutritionist.id,
+            template_id=template_id,
+            patient_ids=patient_ids,
+            generated_by_uid=firebase_uid,
+            start_date=start_date,
+            approve=bool(request_data.get('approve', False))
+        )
+        
+        if not success:
+            return jsonify({
+                'success': False,
+                'message': error
+            }), 400
+        
+        return jsonify({
+            'success': True,
+            'message': f"Assigned template to {report['succeeded']} of {report['total']} patients",
+            'data': report
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Server error: {str(e)}'
+        }), 500
+
 @nutritionist_bp.route('/patients/<int:patient_id>/meal-plans/stats', methods=['GET'])
 @require_auth
 def get_patient_meal_plan_stats(patient_id):
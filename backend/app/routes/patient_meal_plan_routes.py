@@ -4,7 +4,12 @@ Patients can only see the latest approved version.
 """
 from flask import Blueprint, request, jsonify
 from app.services.meal_plan_versioning_service import MealPlanVersioningService
+from app.services.plan_etags import plan_etags
+from app.services.plan_loading import PATIENT_PLAN_VIEW
+from app.services.plan_nutrition import DAY_ORDER, plan_meal_date, plan_nutrition
+from app.services.recipe_catalog import recipe_catalog
 from app.models.sql_models import PatientInvitation
+from app.utils.conditional import not_modified_response, with_etag
 
 patient_meal_plan_bp = Blueprint('patient_meal_plan', __name__, url_prefix='/api/patient')
 
@@ -12,6 +17,12 @@ patient_meal_plan_bp = Blueprint('patient_meal_plan', __name__, url_prefix='/api
 def get_patient_meal_plan(token):
     """Get the latest approved meal plan for a patient using their invitation token."""
     try:
+        # Unchanged plan: answer 304 from a single lookup by token
+        etag = plan_etags.for_patient_token(token)
+        not_modified = not_modified_response(etag)
+        if not_modified is not None:
+            return not_modified
+        
         # Get invitation by token
         invitation = PatientInvitation.query.filter_by(token=token).first()
         if not invitation:
@@ -34,8 +45,10 @@ def get_patient_meal_plan(token):
                 'message': 'Patient profile not found'
             }), 404
         
-        # Get latest approved meal plan
-        latest_plan = MealPlanVersioningService.get_patient_latest_meal_plan(invitation.patient.id)
+        # Get latest approved meal plan with meals, recipes and patient restrictions
+        latest_plan = MealPlanVersioningService.get_patient_latest_meal_plan(
+            invitation.patient.id, options=PATIENT_PLAN_VIEW
+        )
         
         if not latest_plan:
             return jsonify({
@@ -68,25 +81,30 @@ def get_patient_meal_plan(token):
             'meals': []
         }
         
-        # Organize meals by day and type
-        days_order = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+        # Organize meals by date (legacy meals without meal_date by day of week) and type
         meal_types_order = ['breakfast', 'lunch', 'dinner', 'snack']
-        
-        # Group meals by day
-        meals_by_day = {}
-        for meal in latest_plan.meals:
-            day = meal.day_of_week
-            if day not in meals_by_day:
-                meals_by_day[day] = {}
-            meals_by_day[day][meal.meal_type] = {
+        plan_days = (latest_plan.end_date - latest_plan.start_date).days + 1
+        
+        # Nutrition per meal from the columnar recipe snapshot
+        plan_meals = latest_plan.meals
+        meal_macros = recipe_catalog.snapshot().meal_macros([meal.recipe_id for meal in plan_meals])
+        
+        # Group meals by date
+        meals_by_date = {}
+        for meal, macros in zip(plan_meals, meal_macros):
+            if meal.meal_type not in meal_types_order:
+                continue
+            meal_date = plan_meal_date(latest_plan.start_date, plan_days, meal.meal_date, meal.day_of_week)
+            meals_by_date.setdefault(meal_date, {}).setdefault(meal.meal_type, []).append({
+                'type': meal.meal_type.title(),
                 'recipe_name': meal.recipe.recipe_name if meal.recipe else 'Unknown Recipe',
                 'recipe_id': meal.recipe_id,
                 'servings': float(meal.servings),
                 'scheduled_time': meal.scheduled_time.strftime('%H:%M') if meal.scheduled_time else None,
-                'calories': float(meal.recipe.total_calories) if meal.recipe and meal.recipe.total_calories else 0,
-                'protein': float(meal.recipe.total_protein) if meal.recipe and meal.recipe.total_protein else 0,
-                'carbs': float(meal.recipe.total_carbs) if meal.recipe and meal.recipe.total_carbs else 0,
-                'fat': float(meal.recipe.total_fat) if meal.recipe and meal.recipe.total_fat else 0,
+                'calories': round(float(macros[0]), 2),
+                'protein': round(float(macros[1]), 2),
+                'carbs': round(float(macros[2]), 2),
+                'fat': round(float(macros[3]), 2),
                 'preparation_time': meal.recipe.preparation_time if meal.recipe else None,
                 'cooking_time': meal.recipe.cooking_time if meal.recipe else None,
                 'difficulty': meal.recipe.difficulty_level if meal.recipe else None,
@@ -98,29 +116,27 @@ def get_patient_meal_plan(token):
                     } for ri in meal.recipe.ingredients
                 ] if meal.recipe else [],
                 'instructions': meal.recipe.instructions if meal.recipe else None
-            }
-        
-        # Format meals in ordered structure
-        for day in days_order:
-            if day in meals_by_day:
-                day_meals = []
-                for meal_type in meal_types_order:
-                    if meal_type in meals_by_day[day]:
-                        meal_data = meals_by_day[day][meal_type]
-                        meal_data['type'] = meal_type.title()
-                        day_meals.append(meal_data)
-                
-                if day_meals:  # Only add days that have meals
-                    response_data['meals'].append({
-                        'day': day.title(),
-                        'day_of_week': day,
-                        'meals': day_meals
-                    })
-        
-        return jsonify({
+            })
+        
+        # Format meals in ordered structure: one entry per date
+        for meal_date in sorted(meals_by_date):
+            day = DAY_ORDER[meal_date.weekday()]
+            day_meals = [
+                meal_data
+                for meal_type in meal_types_order
+                for meal_data in meals_by_date[meal_date].get(meal_type, [])
+            ]
+            response_data['meals'].append({
+                'day': day.title(),
+                'day_of_week': day,
+                'date': meal_date.isoformat(),
+                'meals': day_meals
+            })
+        
+        return with_etag(jsonify({
             'success': True,
             'data': response_data
-        })
+        }), etag)
         
     except Exception as e:
         return jsonify({
@@ -155,24 +171,20 @@ def get_patient_meal_plan_summary(token):
                 'message': 'No approved meal plan found'
             }), 404
         
-        # Calculate summary statistics
-        total_calories = 0
-        total_protein = 0
-        total_carbs = 0
-        total_fat = 0
-        meal_count = 0
-        
-        for meal in latest_plan.meals:
-            if meal.recipe:
-                meal_count += 1
-                servings = float(meal.servings)
-                total_calories += float(meal.recipe.total_calories or 0) * servings
-                total_protein += float(meal.recipe.total_protein or 0) * servings
-                total_carbs += float(meal.recipe.total_carbs or 0) * servings
-                total_fat += float(meal.recipe.total_fat or 0) * servings
-        
-        # Calculate daily averages (assuming 7 days)
-        days_count = 7
+        # Plan totals from the per-day nutrition table (one aggregate query by plan_id)
+        totals = plan_nutrition.plan_totals(latest_plan.id)
+        if totals is None:
+            # Plans created before the table existed: computed in memory, this GET does not
+            # write (scripts/add_meal_plan_nutrition_table.py backfills the rows)
+            days = plan_nutrition.compute_plan_days(latest_plan.id)
+            totals = {'days': len(days), **plan_nutrition.breakdown(days)['totals']}
+        meal_count = totals['meal_count']
+        total_calories, total_protein, total_carbs, total_fat = (
+            totals['calories'], totals['protein'], totals['carbs'], totals['fat']
+        )
+        
+        # Calculate daily averages over the plan length
+        days_count = totals['days']
         avg_daily_calories = total_calories / days_count if days_count > 0 else 0
         avg_daily_protein = total_protein / days_count if days_count > 0 else 0
         avg_daily_carbs = total_carbs / days_count if days_count > 0 else 0
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from datetime import datetime
 from sqlalchemy.exc import IntegrityError
 
@@ -7,7 +7,10 @@ from app.models.sql_models import (
     PatientInvitation, Patient, MedicalCondition, FoodIntolerance, DietaryPreference,
     PatientMedicalCondition, PatientIntolerance, PatientDietaryPreference
 )
-from app.services.meal_plan_generator import meal_plan_generator
+from app.services.meal_plan_generator import meal_plan_generator, GENERATE_PLAN_JOB
+from app.services.job_queue import job_queue
+from app.services.plan_etags import plan_etags
+from app.utils.conditional import not_modified_response, with_etag
 from app.utils.responses import success_response, error_response
 
 # Public routes - NO AUTH REQUIRED
@@ -49,7 +52,7 @@ def validate_invitation_token(token):
 
 @public_bp.route('/profiles/<token>', methods=['POST'])
 def complete_patient_profile(token):
-    """Completar perfil del paciente y generar plan automáticamente."""
+    """Completar perfil del paciente y encolar la generación automática del plan."""
     try:
         # 1. Validar token
         invitation = db.session.query(PatientInvitation).filter(
@@ -148,38 +151,24 @@ def complete_patient_profile(token):
         invitation.status = 'completed'
         invitation.completed_at = datetime.utcnow()
         
-        # 8. Guardar cambios hasta aquí
+        # 8. Encolar la generación del plan en la misma transacción que el perfil
+        meal_plan_generator.enqueue_generation(
+            patient_id=patient.id,
+            generated_by_uid=invitation.invited_by_uid
+        )
         db.session.commit()
         
-        # 9. Generar plan de comidas automáticamente
-        try:
-            plan_result = meal_plan_generator.generate_for_new_patient(
-                patient_id=patient.id,
-                generated_by_uid=invitation.invited_by_uid
-            )
-            
-            return jsonify({
-                'success': True,
-                'patient_id': patient.id,
-                'meal_plan_token': plan_result['token'],
-                'meal_plan_link': f'/my-meal-plan/{plan_result["token"]}',
-                'message': 'Perfil completado. Tu plan personalizado está listo.',
-                'plan_details': {
-                    'week_start': plan_result['week_start'],
-                    'week_end': plan_result['week_end'],
-                    'meal_count': plan_result['meal_count']
-                }
-            })
-            
-        except Exception as plan_error:
-            # Si falla la generación del plan, devolver éxito del perfil pero notificar el error
-            return jsonify({
-                'success': True,
-                'patient_id': patient.id,
-                'meal_plan_token': None,
-                'message': 'Perfil completado, pero hubo un problema generando el plan de comidas.',
-                'error': f'Error generando plan: {str(plan_error)}'
-            })
+        # 9. El plan se genera en segundo plano; el cliente consulta su estado
+        job_queue.dispatch()
+        
+        return jsonify({
+            'success': True,
+            'patient_id': patient.id,
+            'meal_plan_token': None,
+            'plan_status': 'pending',
+            'plan_status_url': f'/api/public/profiles/{token}/plan-status',
+            'message': 'Perfil completado. Estamos preparando tu plan personalizado.'
+        }), 202
         
     except IntegrityError as e:
         db.session.rollback()
@@ -188,16 +177,65 @@ def complete_patient_profile(token):
         db.session.rollback()
         return error_response(f'Error completando perfil: {str(e)}', 500)
 
+@public_bp.route('/profiles/<token>/plan-status', methods=['GET'])
+def get_plan_generation_status(token):
+    """Consultar el estado de la generación del plan tras completar el perfil."""
+    try:
+        patient_id = db.session.query(Patient.id).join(
+            PatientInvitation, PatientInvitation.id == Patient.invitation_id
+        ).filter(PatientInvitation.token == token).scalar()
+        
+        if not patient_id:
+            return error_response('Perfil no encontrado o token inválido', 404)
+        
+        job = job_queue.get_latest(GENERATE_PLAN_JOB, f"patient:{patient_id}")
+        if not job:
+            return error_response('No hay generación de plan para este perfil', 404)
+        
+        # Solo lectura: los trabajos se ejecutan al encolarse o en el worker, nunca al consultar
+        response = {
+            'success': True,
+            'patient_id': patient_id,
+            'plan_status': job.status,
+            'attempts': job.attempts,
+            'meal_plan_token': None
+        }
+        
+        if job.status == 'completed' and job.result:
+            response.update({
+                'meal_plan_token': job.result['token'],
+                'meal_plan_link': f'/my-meal-plan/{job.result["token"]}',
+                'plan_details': {
+                    'week_start': job.result.get('week_start'),
+                    'week_end': job.result.get('week_end'),
+                    'meal_count': job.result.get('meal_count')
+                }
+            })
+        elif job.status == 'failed':
+            response['error'] = f'Error generando plan: {job.last_error}'
+        
+        return jsonify(response)
+        
+    except Exception as e:
+        return error_response(f'Error consultando estado del plan: {str(e)}', 500)
+
 @public_bp.route('/meal-plans/<token>', methods=['GET'])
 def view_patient_meal_plan(token):
     """Ver plan de comidas del paciente usando token público."""
     try:
-        plan_data = meal_plan_generator.get_plan_by_token(token)
+        # Plan sin cambios para el cliente: 304 con una sola consulta por el token
+        etag = plan_etags.for_public_token(token)
+        not_modified = not_modified_response(etag)
+        if not_modified is not None:
+            return not_modified
+        
+        # JSON ya renderizado (desde la caché de vistas públicas si está disponible)
+        body = meal_plan_generator.render_plan_by_token(token, etag)
         
-        if not plan_data:
+        if body is None:
             return error_response('Plan no encontrado o token inválido', 404)
         
-        return jsonify(plan_data)
+        return with_etag(Response(body, mimetype='application/json'), etag)
         
     except Exception as e:
         return error_response(f'Error obteniendo plan de comidas: {str(e)}', 500)
@@ -0,0 +1,197 @@
+"""
+Análisis de cobertura del catálogo por combinación de restricciones.
+
+La generación falla (``validate_recipe_availability``) cuando un paciente no
+tiene suficientes recetas compatibles de algún tipo de comida. Este análisis
+lo detecta antes: enumera las combinaciones de intolerancias, condiciones
+médicas y preferencias presentes entre los pacientes activos (y, opcionalmente,
+todos los subconjuntos de hasta ``k`` restricciones) y cuenta las recetas
+compatibles de cada una.
+
+Cada restricción se reduce una sola vez a un bitset de recetas excluidas por
+tipo de comida (ver ``RecipeCompatibilityIndex.excluded_recipe_bits``). Como
+las reglas se combinan de forma conjuntiva, las recetas compatibles con una
+combinación son el complemento del OR de sus bitsets, y el conteo se hace con
+una tabla de popcount sobre lotes de combinaciones del mismo tamaño.
+"""
+import itertools
+import time
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from flask import current_app
+
+from app.services.database_service import db
+from app.services.catalog_version import catalog_version
+from app.services.recipe_index import recipe_compatibility_index
+from app.models.sql_models import (
+    DietaryPreference, FoodIntolerance, IntoleranceIngredient, MedicalCondition, Patient,
+    PatientDietaryPreference, PatientIntolerance, PatientMedicalCondition
+)
+
+# Bits a uno de cada byte
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.int64)
+
+# Bytes de bitsets intermedios por lote de combinaciones
+BATCH_BYTES = 32 * 2 ** 20
+
+RESTRICTION_KINDS = ('intolerance', 'condition', 'preference')
+
+# Tipos de comida que incluye un plan (los snacks no se planifican)
+PLANNED_MEAL_TYPES = ('breakfast', 'lunch', 'dinner')
+
+
+class Restriction(NamedTuple):
+    kind: str   # 'intolerance', 'condition' o 'preference'
+    id: int
+    name: str
+    is_active: bool
+
+
+class CatalogCoverageAnalyzer:
+    """Cuenta las recetas compatibles por combinación de restricciones."""
+
+    def analyze(self, max_subset_size: int = 0, required_per_type: Optional[int] = None,
+                include_covered: bool = False) -> Dict[str, Any]:
+        """
+        Analiza la cobertura del catálogo.
+
+        Args:
+            max_subset_size: Además de las combinaciones de los pacientes, analizar
+                todos los subconjuntos de hasta este número de restricciones (0: ninguno)
+            required_per_type: Recetas distintas necesarias por tipo de comida
+                (por defecto, las de un plan semanal)
+            include_covered: Incluir también las combinaciones con cobertura suficiente
+
+        Returns:
+            Resumen con las combinaciones sin cobertura suficiente, ordenadas por
+            número de pacientes afectados
+        """
+        started = time.perf_counter()
+        if required_per_type is None:
+            required_per_type = min(int(current_app.config.get('MEAL_PLAN_NO_REPEAT_DAYS', 7)), 7)
+
+        restrictions = self._load_restrictions()
+        positions = {(restriction.kind, restriction.id): i for i, restriction in enumerate(restrictions)}
+        patient_combinations = self._patient_combinations(positions)
+
+        combinations = dict.fromkeys(patient_combinations)
+        active = [i for i, restriction in enumerate(restrictions) if restriction.is_active]
+        for size in range(1, max_subset_size + 1):
+            combinations.update(dict.fromkeys(itertools.combinations(active, size)))
+        combinations[()] = None
+
+        counts = self._count_compatible(restrictions, list(combinations))
+
+        results = []
+        for combination, recipe_counts in counts.items():
+            short = [meal_type for meal_type, count in recipe_counts.items() if count < required_per_type]
+            if not short and not include_covered:
+                continue
+            entry = {kind + '_ids': [] for kind in RESTRICTION_KINDS}
+            for i in combination:
+                entry[restrictions[i].kind + '_ids'].append(restrictions[i].id)
+            entry.update({
+                'restrictions': [f'{restrictions[i].kind}: {restrictions[i].name}' for i in combination],
+                'patients': patient_combinations.get(combination, 0),
+                'recipe_counts': recipe_counts,
+                'short_meal_types': short
+            })
+            results.append(entry)
+        results.sort(key=lambda entry: (-entry['patients'], min(entry['recipe_counts'].values()),
+                                        len(entry['restrictions'])))
+
+        uncovered = [entry for entry in results if entry['short_meal_types']]
+        return {
+            'catalog_version': catalog_version.current(),
+            'required_per_type': required_per_type,
+            'max_subset_size': max_subset_size,
+            'restrictions': len(restrictions),
+            'patient_combinations': len(patient_combinations),
+            'combinations_checked': len(counts),
+            'uncovered': len(uncovered),
+            'uncovered_patients': sum(entry['patients'] for entry in uncovered),
+            'elapsed_seconds': round(time.perf_counter() - started, 3),
+            'combinations': results
+        }
+
+    def _load_restrictions(self) -> List[Restriction]:
+        """Carga las intolerancias, condiciones y preferencias del catálogo."""
+        restrictions = []
+        for kind, model, name_column in (
+            ('intolerance', FoodIntolerance, FoodIntolerance.intolerance_name),
+            ('condition', MedicalCondition, MedicalCondition.condition_name),
+            ('preference', DietaryPreference, DietaryPreference.preference_name)
+        ):
+            rows = db.session.query(model.id, name_column, model.is_active).order_by(model.id)
+            restrictions.extend(Restriction(kind, row[0], row[1], row[2] is not False) for row in rows)
+        return restrictions
+
+    def _patient_combinations(self, positions: Dict[Tuple[str, int], int]) -> Dict[Tuple[int, ...], int]:
+        """Cuenta los pacientes activos por combinación de restricciones (posiciones ordenadas)."""
+        assigned: Dict[int, set] = {}
+        for kind, model, column in (
+            ('intolerance', PatientIntolerance, PatientIntolerance.intolerance_id),
+            ('condition', PatientMedicalCondition, PatientMedicalCondition.condition_id),
+            ('preference', PatientDietaryPreference, PatientDietaryPreference.preference_id)
+        ):
+            rows = db.session.query(model.patient_id, column).join(
+                Patient, Patient.id == model.patient_id
+            ).filter(Patient.is_active == True)
+            for patient_id, restriction_id in rows:
+                # La generación aplica también las restricciones desactivadas en el catálogo
+                assigned.setdefault(patient_id, set()).add(positions[(kind, restriction_id)])
+
+        patients = db.session.query(db.func.count(Patient.id)).filter(Patient.is_active == True).scalar()
+        combinations = Counter(tuple(sorted(restriction_set)) for restriction_set in assigned.values())
+        if patients > len(assigned):
+            combinations[()] += patients - len(assigned)
+        return dict(combinations)
+
+    def _count_compatible(self, restrictions: List[Restriction],
+                          combinations: List[Tuple[int, ...]]) -> Dict[Tuple[int, ...], Dict[str, int]]:
+        """Cuenta las recetas compatibles de cada combinación por tipo de comida."""
+        ingredients: Dict[int, set] = {}
+        intolerance_ids = [restriction.id for restriction in restrictions if restriction.kind == 'intolerance']
+        if intolerance_ids:
+            rows = db.session.query(IntoleranceIngredient.intolerance_id, IntoleranceIngredient.ingredient_id).filter(
+                IntoleranceIngredient.intolerance_id.in_(intolerance_ids)
+            )
+            for intolerance_id, ingredient_id in rows:
+                ingredients.setdefault(intolerance_id, set()).add(ingredient_id)
+
+        excluded = recipe_compatibility_index.excluded_recipe_bits(
+            (
+                ingredients.get(restriction.id, ()) if restriction.kind == 'intolerance' else (),
+                (restriction.id,) if restriction.kind == 'condition' else (),
+                (restriction.id,) if restriction.kind == 'preference' else ()
+            )
+            for restriction in restrictions
+        )
+
+        counts = {combination: dict.fromkeys(PLANNED_MEAL_TYPES, 0) for combination in combinations}
+        by_size: Dict[int, List[Tuple[int, ...]]] = {}
+        for combination in combinations:
+            by_size.setdefault(len(combination), []).append(combination)
+
+        for meal_type, (count, bits) in excluded.items():
+            if meal_type not in PLANNED_MEAL_TYPES:
+                continue
+            for size, group in by_size.items():
+                if not size:
+                    for combination in group:
+                        counts[combination][meal_type] = count
+                    continue
+                members = np.array(group, dtype=np.int64)
+                batch = max(1, BATCH_BYTES // max(1, size * bits.shape[1]))
+                for start in range(0, len(group), batch):
+                    union = np.bitwise_or.reduce(bits[members[start:start + batch]], axis=1)
+                    compatible = count - POPCOUNT[union].sum(axis=1)
+                    for combination, value in zip(group[start:start + batch], compatible.tolist()):
+                        counts[combination][meal_type] = value
+        return counts
+
+
+# Instancia global
+catalog_coverage_analyzer = CatalogCoverageAnalyzer()
@@ -0,0 +1,132 @@
+"""
+Versión del catálogo de recetas e ingredientes.
+
+Los índices en memoria (compatibilidad de recetas, etc.) se reconstruyen
+cuando cambia esta versión. Los cambios hechos en este proceso se detectan
+al hacer commit; los hechos por otros procesos se detectan comparando una
+huella (conteo y última actualización de cada tabla) consultada como máximo
+una vez cada ``CATALOG_VERSION_TTL`` segundos.
+"""
+import hashlib
+import threading
+import time
+from typing import Optional, Tuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from app.services.database_service import db
+from app.models.sql_models import (
+    Recipe, RecipeIngredient, Ingredient, IntoleranceIngredient, MedicalConditionRule,
+    RecipeTag, RecipeTagAssignment, DietaryPreferenceTag
+)
+
+# Modelos cuyos cambios invalidan los índices del catálogo
+WATCHED_MODELS = (
+    Recipe, RecipeIngredient, Ingredient, IntoleranceIngredient, MedicalConditionRule,
+    RecipeTag, RecipeTagAssignment, DietaryPreferenceTag
+)
+
+DEFAULT_TTL_SECONDS = 5.0
+
+
+class CatalogVersion:
+    """Contador de versión del catálogo, compartido por todo el proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._fingerprint: Optional[Tuple] = None
+        self._checked_at = 0.0
+
+    def current(self) -> int:
+        """
+        Devuelve la versión actual del catálogo.
+
+        Returns:
+            Entero que aumenta cada vez que se detecta un cambio
+        """
+        if time.monotonic() - self._checked_at < self._ttl():
+            return self._generation
+        return self.refresh()
+
+    def refresh(self) -> int:
+        """
+        Relee la huella sin esperar al TTL (trabajos que deben ver cambios de otros procesos).
+
+        Returns:
+            Versión actual del catálogo
+        """
+        now = time.monotonic()
+        fingerprint = self._read_fingerprint()
+        with self._lock:
+            if fingerprint != self._fingerprint:
+                if self._fingerprint is not None:
+                    self._generation += 1
+                self._fingerprint = fingerprint
+            self._checked_at = now
+            return self._generation
+
+    def fingerprint_key(self) -> str:
+        """
+        Clave de la versión actual que coincide entre procesos.
+
+        Returns:
+            Hash corto de la huella de las tablas vigiladas
+        """
+        self.current()
+        with self._lock:
+            fingerprint = self._fingerprint
+        return hashlib.sha1(repr(fingerprint).encode('utf-8')).hexdigest()[:16]
+
+    def mark_changed(self):
+        """Invalida la versión actual (cambios confirmados en este proceso)."""
+        with self._lock:
+            self._generation += 1
+            # Forzar la relectura de la huella en la próxima consulta
+            self._checked_at = 0.0
+
+    def _ttl(self) -> float:
+        if has_app_context():
+            return float(current_app.config.get('CATALOG_VERSION_TTL', DEFAULT_TTL_SECONDS))
+        return DEFAULT_TTL_SECONDS
+
+    def _read_fingerprint(self) -> Tuple:
+        """Lee conteo y última modificación de cada tabla vigilada en una sola consulta."""
+        columns = []
+        for model in WATCHED_MODELS:
+            columns.append(select(func.count(model.id)).scalar_subquery())
+            columns.append(select(func.max(model.updated_at)).scalar_subquery())
+        return tuple(db.session.execute(select(*columns)).one())
+
+
+def _touches_catalog(session: Session) -> bool:
+    for obj in session.new | session.deleted:
+        if isinstance(obj, WATCHED_MODELS):
+            return True
+    for obj in session.dirty:
+        if isinstance(obj, WATCHED_MODELS) and session.is_modified(obj):
+            return True
+    return False
+
+
+@event.listens_for(Session, 'after_flush')
+def _remember_catalog_changes(session, flush_context):
+    if _touches_catalog(session):
+        session.info['catalog_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_catalog_version(session):
+    if session.info.pop('catalog_changed', False):
+        catalog_version.mark_changed()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_catalog_changes(session):
+    session.info.pop('catalog_changed', None)
+
+
+# Instancia global
+catalog_version = CatalogVersion()
@@ -0,0 +1,113 @@
+"""
+Caché de recetas compatibles por firma de restricciones.
+
+La mayoría de los pacientes comparte pocas combinaciones de restricciones
+(solo lactosa, solo gluten, ninguna...). El conjunto de recetas compatibles
+se guarda por un hash canónico de intolerancias, condiciones médicas y
+preferencias, con desalojo LRU acotado. Todas las entradas se descartan
+cuando cambia la versión del catálogo.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from flask import current_app, has_app_context
+
+from app.services.catalog_version import catalog_version
+
+DEFAULT_MAX_ENTRIES = 256
+
+CompatibleRecipes = Dict[str, Tuple[int, ...]]
+
+
+def restriction_key(intolerance_ids: Iterable[int], condition_ids: Iterable[int] = (),
+                    preference_ids: Iterable[int] = ()) -> str:
+    """
+    Calcula el hash canónico de un conjunto de restricciones.
+
+    El orden y los duplicados de los IDs no afectan al resultado.
+    """
+    parts = []
+    for prefix, ids in (('i', intolerance_ids), ('c', condition_ids), ('p', preference_ids)):
+        parts.append(prefix + ':' + ','.join(str(i) for i in sorted(set(ids))))
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+class CompatibleRecipeCache:
+    """LRU de recetas compatibles por tipo de comida, etiquetado con la versión del catálogo."""
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._entries: 'OrderedDict[str, CompatibleRecipes]' = OrderedDict()
+        self._version = None
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get_or_compute(self, key: str, compute: Callable[[], CompatibleRecipes]) -> CompatibleRecipes:
+        """
+        Obtiene las recetas compatibles de una firma, calculándolas si no están en caché.
+
+        Args:
+            key: Hash de ``restriction_key``
+            compute: Función que calcula las recetas compatibles por tipo de comida
+
+        Returns:
+            Dict con tuplas de IDs de recetas por tipo de comida
+        """
+        version = catalog_version.current()
+        with self._lock:
+            if self._version != version:
+                self._entries.clear()
+                self._version = version
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return cached
+            self._misses += 1
+
+        value = {meal_type: tuple(ids) for meal_type, ids in compute().items()}
+
+        with self._lock:
+            # No guardar resultados calculados con una versión anterior del catálogo
+            if self._version == version:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                max_entries = self._get_max_entries()
+                while len(self._entries) > max_entries:
+                    self._entries.popitem(last=False)
+                    self._evictions += 1
+        return value
+
+    def clear(self):
+        """Vacía la caché (las estadísticas se conservan)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Estadísticas de uso de la caché."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self._get_max_entries(),
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'catalog_version': self._version
+            }
+
+    def _get_max_entries(self) -> int:
+        if self._max_entries is not None:
+            return self._max_entries
+        if has_app_context():
+            return int(current_app.config.get('COMPATIBLE_RECIPE_CACHE_SIZE', DEFAULT_MAX_ENTRIES))
+        return DEFAULT_MAX_ENTRIES
+
+
+# Instancia global
+compatible_recipe_cache = CompatibleRecipeCache()
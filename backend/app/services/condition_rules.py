@@ -0,0 +1,116 @@
+"""
+Reglas dietéticas por condición médica.
+
+Cada ``MedicalCondition`` se asocia a restricciones declarativas por comida
+(``medical_condition_rules``): máximos o mínimos de una macro y categorías de
+ingredientes excluidas. Las reglas de un conjunto de condiciones se combinan
+en una sola restricción (el máximo más estricto, el mínimo más estricto y la
+unión de categorías) que el índice de recetas compila a máscaras booleanas.
+Las reglas se cargan una vez por versión del catálogo.
+"""
+import threading
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+
+from app.services.database_service import db
+from app.services.catalog_version import catalog_version
+from app.models.sql_models import MedicalConditionRule
+
+# Orden de las columnas de macros del índice de recetas
+NUTRIENT_COLUMNS = {'calories': 0, 'protein': 1, 'carbs': 2, 'fat': 3}
+
+
+def normalize_category(category: Optional[str]) -> str:
+    """Normaliza una categoría de ingrediente para compararla."""
+    return (category or '').strip().lower()
+
+
+class ConditionConstraints(NamedTuple):
+    """Restricción combinada por comida de una o más condiciones médicas."""
+    max_macros: np.ndarray                  # (4,) float64, ``inf`` sin límite
+    min_macros: np.ndarray                  # (4,) float64, ``-inf`` sin límite
+    excluded_categories: FrozenSet[str]     # Categorías normalizadas
+
+
+class ConditionRuleSet:
+    """Obtiene las restricciones combinadas de las condiciones médicas de un paciente."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._rules: Dict[int, ConditionConstraints] = {}
+
+    def constraints_for(self, condition_ids: Iterable[int]) -> Optional[ConditionConstraints]:
+        """
+        Combina las reglas de un conjunto de condiciones médicas.
+
+        Args:
+            condition_ids: IDs de ``MedicalCondition``
+
+        Returns:
+            Restricción combinada, o None si ninguna condición tiene reglas
+        """
+        rules = self._get_rules()
+        selected = [rules[condition_id] for condition_id in set(condition_ids) if condition_id in rules]
+        if not selected:
+            return None
+
+        return ConditionConstraints(
+            max_macros=np.min([rule.max_macros for rule in selected], axis=0),
+            min_macros=np.max([rule.min_macros for rule in selected], axis=0),
+            excluded_categories=frozenset().union(*(rule.excluded_categories for rule in selected))
+        )
+
+    def _get_rules(self) -> Dict[int, ConditionConstraints]:
+        version = catalog_version.current()
+        with self._lock:
+            if self._version == version:
+                return self._rules
+
+        rules = self._load()
+        with self._lock:
+            self._rules = rules
+            self._version = version
+        return rules
+
+    def _load(self) -> Dict[int, ConditionConstraints]:
+        """Carga todas las reglas activas en una sola consulta."""
+        rows = db.session.query(
+            MedicalConditionRule.condition_id, MedicalConditionRule.rule_type,
+            MedicalConditionRule.nutrient, MedicalConditionRule.value, MedicalConditionRule.category
+        ).filter(MedicalConditionRule.is_active == True).all()
+
+        maxima: Dict[int, np.ndarray] = {}
+        minima: Dict[int, np.ndarray] = {}
+        categories: Dict[int, List[str]] = {}
+        for condition_id, rule_type, nutrient, value, category in rows:
+            upper = maxima.setdefault(condition_id, np.full(len(NUTRIENT_COLUMNS), np.inf))
+            lower = minima.setdefault(condition_id, np.full(len(NUTRIENT_COLUMNS), -np.inf))
+            excluded = categories.setdefault(condition_id, [])
+
+            if rule_type == 'exclude_category':
+                if normalize_category(category):
+                    excluded.append(normalize_category(category))
+                continue
+            # Reglas incompletas se ignoran en lugar de bloquear la generación
+            if nutrient not in NUTRIENT_COLUMNS or value is None:
+                continue
+            column = NUTRIENT_COLUMNS[nutrient]
+            if rule_type == 'max_nutrient':
+                upper[column] = min(upper[column], float(value))
+            elif rule_type == 'min_nutrient':
+                lower[column] = max(lower[column], float(value))
+
+        return {
+            condition_id: ConditionConstraints(
+                max_macros=maxima[condition_id],
+                min_macros=minima[condition_id],
+                excluded_categories=frozenset(categories[condition_id])
+            )
+            for condition_id in maxima
+        }
+
+
+# Instancia global
+condition_rule_set = ConditionRuleSet()
@@ -74,10 +74,10 @@ def create_tables():
     try:
         # Import all models to register them
         from app.models.sql_models import (
-            PatientInvitation, Patient, MedicalCondition, FoodIntolerance, 
+            PatientInvitation, Patient, MedicalCondition, MedicalConditionRule, FoodIntolerance, 
             DietaryPreference, PatientMedicalCondition, PatientIntolerance, 
-            PatientDietaryPreference, Ingredient, RecipeTag, Recipe, 
-            RecipeIngredient, RecipeTagAssignment, MealPlan, MealPlanMeal, MealPlanToken
+            PatientDietaryPreference, Ingredient, IntoleranceIngredient, RecipeTag, Recipe, 
+            RecipeIngredient, RecipeTagAssignment, DietaryPreferenceTag, MealPlan, MealPlanMeal, MealPlanToken, BackgroundJob
         )
         
         db.create_all()
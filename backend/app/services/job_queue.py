@@ -0,0 +1,274 @@
+"""
+Cola de trabajos en segundo plano respaldada por la tabla ``background_jobs``.
+
+Los trabajos se encolan dentro de la transacción del llamador, de modo que solo
+existen si ese commit se confirma. Un worker los reclama (``FOR UPDATE SKIP
+LOCKED`` en PostgreSQL más una actualización condicional), ejecuta el handler
+registrado para su tipo y reintenta con espera exponencial ante errores. Los
+bloqueos de workers caídos expiran tras ``JOB_LOCK_TIMEOUT_SECONDS``, por lo
+que cada trabajo se ejecuta al menos una vez y los handlers deben ser idempotentes.
+
+Modos (``JOB_QUEUE_MODE``):
+    thread: pool de hilos en el mismo proceso (desarrollo)
+    worker: solo el proceso ``run_worker.py`` ejecuta los trabajos
+    inline: se ejecutan al despachar, dentro de la petición (serverless)
+
+Solo se despacha al encolar. En los modos ``thread`` e ``inline``, los trabajos
+que quedan pendientes (proceso reiniciado, reintento con espera) se ejecutan en
+el siguiente despacho o con ``run_worker.py --once``.
+"""
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from flask import current_app, has_app_context
+from sqlalchemy import and_, or_, update
+
+from app.services.database_service import db
+from app.models.sql_models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODE = 'thread'
+DEFAULT_THREADS = 2
+DEFAULT_RETRY_BASE_SECONDS = 10.0
+DEFAULT_LOCK_TIMEOUT_SECONDS = 300.0
+
+
+class JobQueueService:
+    """Encola, reclama y ejecuta trabajos de ``background_jobs``."""
+
+    def __init__(self):
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def register(self, job_type: str, handler: Callable[[Dict[str, Any]], Any]):
+        """
+        Registra el handler de un tipo de trabajo.
+
+        El handler recibe el payload y devuelve un resultado serializable a JSON.
+        No debe hacer commit: el resultado se confirma junto con el estado del trabajo.
+        """
+        self._handlers[job_type] = handler
+
+    def enqueue(self, job_type: str, payload: Dict[str, Any], reference: Optional[str] = None,
+                max_attempts: Optional[int] = None, run_after: Optional[datetime] = None) -> BackgroundJob:
+        """
+        Agrega un trabajo a la sesión actual (sin commit).
+
+        Args:
+            job_type: Tipo de trabajo registrado
+            payload: Datos para el handler
+            reference: Clave para consultar el estado (ej. ``patient:42``)
+            max_attempts: Intentos antes de marcarlo como fallido
+            run_after: No ejecutar antes de esta fecha (UTC)
+
+        Returns:
+            Trabajo pendiente
+        """
+        job = BackgroundJob(
+            job_type=job_type,
+            reference=reference,
+            payload=payload,
+            status='pending',
+            attempts=0,
+            run_after=run_after or datetime.utcnow()
+        )
+        if max_attempts is not None:
+            job.max_attempts = max_attempts
+        db.session.add(job)
+        return job
+
+    def get_latest(self, job_type: str, reference: str) -> Optional[BackgroundJob]:
+        """Obtiene el trabajo más reciente de un tipo para una referencia."""
+        return db.session.query(BackgroundJob).filter(
+            BackgroundJob.job_type == job_type,
+            BackgroundJob.reference == reference
+        ).order_by(BackgroundJob.id.desc()).first()
+
+    def claim_next(self, worker_id: str, job_types: Optional[Iterable[str]] = None) -> Optional[BackgroundJob]:
+        """
+        Reclama el siguiente trabajo disponible.
+
+        Son elegibles los pendientes cuya hora llegó y los que están en ejecución
+        con un bloqueo expirado (worker caído).
+
+        Returns:
+            Trabajo marcado como ``running`` o None si no hay trabajos
+        """
+        while True:
+            now = datetime.utcnow()
+            stale_before = now - timedelta(seconds=self._get_setting('JOB_LOCK_TIMEOUT_SECONDS', DEFAULT_LOCK_TIMEOUT_SECONDS))
+
+            query = db.session.query(BackgroundJob.id, BackgroundJob.attempts).filter(or_(
+                and_(BackgroundJob.status == 'pending', BackgroundJob.run_after <= now),
+                and_(BackgroundJob.status == 'running', BackgroundJob.locked_at < stale_before)
+            ))
+            if job_types:
+                query = query.filter(BackgroundJob.job_type.in_(list(job_types)))
+            query = query.order_by(BackgroundJob.run_after, BackgroundJob.id).limit(1)
+            if db.engine.dialect.name == 'postgresql':
+                query = query.with_for_update(skip_locked=True)
+
+            candidate = query.first()
+            if candidate is None:
+                db.session.rollback()
+                return None
+
+            # El contador de intentos actúa como versión: si otro worker lo reclamó antes, no se actualiza
+            claimed = db.session.execute(
+                update(BackgroundJob).where(
+                    BackgroundJob.id == candidate.id,
+                    BackgroundJob.attempts == candidate.attempts
+                ).values(
+                    status='running',
+                    attempts=BackgroundJob.attempts + 1,
+                    locked_at=now,
+                    locked_by=worker_id
+                ).execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            if not claimed:
+                continue
+
+            job = db.session.get(BackgroundJob, candidate.id)
+            if job.attempts > job.max_attempts:
+                # El último intento quedó bloqueado por un worker caído
+                self._mark_failed(job, job.last_error or 'Bloqueo expirado en el último intento')
+                db.session.commit()
+                continue
+            return job
+
+    def run(self, job: BackgroundJob) -> bool:
+        """
+        Ejecuta un trabajo reclamado y guarda su resultado.
+
+        Returns:
+            True si el trabajo se completó
+        """
+        job_id = job.id
+        try:
+            handler = self._handlers.get(job.job_type)
+            if handler is None:
+                raise ValueError(f"Tipo de trabajo desconocido: {job.job_type}")
+
+            result = handler(dict(job.payload or {}))
+
+            job.status = 'completed'
+            job.result = result
+            job.last_error = None
+            job.completed_at = datetime.utcnow()
+            job.locked_at = None
+            job.locked_by = None
+            db.session.commit()
+            return True
+
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Job {job_id} failed: {e}")
+
+            job = db.session.get(BackgroundJob, job_id)
+            if job.attempts >= job.max_attempts:
+                self._mark_failed(job, str(e))
+            else:
+                base = self._get_setting('JOB_RETRY_BASE_SECONDS', DEFAULT_RETRY_BASE_SECONDS)
+                job.status = 'pending'
+                job.last_error = str(e)
+                job.run_after = datetime.utcnow() + timedelta(seconds=base * 2 ** (job.attempts - 1))
+                job.locked_at = None
+                job.locked_by = None
+            db.session.commit()
+            return False
+
+    def run_pending(self, worker_id: Optional[str] = None, max_jobs: Optional[int] = None,
+                    job_types: Optional[Iterable[str]] = None) -> int:
+        """
+        Ejecuta trabajos disponibles hasta vaciar la cola o llegar a ``max_jobs``.
+
+        Returns:
+            Número de trabajos procesados
+        """
+        worker_id = worker_id or self.default_worker_id()
+        processed = 0
+        while max_jobs is None or processed < max_jobs:
+            job = self.claim_next(worker_id, job_types)
+            if job is None:
+                break
+            self.run(job)
+            processed += 1
+        return processed
+
+    def work(self, worker_id: Optional[str] = None, poll_interval: float = 2.0,
+             stop_event: Optional[threading.Event] = None, job_types: Optional[Iterable[str]] = None):
+        """Bucle del worker: procesa la cola y espera ``poll_interval`` cuando está vacía."""
+        worker_id = worker_id or self.default_worker_id()
+        stop_event = stop_event or threading.Event()
+        logger.info(f"Job worker {worker_id} started")
+        while not stop_event.is_set():
+            try:
+                processed = self.run_pending(worker_id, max_jobs=100, job_types=job_types)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Job worker {worker_id} error: {e}")
+                processed = 0
+            if not processed:
+                stop_event.wait(poll_interval)
+        logger.info(f"Job worker {worker_id} stopped")
+
+    def dispatch(self, allow_inline: bool = True):
+        """
+        Avisa que hay trabajos nuevos ya confirmados.
+
+        En modo ``thread`` los procesa un hilo del pool, en ``inline`` se procesan
+        en la petición actual y en ``worker`` no hace nada.
+
+        Args:
+            allow_inline: False cuando no se puede usar la sesión actual (ej. desde
+                un evento ``after_commit``); en modo ``inline`` el trabajo espera
+                al siguiente despacho
+        """
+        mode = self._get_setting('JOB_QUEUE_MODE', DEFAULT_MODE)
+        if mode == 'inline' and allow_inline:
+            self.run_pending()
+        elif mode == 'thread' and has_app_context():
+            app = current_app._get_current_object()
+            self._get_executor().submit(self._drain_in_thread, app)
+
+    @staticmethod
+    def default_worker_id() -> str:
+        return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+    def _drain_in_thread(self, app):
+        with app.app_context():
+            try:
+                self.run_pending()
+            except Exception as e:
+                logger.error(f"Background job thread error: {e}")
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                threads = int(self._get_setting('JOB_QUEUE_THREADS', DEFAULT_THREADS))
+                self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='job-queue')
+            return self._executor
+
+    @staticmethod
+    def _mark_failed(job: BackgroundJob, error: str):
+        job.status = 'failed'
+        job.last_error = error
+        job.locked_at = None
+        job.locked_by = None
+
+    def _get_setting(self, name: str, default):
+        if has_app_context():
+            return current_app.config.get(name, default)
+        return default
+
+
+# Instancia global
+job_queue = JobQueueService()
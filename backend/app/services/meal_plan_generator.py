@@ -1,21 +1,33 @@
 """
 Servicio para generación automática de planes de comidas personalizados.
 """
-import random
 import secrets
-from datetime import datetime, date, timedelta, time
+from datetime import datetime, date, timedelta, time, timezone
 from typing import List, Dict, Any, Optional
-from sqlalchemy import and_, not_, exists
-from sqlalchemy.orm import joinedload
+import numpy as np
+from flask import current_app, has_app_context
+from sqlalchemy import func, insert, update
+from sqlalchemy.orm import selectinload
 
 from app.services.database_service import db
+from app.services.recipe_index import recipe_compatibility_index
+from app.services.recipe_catalog import recipe_catalog
+from app.services.restriction_resolver import restriction_resolver
+from app.services.compatibility_cache import compatible_recipe_cache, restriction_key
+from app.services.plan_optimizer import WeeklyPlanOptimizer, daily_targets_for_patient, random_schedule
+from app.services.job_queue import job_queue
+from app.services.public_plan_cache import RenderedPlan, public_plan_cache
+from app.services.plan_loading import PUBLIC_PLAN_VIEW, patient_restriction_options
+from app.services.recipe_fragments import recipe_fragments
+from app.services.plan_nutrition import plan_meal_date, plan_nutrition
 from app.models.sql_models import (
     Patient, MealPlan, MealPlanMeal, MealPlanToken,
-    Recipe, RecipeIngredient, Ingredient,
-    PatientMedicalCondition, PatientIntolerance, PatientDietaryPreference,
-    MedicalCondition, FoodIntolerance, DietaryPreference
+    Recipe, BackgroundJob
 )
 
+# Tipo de trabajo en segundo plano para generar el plan de un paciente nuevo
+GENERATE_PLAN_JOB = 'generate_meal_plan'
+
 
 class MealPlanGeneratorService:
     """Servicio para generar planes de comidas automáticamente."""
@@ -44,58 +56,440 @@ class MealPlanGeneratorService:
             Dict con el plan generado y token de acceso
         """
         try:
-            # 1. Obtener perfil del paciente con restricciones
-            patient = self._get_patient_with_restrictions(patient_id)
+            result = self._stage_plan_for_new_patient(patient_id, generated_by_uid)
+            db.session.commit()
+            return result
+            
+        except Exception as e:
+            db.session.rollback()
+            raise Exception(f"Error generando plan de comidas: {str(e)}")
+    
+    def enqueue_generation(self, patient_id: int, generated_by_uid: str) -> BackgroundJob:
+        """
+        Encola la generación del plan de un paciente nuevo (sin commit).
+        
+        El trabajo se confirma junto con la transacción del llamador; después
+        debe llamarse a ``job_queue.dispatch()``.
+        
+        Args:
+            patient_id: ID del paciente
+            generated_by_uid: UID del usuario que genera el plan
+            
+        Returns:
+            Trabajo pendiente
+        """
+        return job_queue.enqueue(
+            GENERATE_PLAN_JOB,
+            {'patient_id': patient_id, 'generated_by_uid': generated_by_uid},
+            reference=f"patient:{patient_id}"
+        )
+    
+    def run_generation_job(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Handler del trabajo ``generate_meal_plan``.
+        
+        El plan se guarda en la misma transacción que el estado del trabajo. Si el
+        paciente ya tiene un plan (trabajo repetido), devuelve el existente.
+        """
+        patient_id = payload['patient_id']
+        
+        existing = db.session.query(MealPlan.id, MealPlan.start_date, MealPlan.end_date, MealPlanToken.token).join(
+            MealPlanToken, MealPlanToken.plan_id == MealPlan.id
+        ).filter(
+            MealPlan.patient_id == patient_id,
+            MealPlan.is_latest == True
+        ).first()
+        if existing:
+            return {
+                'plan_id': existing.id,
+                'token': existing.token,
+                'week_start': existing.start_date.isoformat(),
+                'week_end': existing.end_date.isoformat()
+            }
+        
+        return self._stage_plan_for_new_patient(patient_id, payload['generated_by_uid'])
+    
+    def generate_plan(self, patient_id: int, start_date: date, end_date: date, generated_by_uid: str,
+                      nutritionist_id: Optional[int] = None,
+                      no_repeat_days: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Genera un plan borrador para un rango de fechas arbitrario (ej. 30 días).
+        
+        Args:
+            patient_id: ID del paciente
+            start_date: Primer día del plan
+            end_date: Último día del plan (incluido)
+            generated_by_uid: UID del usuario que genera el plan
+            nutritionist_id: Nutricionista responsable
+            no_repeat_days: Una receta no se repite dentro de esta cantidad de días
+                (por defecto ``MEAL_PLAN_NO_REPEAT_DAYS``)
+            
+        Returns:
+            Dict con el ID del plan, token y comidas generadas
+        """
+        try:
+            patient = self.get_patient_with_restrictions(patient_id)
             if not patient:
                 raise ValueError(f"Paciente {patient_id} no encontrado")
             
-            # 2. Calcular fechas (siguiente lunes a domingo)
-            start_date, end_date = self._get_next_week_dates()
-            
-            # 3. Filtrar recetas compatibles
-            compatible_recipes = self._filter_compatible_recipes(patient)
+            days = (end_date - start_date).days + 1
+            if days < 1:
+                raise ValueError("La fecha de fin debe ser posterior a la de inicio")
+            window = min(no_repeat_days or int(self.get_setting('MEAL_PLAN_NO_REPEAT_DAYS', 7)), days)
             
-            # 4. Validar que tengamos suficientes recetas
-            self._validate_recipe_availability(compatible_recipes)
+            compatible_recipes = self.filter_compatible_recipes(patient)
+            self.validate_recipe_availability(compatible_recipes, required_per_type=window)
             
-            # 5. Distribuir recetas en la semana
-            week_meals = self._distribute_recipes_across_week(compatible_recipes)
+            meals = self.distribute_recipes_across_days(
+                compatible_recipes,
+                days=days,
+                start_date=start_date,
+                targets=daily_targets_for_patient(patient),
+                no_repeat_days=window
+            )
             
-            # 6. Crear plan en base de datos
-            plan = self._create_meal_plan(
+            spec = self.build_plan_spec(
                 patient_id=patient_id,
                 start_date=start_date,
                 end_date=end_date,
-                generated_by_uid=generated_by_uid
+                generated_by_uid=generated_by_uid,
+                meals=meals,
+                nutritionist_id=nutritionist_id,
+                draft=True  # Los planes pedidos por el nutricionista quedan para revisión
             )
-            
-            # 7. Crear comidas del plan
-            self._create_meal_plan_meals(plan.id, week_meals)
-            
-            # 8. Generar token para visualización pública
-            token = self._generate_meal_plan_token(plan.id)
+            spec['plan_name'] = f"Plan {start_date.strftime('%d/%m/%Y')} - {end_date.strftime('%d/%m/%Y')}"
+            [(plan_id, token)] = self.bulk_persist_plans([spec])
+            db.session.commit()
             
             return {
-                'plan': plan,
+                'plan_id': plan_id,
                 'token': token,
-                'meal_count': len(week_meals),
-                'week_start': start_date.isoformat(),
-                'week_end': end_date.isoformat()
+                'days': days,
+                'no_repeat_days': window,
+                'meal_count': len(meals),
+                'start_date': start_date.isoformat(),
+                'end_date': end_date.isoformat()
             }
             
         except Exception as e:
             db.session.rollback()
             raise Exception(f"Error generando plan de comidas: {str(e)}")
     
-    def _get_patient_with_restrictions(self, patient_id: int) -> Optional[Patient]:
-        """Obtiene el paciente con todas sus restricciones cargadas."""
+    def _stage_plan_for_new_patient(self, patient_id: int, generated_by_uid: str) -> Dict[str, Any]:
+        """Genera el plan de un paciente nuevo y lo agrega a la transacción actual (sin commit)."""
+        # 1. Obtener perfil del paciente con restricciones
+        patient = self.get_patient_with_restrictions(patient_id)
+        if not patient:
+            raise ValueError(f"Paciente {patient_id} no encontrado")
+        
+        # 2. Calcular fechas (siguiente lunes a domingo)
+        start_date, end_date = self.get_next_week_dates()
+        
+        # 3. Filtrar recetas compatibles
+        compatible_recipes = self.filter_compatible_recipes(patient)
+        
+        # 4. Validar que tengamos suficientes recetas
+        self.validate_recipe_availability(compatible_recipes)
+        
+        # 5. Distribuir recetas en la semana según los objetivos del paciente
+        week_meals = self._distribute_recipes_across_week(
+            compatible_recipes,
+            targets=daily_targets_for_patient(patient),
+            start_date=start_date
+        )
+        
+        # 6. Insertar plan, comidas y token en la transacción actual
+        spec = self.build_plan_spec(
+            patient_id=patient_id,
+            start_date=start_date,
+            end_date=end_date,
+            generated_by_uid=generated_by_uid,
+            meals=week_meals,
+            notes="Plan generado automáticamente al completar perfil"
+        )
+        [(plan_id, token)] = self.bulk_persist_plans([spec])
+        
+        return {
+            'plan_id': plan_id,
+            'token': token,
+            'meal_count': len(week_meals),
+            'week_start': start_date.isoformat(),
+            'week_end': end_date.isoformat()
+        }
+    
+    def generate_for_patients(self, patient_ids: List[int], generated_by_uid: str,
+                              nutritionist_id: Optional[int] = None,
+                              chunk_size: int = 100) -> Dict[str, Any]:
+        """
+        Genera planes de comidas para muchos pacientes en una sola llamada.
+        
+        Carga el catálogo una vez, agrupa a los pacientes por firma de
+        restricciones y escribe planes, comidas y tokens con inserciones
+        masivas en transacciones por bloques.
+        
+        Args:
+            patient_ids: IDs de los pacientes
+            generated_by_uid: UID del usuario que genera los planes
+            nutritionist_id: ID del nutricionista dueño de los planes
+            chunk_size: Pacientes por transacción
+            
+        Returns:
+            Dict con el resultado por paciente y totales
+        """
+        results = {patient_id: {'patient_id': patient_id, 'success': False} for patient_id in patient_ids}
+        
+        patients = self.get_patients_with_restrictions(list(results.keys()))
+        for patient_id in results.keys() - {patient.id for patient in patients}:
+            results[patient_id]['error'] = f"Paciente {patient_id} no encontrado"
+        
+        start_date, end_date = self.get_next_week_dates()
+        
+        # Recetas compatibles una sola vez por firma de restricciones
+        groups: Dict[tuple, List[Patient]] = {}
+        for patient in patients:
+            groups.setdefault(self.restriction_signature(patient), []).append(patient)
+        
+        pending = []
+        for signature, group_patients in groups.items():
+            try:
+                compatible_recipes = self.filter_compatible_recipes(group_patients[0])
+                self.validate_recipe_availability(compatible_recipes)
+            except Exception as e:
+                for patient in group_patients:
+                    results[patient.id]['error'] = str(e)
+                continue
+            
+            for patient in group_patients:
+                try:
+                    week_meals = self._distribute_recipes_across_week(
+                        compatible_recipes,
+                        targets=daily_targets_for_patient(patient),
+                        start_date=start_date
+                    )
+                except Exception as e:
+                    results[patient.id]['error'] = str(e)
+                    continue
+                pending.append(self.build_plan_spec(
+                    patient_id=patient.id,
+                    start_date=start_date,
+                    end_date=end_date,
+                    generated_by_uid=generated_by_uid,
+                    nutritionist_id=nutritionist_id,
+                    meals=week_meals
+                ))
+        
+        # Escritura masiva por bloques: un fallo solo afecta a su bloque
+        for offset in range(0, len(pending), chunk_size):
+            chunk = pending[offset:offset + chunk_size]
+            try:
+                persisted = self.bulk_persist_plans(chunk)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                for spec in chunk:
+                    results[spec['patient_id']]['error'] = f"Error guardando plan: {str(e)}"
+                continue
+            
+            for spec, (plan_id, token) in zip(chunk, persisted):
+                results[spec['patient_id']].update({
+                    'success': True,
+                    'plan_id': plan_id,
+                    'token': token,
+                    'meal_count': len(spec['meals'])
+                })
+        
+        report = list(results.values())
+        succeeded = sum(1 for result in report if result['success'])
+        return {
+            'results': report,
+            'total': len(report),
+            'succeeded': succeeded,
+            'failed': len(report) - succeeded,
+            'restriction_groups': len(groups),
+            'week_start': start_date.isoformat(),
+            'week_end': end_date.isoformat()
+        }
+    
+    def get_patients_with_restrictions(self, patient_ids: List[int]) -> List[Patient]:
+        """
+        Obtiene varios pacientes con sus restricciones en consultas por lotes.
+        
+        Args:
+            patient_ids: IDs de los pacientes
+            
+        Returns:
+            Pacientes encontrados (los IDs inexistentes se omiten), listos para
+            ``filter_compatible_recipes`` y ``restriction_signature``
+        """
+        if not patient_ids:
+            return []
         return db.session.query(Patient).options(
-            joinedload(Patient.medical_conditions).joinedload(PatientMedicalCondition.condition),
-            joinedload(Patient.intolerances).joinedload(PatientIntolerance.intolerance),
-            joinedload(Patient.dietary_preferences).joinedload(PatientDietaryPreference.preference)
+            selectinload(Patient.intolerances),
+            selectinload(Patient.medical_conditions),
+            selectinload(Patient.dietary_preferences)
+        ).filter(Patient.id.in_(patient_ids)).all()
+    
+    def restriction_signature(self, patient: Patient) -> tuple:
+        """
+        Firma canónica de las restricciones: intolerancias, condiciones y preferencias.
+        
+        Pacientes con la misma firma tienen las mismas recetas compatibles, así
+        que los procesos por lotes la usan para agruparlos.
+        
+        Args:
+            patient: Paciente con restricciones cargadas
+            
+        Returns:
+            Tupla de IDs ordenados (intolerancias, condiciones, preferencias)
+        """
+        return (
+            tuple(sorted({rel.intolerance_id for rel in patient.intolerances})),
+            tuple(sorted({rel.condition_id for rel in patient.medical_conditions})),
+            tuple(sorted({rel.preference_id for rel in patient.dietary_preferences}))
+        )
+    
+    def build_plan_spec(self, patient_id: int, start_date, end_date, generated_by_uid: str,
+                        meals: List[Dict], nutritionist_id: Optional[int] = None,
+                        notes: str = "Plan generado automáticamente", draft: bool = False) -> Dict[str, Any]:
+        """
+        Describe un plan listo para insertarse en bloque con ``bulk_persist_plans``.
+        
+        Por defecto el plan queda auto-aprobado. Con ``draft=True`` queda en
+        borrador para que el nutricionista lo revise y no desplaza al plan
+        aprobado que ve el paciente (``mark_latest=False``) hasta aprobarse.
+        
+        Args:
+            patient_id: ID del paciente
+            start_date: Primer día del plan
+            end_date: Último día del plan
+            generated_by_uid: UID del usuario que genera el plan
+            meals: Comidas del plan (como las de ``distribute_recipes_across_days``)
+            nutritionist_id: Nutricionista responsable (opcional)
+            notes: Notas del plan
+            draft: Crear un borrador en lugar de un plan aprobado
+            
+        Returns:
+            Spec del plan con sus comidas en ``'meals'``
+        """
+        spec = {
+            'patient_id': patient_id,
+            'nutritionist_id': nutritionist_id,
+            'plan_name': f"Plan Semanal - {start_date.strftime('%d/%m/%Y')}",
+            'start_date': start_date,
+            'end_date': end_date,
+            'status': 'approved',  # Auto-aprobado ya que es generado automáticamente
+            'notes': notes,
+            'generated_by_uid': generated_by_uid,
+            'approved_by_uid': generated_by_uid,
+            'approved_at': datetime.utcnow(),
+            'meals': meals
+        }
+        if draft:
+            spec.update({'status': 'draft', 'approved_by_uid': None, 'approved_at': None, 'mark_latest': False})
+        return spec
+    
+    def bulk_persist_plans(self, specs: List[Dict[str, Any]], create_tokens: bool = True) -> List[tuple]:
+        """
+        Inserta planes, comidas y tokens con inserciones multi-fila (sin commit).
+        
+        Cada plan pasa a ser la versión vigente de su paciente y las anteriores
+        dejan de serlo, salvo que su spec tenga ``mark_latest=False``
+        (borradores de ``build_plan_spec(draft=True)``), que pasan a ser la
+        versión vigente al aprobarse.
+        
+        Args:
+            specs: Planes de ``build_plan_spec`` (un paciente por plan y por llamada)
+            create_tokens: Si es False no se crean tokens públicos (token None)
+        
+        Returns:
+            Lista de (plan_id, token) en el mismo orden que ``specs``
+        """
+        patient_ids = [spec['patient_id'] for spec in specs]
+        
+        # Versionado: siguiente versión por paciente y desmarcar las anteriores
+        latest_versions = dict(
+            db.session.query(MealPlan.patient_id, func.max(MealPlan.version)).filter(
+                MealPlan.patient_id.in_(patient_ids)
+            ).group_by(MealPlan.patient_id).all()
+        )
+        replaced_patient_ids = [
+            spec['patient_id'] for spec in specs
+            if spec.get('mark_latest', True) and spec['patient_id'] in latest_versions
+        ]
+        if replaced_patient_ids:
+            db.session.execute(
+                update(MealPlan).where(
+                    MealPlan.patient_id.in_(replaced_patient_ids),
+                    MealPlan.is_latest == True
+                ).values(is_latest=False),
+                execution_options={'synchronize_session': False}
+            )
+            # Las sentencias Core no pasan por la detección de cambios de la caché pública
+            public_plan_cache.invalidate_on_commit(db.session, patient_ids=replaced_patient_ids)
+        
+        plan_rows = []
+        for spec in specs:
+            row = {key: value for key, value in spec.items() if key not in ('meals', 'mark_latest')}
+            row.setdefault('version', (latest_versions.get(spec['patient_id']) or 0) + 1)
+            row.setdefault('is_latest', spec.get('mark_latest', True))
+            plan_rows.append(row)
+        
+        # Cada paciente aparece una sola vez por bloque: se empareja por patient_id
+        inserted = db.session.execute(
+            insert(MealPlan).returning(MealPlan.id, MealPlan.patient_id),
+            plan_rows
+        ).all()
+        plan_id_by_patient = {row.patient_id: row.id for row in inserted}
+        plan_ids = [plan_id_by_patient[patient_id] for patient_id in patient_ids]
+        
+        meal_rows = [
+            {
+                'plan_id': plan_id,
+                'recipe_id': meal['recipe_id'],
+                'day_of_week': meal['day_of_week'],
+                'meal_date': meal.get('meal_date'),
+                'meal_type': meal['meal_type'],
+                'scheduled_time': meal['scheduled_time'],
+                'servings': meal['servings']
+            }
+            for plan_id, spec in zip(plan_ids, specs)
+            for meal in spec['meals']
+        ]
+        if meal_rows:
+            db.session.execute(insert(MealPlanMeal), meal_rows)
+        # Las inserciones sin ORM no pasan por el listener de nutrición por día
+        plan_nutrition.refresh(db.session, plan_ids)
+        
+        if not create_tokens:
+            return [(plan_id, None) for plan_id in plan_ids]
+        
+        return list(zip(plan_ids, self._create_tokens(plan_ids)))
+    
+    def _create_tokens(self, plan_ids: List[int]) -> List[str]:
+        """Inserta los tokens públicos de varios planes en una sola sentencia (sin commit)."""
+        # Los tokens de planes no expiran
+        tokens = [secrets.token_urlsafe(32) for _ in plan_ids]
+        db.session.execute(insert(MealPlanToken), [
+            {'plan_id': plan_id, 'token': token, 'expires_at': None}
+            for plan_id, token in zip(plan_ids, tokens)
+        ])
+        return tokens
+    
+    def get_patient_with_restrictions(self, patient_id: int) -> Optional[Patient]:
+        """
+        Obtiene el paciente con todas sus restricciones cargadas.
+        
+        Args:
+            patient_id: ID del paciente
+            
+        Returns:
+            Paciente o None si no existe
+        """
+        return db.session.query(Patient).options(
+            *patient_restriction_options()
         ).filter(Patient.id == patient_id).first()
     
-    def _get_next_week_dates(self):
+    def get_next_week_dates(self):
         """Calcula las fechas del próximo lunes y domingo."""
         today = datetime.now().date()
         days_until_monday = (7 - today.weekday()) % 7
@@ -107,41 +501,42 @@ class MealPlanGeneratorService:
         
         return start_date, end_date
     
-    def _filter_compatible_recipes(self, patient: Patient) -> Dict[str, List[Recipe]]:
+    def filter_compatible_recipes(self, patient: Patient) -> Dict[str, List[int]]:
         """
         Filtra recetas compatibles con las restricciones del paciente.
         
+        Los resultados se guardan en caché por firma de restricciones, así que
+        pacientes con el mismo perfil no repiten el filtrado.
+        
         Args:
             patient: Paciente con restricciones cargadas
             
         Returns:
-            Dict con recetas por tipo de comida
+            Dict con IDs de recetas por tipo de comida
         """
+        compatible = compatible_recipe_cache.get_or_compute(
+            restriction_key(*self.restriction_signature(patient)),
+            lambda: self._compute_compatible_recipes(patient)
+        )
+        return {meal_type: list(recipe_ids) for meal_type, recipe_ids in compatible.items()}
+    
+    def _compute_compatible_recipes(self, patient: Patient) -> Dict[str, List[int]]:
+        """Calcula las recetas compatibles con el índice en memoria (sin caché)."""
         # Obtener ingredientes restringidos
         restricted_ingredients = self._get_restricted_ingredients(patient)
+        condition_ids = [condition_rel.condition_id for condition_rel in patient.medical_conditions]
+        preference_ids = [preference_rel.preference_id for preference_rel in patient.dietary_preferences]
         
-        # Construir query base para recetas activas
-        base_query = db.session.query(Recipe).filter(Recipe.is_active == True)
-        
-        # Excluir recetas que contengan ingredientes restringidos
-        if restricted_ingredients:
-            base_query = base_query.filter(
-                not_(exists().where(
-                    and_(
-                        RecipeIngredient.recipe_id == Recipe.id,
-                        RecipeIngredient.ingredient_id.in_(restricted_ingredients)
-                    )
-                ))
-            )
-        
-        # Obtener todas las recetas compatibles
-        all_recipes = base_query.all()
+        # Excluir recetas con ingredientes restringidos, que no cumplen las reglas de las
+        # condiciones médicas o las etiquetas de las preferencias, en una sola pasada
+        compatible = recipe_compatibility_index.compatible_recipe_ids(
+            restricted_ingredients, condition_ids, preference_ids
+        )
         
         # Agrupar por tipo de comida
         grouped_recipes = {
-            'breakfast': [r for r in all_recipes if r.meal_type == 'breakfast'],
-            'lunch': [r for r in all_recipes if r.meal_type == 'lunch'],
-            'dinner': [r for r in all_recipes if r.meal_type == 'dinner']
+            meal_type: compatible[meal_type].tolist() if meal_type in compatible else []
+            for meal_type in ('breakfast', 'lunch', 'dinner')
         }
         
         return grouped_recipes
@@ -156,37 +551,23 @@ class MealPlanGeneratorService:
         Returns:
             Lista de IDs de ingredientes restringidos
         """
-        restricted_ingredients = []
-        
-        # Mapeo de intolerancias a ingredientes restringidos
-        intolerance_mappings = {
-            'Lactosa': ['leche', 'queso', 'yogur', 'mantequilla', 'crema'],
-            'Gluten': ['harina de trigo', 'avena', 'cebada', 'centeno'],
-            'Nueces': ['nueces', 'almendras', 'pistachos', 'avellanas'],
-            'Mariscos': ['camarones', 'langosta', 'cangrejo', 'mejillones'],
-            'Huevo': ['huevo', 'clara de huevo', 'yema de huevo'],
-            'Soya': ['salsa de soya', 'tofu', 'tempeh', 'leche de soya']
-        }
+        # Una sola consulta indexada sobre intolerance_ingredients (cacheada por conjunto)
+        intolerance_ids = [intolerance_rel.intolerance_id for intolerance_rel in patient.intolerances]
+        restricted_ingredients = restriction_resolver.for_intolerances(intolerance_ids)
         
-        # Obtener ingredientes basados en intolerancias
-        for intolerance_rel in patient.intolerances:
-            intolerance_name = intolerance_rel.intolerance.intolerance_name
-            if intolerance_name in intolerance_mappings:
-                ingredient_names = intolerance_mappings[intolerance_name]
-                ingredients = db.session.query(Ingredient.id).filter(
-                    Ingredient.ingredient_name.in_(ingredient_names)
-                ).all()
-                restricted_ingredients.extend([ing.id for ing in ingredients])
-        
-        # TODO: Agregar restricciones basadas en condiciones médicas si es necesario
-        # Por ejemplo: diabéticos evitar azúcar, hipertensos evitar sal, etc.
-        
-        return list(set(restricted_ingredients))  # Eliminar duplicados
+        # Las condiciones médicas se aplican como reglas por comida (ver condition_rules)
+        return list(restricted_ingredients)
     
-    def _validate_recipe_availability(self, compatible_recipes: Dict[str, List[Recipe]]):
-        """Valida que tengamos suficientes recetas para generar un plan semanal."""
-        required_per_type = 7  # 7 días de la semana
+    def validate_recipe_availability(self, compatible_recipes: Dict[str, List[int]],
+                                     required_per_type: int = 7):
+        """
+        Valida que tengamos suficientes recetas para generar el plan.
         
+        Args:
+            compatible_recipes: IDs de recetas agrupados por tipo
+            required_per_type: Recetas distintas necesarias por tipo (7 para un
+                plan semanal sin repeticiones, o la ventana sin repeticiones)
+        """
         for meal_type, recipes in compatible_recipes.items():
             if len(recipes) < required_per_type:
                 raise ValueError(
@@ -194,108 +575,116 @@ class MealPlanGeneratorService:
                     f"Se necesitan {required_per_type}, solo hay {len(recipes)}"
                 )
     
-    def _distribute_recipes_across_week(self, compatible_recipes: Dict[str, List[Recipe]]) -> List[Dict]:
+    def _distribute_recipes_across_week(self, compatible_recipes: Dict[str, List[int]],
+                                        targets: Optional[np.ndarray] = None,
+                                        start_date: Optional[date] = None) -> List[Dict]:
         """
-        Distribuye las recetas compatibles a lo largo de la semana.
+        Distribuye las recetas compatibles a lo largo de la semana, sin repetir recetas.
         
         Args:
-            compatible_recipes: Recetas agrupadas por tipo
+            compatible_recipes: IDs de recetas agrupados por tipo
+            targets: Objetivos diarios de macros; si se indican y el modo es
+                'optimized', la grilla se ajusta a ellos
+            start_date: Lunes de la semana, para fechar cada comida
             
         Returns:
             Lista de comidas para la semana
         """
-        week_meals = []
-        
-        # Barajar recetas para mayor variedad
-        breakfast_recipes = self._shuffle_recipes(compatible_recipes['breakfast'])
-        lunch_recipes = self._shuffle_recipes(compatible_recipes['lunch'])
-        dinner_recipes = self._shuffle_recipes(compatible_recipes['dinner'])
-        
-        # Asignar recetas a cada día
-        for day_index, day_name in enumerate(self.DAY_ORDER):
-            # Desayuno
-            week_meals.append({
-                'day_of_week': day_name,
-                'meal_type': 'breakfast',
-                'recipe_id': breakfast_recipes[day_index].id,
-                'scheduled_time': self.MEAL_TIMES['breakfast'],
-                'servings': 1.0
-            })
+        return self.distribute_recipes_across_days(
+            compatible_recipes,
+            days=len(self.DAY_ORDER),
+            start_date=start_date,
+            targets=targets
+        )
+    
+    def distribute_recipes_across_days(self, compatible_recipes: Dict[str, List[int]], days: int,
+                                       start_date: Optional[date] = None,
+                                       targets: Optional[np.ndarray] = None,
+                                       no_repeat_days: Optional[int] = None) -> List[Dict]:
+        """
+        Distribuye las recetas compatibles en un plan de cualquier duración.
+        
+        Args:
+            compatible_recipes: IDs de recetas agrupados por tipo
+            days: Número de días del plan
+            start_date: Fecha del primer día; sin ella los días siguen ``DAY_ORDER``
+            targets: Objetivos diarios de macros (modo 'optimized')
+            no_repeat_days: Una receta no se repite dentro de esta cantidad de
+                días (por defecto, ninguna repetición en todo el plan)
             
-            # Almuerzo
-            week_meals.append({
-                'day_of_week': day_name,
-                'meal_type': 'lunch',
-                'recipe_id': lunch_recipes[day_index].id,
-                'scheduled_time': self.MEAL_TIMES['lunch'],
-                'servings': 1.0
-            })
+        Returns:
+            Lista de comidas, tres por día
+        """
+        no_repeat_days = min(no_repeat_days or days, days)
+        
+        if targets is not None and self.get_setting('MEAL_PLAN_DISTRIBUTION_MODE', 'optimized') == 'optimized':
+            # Ajustar la grilla a los objetivos diarios de macros
+            ordered = self._optimize_recipes_for_targets(compatible_recipes, targets, days, no_repeat_days)
+        else:
+            # Orden aleatorio para mayor variedad
+            ordered = self._schedule_recipes_randomly(compatible_recipes, days, no_repeat_days)
+        
+        meals = []
+        for day_index in range(days):
+            meal_date = start_date + timedelta(days=day_index) if start_date else None
+            day_name = self.DAY_ORDER[meal_date.weekday() if meal_date else day_index % 7]
             
-            # Cena
-            week_meals.append({
-                'day_of_week': day_name,
-                'meal_type': 'dinner',
-                'recipe_id': dinner_recipes[day_index].id,
-                'scheduled_time': self.MEAL_TIMES['dinner'],
-                'servings': 1.0
-            })
+            # Desayuno, almuerzo y cena
+            for meal_type in ('breakfast', 'lunch', 'dinner'):
+                meals.append({
+                    'day_of_week': day_name,
+                    'meal_date': meal_date,
+                    'meal_type': meal_type,
+                    'recipe_id': ordered[meal_type][day_index],
+                    'scheduled_time': self.MEAL_TIMES[meal_type],
+                    'servings': 1.0
+                })
         
-        return week_meals
-    
-    def _shuffle_recipes(self, recipes: List[Recipe]) -> List[Recipe]:
-        """Baraja las recetas para mayor variedad."""
-        shuffled = recipes.copy()
-        random.shuffle(shuffled)
-        return shuffled
+        return meals
     
-    def _create_meal_plan(self, patient_id: int, start_date, end_date, generated_by_uid: str) -> MealPlan:
-        """Crea el registro del plan de comidas."""
-        plan = MealPlan(
-            patient_id=patient_id,
-            plan_name=f"Plan Semanal - {start_date.strftime('%d/%m/%Y')}",
-            start_date=start_date,
-            end_date=end_date,
-            status='approved',  # Auto-aprobado ya que es generado automáticamente
-            notes="Plan generado automáticamente al completar perfil",
-            generated_by_uid=generated_by_uid,
-            approved_by_uid=generated_by_uid,  # Auto-aprobado
-            approved_at=datetime.utcnow()
+    def _schedule_recipes_randomly(self, compatible_recipes: Dict[str, List[int]], days: int,
+                                   no_repeat_days: int) -> Dict[str, List[int]]:
+        """Elige una receta aleatoria por día y tipo respetando la ventana sin repeticiones."""
+        meal_types = list(compatible_recipes.keys())
+        schedule = random_schedule(
+            [len(compatible_recipes[meal_type]) for meal_type in meal_types],
+            days, no_repeat_days, np.random.default_rng()
         )
-        
-        db.session.add(plan)
-        db.session.commit()
-        
-        return plan
+        return {
+            meal_type: [compatible_recipes[meal_type][row] for row in rows]
+            for meal_type, rows in zip(meal_types, schedule)
+        }
     
-    def _create_meal_plan_meals(self, plan_id: int, week_meals: List[Dict]):
-        """Crea las comidas individuales del plan."""
-        meal_objects = []
-        
-        for meal_data in week_meals:
-            meal = MealPlanMeal(
-                plan_id=plan_id,
-                recipe_id=meal_data['recipe_id'],
-                day_of_week=meal_data['day_of_week'],
-                meal_type=meal_data['meal_type'],
-                scheduled_time=meal_data['scheduled_time'],
-                servings=meal_data['servings']
-            )
-            meal_objects.append(meal)
+    def _optimize_recipes_for_targets(self, compatible_recipes: Dict[str, List[int]],
+                                      targets: np.ndarray, days: int = 7,
+                                      no_repeat_days: Optional[int] = None) -> Dict[str, List[int]]:
+        """Ordena una receta por día y tipo de comida acercando los totales diarios al objetivo."""
+        macros_by_type = {
+            meal_type: recipe_compatibility_index.recipe_macros(meal_type, recipes)
+            for meal_type, recipes in compatible_recipes.items()
+        }
         
-        db.session.add_all(meal_objects)
-        db.session.commit()
-    
-    def _generate_meal_plan_token(self, plan_id: int) -> str:
-        """Genera un token para acceso público al plan de comidas."""
-        token = MealPlanToken(
-            plan_id=plan_id,
-            expires_at=None  # Los tokens de planes no expiran
+        optimizer = WeeklyPlanOptimizer(
+            time_budget_ms=self.get_setting('MEAL_PLAN_OPTIMIZER_BUDGET_MS', 50.0)
         )
+        assignment = optimizer.optimize(macros_by_type, targets, days=days, no_repeat_days=no_repeat_days)
         
-        db.session.add(token)
-        db.session.commit()
+        return {
+            meal_type: [compatible_recipes[meal_type][row] for row in rows]
+            for meal_type, rows in assignment.items()
+        }
+    
+    def get_setting(self, name: str, default):
+        """
+        Lee un ajuste de la configuración de Flask si hay contexto de aplicación.
         
-        return token.token
+        Args:
+            name: Nombre del ajuste (ej. ``MEAL_PLAN_NO_REPEAT_DAYS``)
+            default: Valor si no hay contexto o el ajuste no existe
+        """
+        if has_app_context():
+            return current_app.config.get(name, default)
+        return default
     
     def get_plan_by_token(self, token: str) -> Optional[Dict[str, Any]]:
         """
@@ -307,6 +696,46 @@ class MealPlanGeneratorService:
         Returns:
             Dict con el plan y datos del paciente o None si no existe
         """
+        loaded = self._load_plan_by_token(token)
+        if loaded is None:
+            return None
+        
+        return self._format_plan_for_public_view(loaded[1])
+    
+    def render_plan_by_token(self, token: str, version: Optional[str] = None) -> Optional[bytes]:
+        """
+        Obtiene la vista pública de un plan ya serializada a JSON.
+        
+        Las vistas se guardan en ``public_plan_cache``: una vista repetida del
+        mismo token solo consulta la caché.
+        
+        Args:
+            token: Token de acceso público
+            version: Versión actual del plan (el ETag de la ruta), parte de la clave de caché
+            
+        Returns:
+            Bytes JSON de la vista o None si el token no existe o expiró
+        """
+        def render() -> Optional[RenderedPlan]:
+            loaded = self._load_plan_by_token(token)
+            if loaded is None:
+                return None
+            
+            token_obj, plan = loaded
+            body = current_app.json.response(self._format_plan_for_public_view(plan)).get_data()
+            expires_at = token_obj.expires_at
+            return RenderedPlan(
+                body=body,
+                plan_id=plan.id,
+                patient_id=plan.patient_id,
+                # expires_at se guarda en UTC sin zona horaria
+                expires_at=expires_at.replace(tzinfo=timezone.utc).timestamp() if expires_at else None
+            )
+        
+        return public_plan_cache.get_or_render(token, render, version)
+    
+    def _load_plan_by_token(self, token: str) -> Optional[tuple]:
+        """Carga el token y su plan con las relaciones de la vista pública ((token, plan) o None)."""
         token_obj = db.session.query(MealPlanToken).filter(
             MealPlanToken.token == token
         ).first()
@@ -314,40 +743,40 @@ class MealPlanGeneratorService:
         if not token_obj or not token_obj.is_valid:
             return None
         
-        # Obtener plan con todas las relaciones
-        plan = db.session.query(MealPlan).options(
-            joinedload(MealPlan.patient).joinedload(Patient.medical_conditions).joinedload(PatientMedicalCondition.condition),
-            joinedload(MealPlan.patient).joinedload(Patient.intolerances).joinedload(PatientIntolerance.intolerance),
-            joinedload(MealPlan.meals).joinedload(MealPlanMeal.recipe).joinedload(Recipe.ingredients).joinedload(RecipeIngredient.ingredient)
-        ).filter(MealPlan.id == token_obj.plan_id).first()
+        # Obtener plan con todas las relaciones (una consulta por colección, sin producto cartesiano)
+        plan = db.session.query(MealPlan).options(*PUBLIC_PLAN_VIEW).filter(
+            MealPlan.id == token_obj.plan_id
+        ).first()
         
         if not plan:
             return None
         
-        return self._format_plan_for_public_view(plan)
+        return token_obj, plan
     
     def _format_plan_for_public_view(self, plan: MealPlan) -> Dict[str, Any]:
         """Formatea el plan para la vista pública del paciente."""
         patient = plan.patient
         
-        # Agrupar comidas por día
-        meals_by_day = {}
-        for meal in plan.meals:
-            day_name = meal.day_of_week
-            if day_name not in meals_by_day:
-                meals_by_day[day_name] = []
+        # Macros de todas las comidas desde la instantánea columnar del catálogo
+        meal_macros = recipe_catalog.snapshot().meal_macros([meal.recipe_id for meal in plan.meals])
+        
+        # Agrupar comidas por fecha (las comidas sin fecha, por día de la semana)
+        plan_days = (plan.end_date - plan.start_date).days + 1
+        meals_by_date = {}
+        for meal, macros in zip(plan.meals, meal_macros):
+            meal_date = plan_meal_date(plan.start_date, plan_days, meal.meal_date, meal.day_of_week)
             
             # Formatear la receta con información completa
-            recipe_data = self._format_recipe_for_view(meal.recipe)
+            recipe_data = self._format_recipe_for_view(meal.recipe, macros)
             
-            meals_by_day[day_name].append({
+            meals_by_date.setdefault(meal_date, []).append({
                 'type': meal.meal_type.title(),
                 'time': meal.scheduled_time.strftime('%H:%M') if meal.scheduled_time else None,
                 'servings': float(meal.servings),
                 'recipe': recipe_data
             })
         
-        # Ordenar días de la semana
+        # Un día por fecha, en orden
         ordered_meals = []
         day_names_spanish = {
             'monday': 'Lunes',
@@ -359,13 +788,14 @@ class MealPlanGeneratorService:
             'sunday': 'Domingo'
         }
         
-        for day_key in self.DAY_ORDER:
-            if day_key in meals_by_day:
-                ordered_meals.append({
-                    'day': day_names_spanish[day_key],
-                    'day_of_week': day_key,
-                    'meals': sorted(meals_by_day[day_key], key=lambda x: x['time'] or '00:00')
-                })
+        for meal_date in sorted(meals_by_date):
+            day_key = self.DAY_ORDER[meal_date.weekday()]
+            ordered_meals.append({
+                'day': day_names_spanish[day_key],
+                'day_of_week': day_key,
+                'date': meal_date.isoformat(),
+                'meals': sorted(meals_by_date[meal_date], key=lambda x: x['time'] or '00:00')
+            })
         
         return {
             'patient': {
@@ -382,67 +812,38 @@ class MealPlanGeneratorService:
             }
         }
     
-    def _format_recipe_for_view(self, recipe: Recipe) -> Dict[str, Any]:
-        """Formatea una receta para la vista pública."""
-        # Generar tags basados en las características de la receta
-        tags = []
-        
-        # Tags nutricionales básicos
-        if recipe.total_calories and recipe.total_calories < 300:
-            tags.append("Bajo en Calorías")
-        if recipe.total_protein and recipe.total_protein > 15:
-            tags.append("Alto en Proteína")
-        if recipe.total_fiber and recipe.total_fiber > 5:
-            tags.append("Rico en Fibra")
-        
-        # Tags por defecto según tipo de comida
-        if recipe.meal_type == 'breakfast':
-            tags.append("Energético")
-        elif recipe.meal_type == 'lunch':
-            tags.append("Nutritivo")
-        elif recipe.meal_type == 'dinner':
-            tags.append("Ligero")
-        
-        # Formatear ingredientes
-        ingredients = []
-        for ri in recipe.ingredients:
-            if ri.ingredient:
-                quantity_str = f"{ri.quantity:.1f}".rstrip('0').rstrip('.')
-                ingredients.append(f"{quantity_str} {ri.unit} de {ri.ingredient.ingredient_name}")
-        
-        # Formatear instrucciones (dividir por saltos de línea si es texto largo)
-        instructions = []
-        if recipe.instructions:
-            # Si las instrucciones están numeradas, mantener formato
-            if any(line.strip().startswith(('1.', '2.', '3.')) for line in recipe.instructions.split('\n')):
-                instructions = [line.strip() for line in recipe.instructions.split('\n') if line.strip()]
-            else:
-                # Si no, crear pasos numerados básicos
-                instruction_text = recipe.instructions.strip()
-                if len(instruction_text) > 100:
-                    # Dividir en pasos lógicos por puntos
-                    sentences = instruction_text.split('. ')
-                    instructions = [f"{i+1}. {sentence.strip()}{'.' if not sentence.endswith('.') else ''}" 
-                                  for i, sentence in enumerate(sentences) if sentence.strip()]
-                else:
-                    instructions = [f"1. {instruction_text}"]
+    def _format_recipe_for_view(self, recipe: Recipe, macros: np.ndarray) -> Dict[str, Any]:
+        """
+        Formatea una receta para la vista pública.
+        
+        Las etiquetas, los ingredientes y los pasos vienen ya calculados en
+        ``Recipe.view_fragments`` (ver ``recipe_fragments``), así que no se
+        cargan los ingredientes de la receta.
+        
+        Args:
+            recipe: Receta (nombre, descripción, tiempos y fragmentos de la vista)
+            macros: Calorías, proteína, carbohidratos, grasa y fibra de la instantánea del catálogo
+        """
+        calories, protein, carbs, fat, fiber = (float(value) for value in macros)
+        fragments = recipe_fragments.for_recipe(recipe)
         
         return {
             'recipe_name': recipe.recipe_name,
             'description': recipe.description,
-            'calories': int(recipe.total_calories) if recipe.total_calories else 0,
-            'protein': int(recipe.total_protein) if recipe.total_protein else 0,
-            'carbs': int(recipe.total_carbs) if recipe.total_carbs else 0,
-            'fiber': int(recipe.total_fiber) if recipe.total_fiber else 0,
+            'calories': int(calories),
+            'protein': int(protein),
+            'carbs': int(carbs),
+            'fiber': int(fiber),
             'preparation_time': recipe.preparation_time,
             'cooking_time': recipe.cooking_time,
             'difficulty_level': recipe.difficulty_level,
-            'tags': tags,
-            'ingredients': ingredients,
-            'instructions': instructions,
+            'tags': fragments['tags'],
+            'ingredients': fragments['ingredients'],
+            'instructions': fragments['instructions'],
             'image_url': recipe.image_url
         }
 
 
 # Instancia global del servicio
 meal_plan_generator = MealPlanGeneratorService()
+job_queue.register(GENERATE_PLAN_JOB, meal_plan_generator.run_generation_job)
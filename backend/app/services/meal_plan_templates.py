@@ -0,0 +1,232 @@
+"""
+Plantillas de planes de comidas y su asignación masiva a pacientes.
+
+Una plantilla guarda una sola vez la grilla de recetas (tipo de comida → una
+receta por día). Al asignarla a muchos pacientes, las recetas compatibles se
+obtienen del filtro en caché por firma de restricciones y solo se sustituyen
+los slots que chocan con las restricciones del paciente, por la receta
+compatible más parecida (``recipe_similarity_index``) que no se repita en el
+mismo tipo de comida. Pacientes con la misma firma comparten la grilla
+resultante, y todos los planes, comidas y tokens se insertan con sentencias
+multi-fila en una sola transacción.
+"""
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.database_service import db
+from app.services.meal_plan_generator import meal_plan_generator
+from app.services.plan_nutrition import plan_day_index
+from app.services.recipe_catalog import MEAL_TYPES, recipe_catalog
+from app.services.recipe_similarity import recipe_similarity_index
+from app.models.sql_models import MealPlan, MealPlanTemplate
+
+# Tipos de comida de una plantilla (los mismos que genera el generador)
+TEMPLATE_MEAL_TYPES = ('breakfast', 'lunch', 'dinner')
+MAX_TEMPLATE_DAYS = 28
+
+
+class MealPlanTemplateService:
+    """Crea plantillas de planes y las asigna a pacientes en bloque."""
+
+    def create_template(self, nutritionist_id: int, template_name: str, slots: Dict[str, List[int]],
+                        description: Optional[str] = None) -> MealPlanTemplate:
+        """
+        Crea una plantilla a partir de una grilla de recetas (sin commit).
+
+        Args:
+            nutritionist_id: Dueño de la plantilla
+            template_name: Nombre de la plantilla
+            slots: Tipo de comida -> lista de IDs de recetas, una por día
+            description: Descripción opcional
+
+        Returns:
+            Plantilla creada
+        """
+        slots = self._validate_slots(slots)
+        template = MealPlanTemplate(
+            nutritionist_id=nutritionist_id,
+            template_name=template_name,
+            description=description,
+            days=len(slots[TEMPLATE_MEAL_TYPES[0]]),
+            slots=slots
+        )
+        db.session.add(template)
+        db.session.flush()
+        return template
+
+    def slots_from_plan(self, plan: MealPlan) -> Dict[str, List[int]]:
+        """
+        Extrae la grilla de recetas de un plan existente.
+
+        Args:
+            plan: Plan con sus comidas
+
+        Returns:
+            Tipo de comida -> lista de IDs de recetas, una por día del plan
+        """
+        days = (plan.end_date - plan.start_date).days + 1
+        slots = {meal_type: [None] * days for meal_type in TEMPLATE_MEAL_TYPES}
+        for meal in plan.meals:
+            if meal.meal_type not in slots:
+                continue
+            day_index = plan_day_index(plan.start_date, days, meal.meal_date, meal.day_of_week)
+            slots[meal.meal_type][day_index] = meal.recipe_id
+        return slots
+
+    def assign_template(self, template: MealPlanTemplate, patient_ids: List[int], generated_by_uid: str,
+                        start_date: Optional[date] = None, approve: bool = False) -> Dict[str, Any]:
+        """
+        Asigna una plantilla a varios pacientes en una sola transacción.
+
+        Args:
+            template: Plantilla a asignar
+            patient_ids: IDs de los pacientes
+            generated_by_uid: UID del usuario que asigna la plantilla
+            start_date: Primer día de los planes (por defecto el próximo lunes)
+            approve: Crear los planes aprobados (con token público) en lugar de borradores
+
+        Returns:
+            Dict con el resultado por paciente y totales
+        """
+        if start_date is None:
+            start_date, _ = meal_plan_generator.get_next_week_dates()
+        end_date = start_date + timedelta(days=template.days - 1)
+        results = {patient_id: {'patient_id': patient_id, 'success': False} for patient_id in patient_ids}
+
+        patients = meal_plan_generator.get_patients_with_restrictions(list(results.keys()))
+        for patient_id in results.keys() - {patient.id for patient in patients}:
+            results[patient_id]['error'] = f"Paciente {patient_id} no encontrado"
+
+        # Grilla adaptada una sola vez por firma de restricciones
+        grids: Dict[tuple, Tuple[Optional[Dict[str, List[int]]], int, Optional[str]]] = {}
+        specs = []
+        for patient in patients:
+            signature = meal_plan_generator.restriction_signature(patient)
+            if signature not in grids:
+                try:
+                    grids[signature] = (*self._adapt_slots(template.slots, patient), None)
+                except ValueError as e:
+                    grids[signature] = (None, 0, str(e))
+            slots, substituted, error = grids[signature]
+            if error is not None:
+                results[patient.id]['error'] = error
+                continue
+
+            spec = meal_plan_generator.build_plan_spec(
+                patient_id=patient.id,
+                start_date=start_date,
+                end_date=end_date,
+                generated_by_uid=generated_by_uid,
+                meals=self._build_meals(slots, start_date),
+                nutritionist_id=template.nutritionist_id,
+                notes=f"Plan asignado desde la plantilla '{template.template_name}'",
+                draft=not approve
+            )
+            spec['plan_name'] = f"{template.template_name} - {start_date.strftime('%d/%m/%Y')}"
+            specs.append(spec)
+            results[patient.id]['substituted_slots'] = substituted
+
+        if specs:
+            persisted = meal_plan_generator.bulk_persist_plans(specs, create_tokens=approve)
+            db.session.commit()
+            for spec, (plan_id, token) in zip(specs, persisted):
+                results[spec['patient_id']].update({
+                    'success': True,
+                    'plan_id': plan_id,
+                    'token': token,
+                    'meal_count': len(spec['meals'])
+                })
+
+        report = list(results.values())
+        succeeded = sum(1 for result in report if result['success'])
+        return {
+            'template_id': template.id,
+            'results': report,
+            'total': len(report),
+            'succeeded': succeeded,
+            'failed': len(report) - succeeded,
+            'restriction_groups': len(grids),
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat()
+        }
+
+    def _validate_slots(self, slots: Dict[str, List[int]]) -> Dict[str, List[int]]:
+        """Comprueba que la grilla sea rectangular y que cada receta sea de su tipo de comida."""
+        if not isinstance(slots, dict) or set(slots) != set(TEMPLATE_MEAL_TYPES):
+            raise ValueError(f"La plantilla necesita recetas para {', '.join(TEMPLATE_MEAL_TYPES)}")
+
+        lengths = {len(slots[meal_type]) for meal_type in TEMPLATE_MEAL_TYPES}
+        if len(lengths) != 1 or not 1 <= next(iter(lengths)) <= MAX_TEMPLATE_DAYS:
+            raise ValueError(
+                f"Todos los tipos de comida deben tener el mismo número de días (entre 1 y {MAX_TEMPLATE_DAYS})"
+            )
+
+        snapshot = recipe_catalog.snapshot()
+        validated = {}
+        for meal_type in TEMPLATE_MEAL_TYPES:
+            recipe_ids = []
+            for day_index, recipe_id in enumerate(slots[meal_type]):
+                row = snapshot.row(recipe_id) if isinstance(recipe_id, int) else None
+                if row is None or not snapshot.active[row]:
+                    raise ValueError(f"Receta no válida para {meal_type} el día {day_index + 1}: {recipe_id}")
+                if MEAL_TYPES[snapshot.meal_type_codes[row]] != meal_type:
+                    raise ValueError(f"La receta {recipe_id} no es de tipo {meal_type}")
+                recipe_ids.append(recipe_id)
+            validated[meal_type] = recipe_ids
+        return validated
+
+    def _adapt_slots(self, slots: Dict[str, List[int]], patient) -> Tuple[Dict[str, List[int]], int]:
+        """
+        Sustituye los slots incompatibles con las restricciones de un paciente.
+
+        Returns:
+            (grilla adaptada, número de slots sustituidos)
+        """
+        compatible = meal_plan_generator.filter_compatible_recipes(patient)
+        adapted = {}
+        substituted = 0
+        for meal_type in TEMPLATE_MEAL_TYPES:
+            allowed = compatible.get(meal_type, [])
+            allowed_set = set(allowed)
+            row = list(slots[meal_type])
+            conflicts = [day_index for day_index, recipe_id in enumerate(row) if recipe_id not in allowed_set]
+            if conflicts and not allowed:
+                raise ValueError(f"No hay recetas de {meal_type} compatibles con las restricciones del paciente")
+
+            used = {recipe_id for recipe_id in row if recipe_id in allowed_set}
+            for day_index in conflicts:
+                # La receta compatible más parecida que aún no está en la fila
+                similar = recipe_similarity_index.similar_recipes(
+                    row[day_index], limit=1, allowed_ids=allowed, exclude_ids=used
+                )
+                if similar:
+                    replacement = similar[0]['recipe_id']
+                else:
+                    unused = [recipe_id for recipe_id in allowed if recipe_id not in used]
+                    replacement = unused[0] if unused else allowed[day_index % len(allowed)]
+                row[day_index] = replacement
+                used.add(replacement)
+            adapted[meal_type] = row
+            substituted += len(conflicts)
+        return adapted, substituted
+
+    def _build_meals(self, slots: Dict[str, List[int]], start_date: date) -> List[Dict[str, Any]]:
+        """Convierte la grilla en comidas fechadas a partir de ``start_date``."""
+        meals = []
+        for day_index in range(len(slots[TEMPLATE_MEAL_TYPES[0]])):
+            meal_date = start_date + timedelta(days=day_index)
+            day_name = meal_plan_generator.DAY_ORDER[meal_date.weekday()]
+            for meal_type in TEMPLATE_MEAL_TYPES:
+                meals.append({
+                    'day_of_week': day_name,
+                    'meal_date': meal_date,
+                    'meal_type': meal_type,
+                    'recipe_id': slots[meal_type][day_index],
+                    'scheduled_time': meal_plan_generator.MEAL_TIMES[meal_type],
+                    'servings': 1.0
+                })
+        return meals
+
+
+# Instancia global
+meal_plan_template_service = MealPlanTemplateService()
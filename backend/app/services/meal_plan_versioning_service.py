@@ -1,19 +1,28 @@
 """
 Meal Plan Versioning Service - Handles meal plan versioning logic.
 """
-from typing import Dict, Any, List, Optional, Tuple
-from datetime import datetime
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+from datetime import date, datetime, timedelta
 from sqlalchemy.exc import SQLAlchemyError
 from app.services.database_service import db
+from app.services.recipe_catalog import recipe_catalog, nutrient_dict
+from app.services.plan_loading import PLAN_COMPARISON
+from app.services.plan_nutrition import DAY_ORDER, plan_meal_date
 from app.models.sql_models import MealPlan, MealPlanMeal, Patient, Nutritionist
 
+
+def _as_date(value) -> date:
+    """Accept dates as date objects or ISO strings (JSON payloads)."""
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
 class MealPlanVersioningService:
     """Service for managing meal plan versions."""
     
     @staticmethod
-    def get_patient_latest_meal_plan(patient_id: int) -> Optional[MealPlan]:
-        """Get the latest approved meal plan for a patient (patient view)."""
-        return MealPlan.query.filter_by(
+    def get_patient_latest_meal_plan(patient_id: int, options: Sequence = ()) -> Optional[MealPlan]:
+        """Get the latest approved meal plan for a patient (patient view), with optional loader options."""
+        return MealPlan.query.options(*options).filter_by(
             patient_id=patient_id,
             is_latest=True,
             status='approved'
@@ -62,8 +71,8 @@ class MealPlanVersioningService:
                 patient_id=base_plan.patient_id,
                 nutritionist_id=nutritionist_id,
                 plan_name=updates.get('plan_name', f"{base_plan.plan_name} (v{new_version_num})"),
-                start_date=updates.get('start_date', base_plan.start_date),
-                end_date=updates.get('end_date', base_plan.end_date),
+                start_date=_as_date(updates.get('start_date', base_plan.start_date)),
+                end_date=_as_date(updates.get('end_date', base_plan.end_date)),
                 status='draft',  # Always start as draft
                 notes=updates.get('notes', f"Version {new_version_num} - Updated from v{base_plan.version}"),
                 generated_by_uid=base_plan.generated_by_uid,
@@ -82,18 +91,40 @@ class MealPlanVersioningService:
                         plan_id=new_plan.id,
                         recipe_id=meal.recipe_id,
                         day_of_week=meal.day_of_week,
+                        meal_date=meal.meal_date,
                         meal_type=meal.meal_type,
                         scheduled_time=meal.scheduled_time,
                         servings=meal.servings
                     )
                     db.session.add(new_meal)
             else:
-                # Add custom meals if provided
-                for meal_data in updates.get('meals', []):
+                # Add custom meals if provided, placed by meal_date (ISO) or, when that
+                # weekday occurs only once in the plan, by day_of_week
+                start_date, end_date = new_plan.start_date, new_plan.end_date
+                plan_days = (end_date - start_date).days + 1
+                repeated_weekdays = {
+                    DAY_ORDER[(start_date + timedelta(days=day)).weekday()] for day in range(7, plan_days)
+                }
+                for number, meal_data in enumerate(updates.get('meals', []), start=1):
+                    day_of_week = meal_data.get('day_of_week')
+                    if meal_data.get('meal_date'):
+                        meal_date = _as_date(meal_data['meal_date'])
+                        if not start_date <= meal_date <= end_date:
+                            raise ValueError(f"Meal {number}: meal_date {meal_date.isoformat()} is outside the plan")
+                    elif day_of_week not in DAY_ORDER:
+                        raise ValueError(f"Meal {number}: provide meal_date or a valid day_of_week")
+                    elif day_of_week in repeated_weekdays:
+                        raise ValueError(
+                            f"Meal {number}: the plan has more than one {day_of_week}; provide meal_date"
+                        )
+                    else:
+                        meal_date = plan_meal_date(start_date, plan_days, None, day_of_week)
+                    
                     new_meal = MealPlanMeal(
                         plan_id=new_plan.id,
                         recipe_id=meal_data['recipe_id'],
-                        day_of_week=meal_data['day_of_week'],
+                        day_of_week=DAY_ORDER[meal_date.weekday()],
+                        meal_date=meal_date,
                         meal_type=meal_data['meal_type'],
                         scheduled_time=meal_data.get('scheduled_time'),
                         servings=meal_data.get('servings', 1.0)
@@ -122,6 +153,16 @@ class MealPlanVersioningService:
             if meal_plan.nutritionist_id != nutritionist_id:
                 return False, None, "Access denied"
             
+            # Drafts generated in the background (rollover, regeneration, templates) are not
+            # the latest version yet: approving one replaces the plan the patient sees
+            if not meal_plan.is_latest:
+                db.session.query(MealPlan).filter(
+                    MealPlan.patient_id == meal_plan.patient_id,
+                    MealPlan.id != meal_plan.id,
+                    MealPlan.is_latest == True
+                ).update({'is_latest': False}, synchronize_session=False)
+                meal_plan.is_latest = True
+            
             # Update meal plan status
             meal_plan.status = 'approved'
             meal_plan.approved_by_uid = meal_plan.generated_by_uid  # Keep for compatibility
@@ -144,8 +185,14 @@ class MealPlanVersioningService:
     def get_version_comparison(plan_id_1: int, plan_id_2: int, nutritionist_id: int) -> Tuple[bool, Optional[Dict[str, Any]], Optional[str]]:
         """Compare two meal plan versions."""
         try:
-            plan1 = MealPlan.query.get(plan_id_1)
-            plan2 = MealPlan.query.get(plan_id_2)
+            # Both versions with their meals in two queries
+            plans = {
+                plan.id: plan for plan in MealPlan.query.options(*PLAN_COMPARISON).filter(
+                    MealPlan.id.in_([plan_id_1, plan_id_2])
+                )
+            }
+            plan1 = plans.get(plan_id_1)
+            plan2 = plans.get(plan_id_2)
             
             if not plan1 or not plan2:
                 return False, None, "One or both meal plans not found"
@@ -156,6 +203,16 @@ class MealPlanVersioningService:
                 plan1.patient_id != plan2.patient_id):
                 return False, None, "Access denied or plans are not for the same patient"
             
+            # Nutrients per meal (servings included) from the columnar recipe snapshot
+            snapshot = recipe_catalog.snapshot()
+            macros = [
+                snapshot.meal_macros(
+                    [m.recipe_id for m in plan.meals],
+                    [float(m.servings or 1) for m in plan.meals]
+                )
+                for plan in (plan1, plan2)
+            ]
+            
             # Build comparison data
             comparison = {
                 'patient_id': plan1.patient_id,
@@ -166,7 +223,10 @@ class MealPlanVersioningService:
                     'plan_name': plan1.plan_name,
                     'status': plan1.status,
                     'created_at': plan1.created_at.isoformat(),
-                    'meals': [meal.to_dict() for meal in plan1.meals]
+                    'meals': [
+                        {**meal.to_dict(), 'nutrients': nutrient_dict(values)}
+                        for meal, values in zip(plan1.meals, macros[0])
+                    ]
                 },
                 'plan2': {
                     'id': plan2.id,
@@ -174,7 +234,10 @@ class MealPlanVersioningService:
                     'plan_name': plan2.plan_name,
                     'status': plan2.status,
                     'created_at': plan2.created_at.isoformat(),
-                    'meals': [meal.to_dict() for meal in plan2.meals]
+                    'meals': [
+                        {**meal.to_dict(), 'nutrients': nutrient_dict(values)}
+                        for meal, values in zip(plan2.meals, macros[1])
+                    ]
                 }
             }
             
@@ -202,6 +265,12 @@ class MealPlanVersioningService:
             comparison['changes'] = changes
             comparison['total_changes'] = len(changes)
             
+            # Nutrition totals per version
+            totals = [plan_macros.sum(axis=0) for plan_macros in macros]
+            comparison['plan1']['nutrition_totals'] = nutrient_dict(totals[0])
+            comparison['plan2']['nutrition_totals'] = nutrient_dict(totals[1])
+            comparison['nutrition_difference'] = nutrient_dict(totals[1] - totals[0])
+            
             return True, comparison, None
             
         except Exception as e:
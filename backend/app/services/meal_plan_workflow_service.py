@@ -4,13 +4,16 @@ Handles dynamic link routing based on invitation status.
 """
 import os
 from typing import Dict, Any, Tuple, Optional
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload
 from ..services.database_service import db
 from ..models.sql_models import (
     PatientInvitation, Patient, MealPlan, MealPlanToken, MealPlanMeal
 )
 from ..services.meal_plan_generator import MealPlanGeneratorService
+from ..services.plan_loading import patient_restriction_options
+from ..services.plan_nutrition import plan_meal_date
 
 class MealPlanWorkflowService:
     """Service for managing the complete meal plan workflow system."""
@@ -99,8 +102,10 @@ class MealPlanWorkflowService:
                 response_data['data'] = MealPlanWorkflowService._get_form_data()
                 
             elif invitation.status == 'completed':
-                # Check if there's a patient profile
-                patient = Patient.query.filter_by(invitation_id=invitation.id).first()
+                # Check if there's a patient profile (restrictions are listed in the plan view and PDF)
+                patient = Patient.query.options(*patient_restriction_options()).filter_by(
+                    invitation_id=invitation.id
+                ).first()
                 if not patient:
                     return False, None, "Patient profile not found"
                 
@@ -445,18 +450,22 @@ class MealPlanWorkflowService:
     def _get_meal_plan_data(meal_plan: MealPlan, patient: Patient) -> Dict[str, Any]:
         """Get formatted meal plan data for display."""
         # Load meals with recipes
-        meals = MealPlanMeal.query.filter_by(plan_id=meal_plan.id).all()
+        meals = MealPlanMeal.query.options(joinedload(MealPlanMeal.recipe)).filter_by(plan_id=meal_plan.id).all()
         
-        # Organize meals by day and type
-        calendar = {}
-        days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+        # Organize meals by date (ISO key, one entry per plan day) and type;
+        # legacy meals without meal_date are placed by day of week
         meal_types = ['breakfast', 'lunch', 'dinner', 'snack']
+        plan_days = (meal_plan.end_date - meal_plan.start_date).days + 1
+        calendar = {
+            (meal_plan.start_date + timedelta(days=day)).isoformat(): {meal_type: [] for meal_type in meal_types}
+            for day in range(plan_days)
+        }
         
-        for day in days:
-            calendar[day] = {}
-            for meal_type in meal_types:
-                day_meals = [meal for meal in meals if meal.day_of_week == day and meal.meal_type == meal_type]
-                calendar[day][meal_type] = [meal.to_dict() for meal in day_meals]
+        for meal in meals:
+            meal_date = plan_meal_date(meal_plan.start_date, plan_days, meal.meal_date, meal.day_of_week)
+            day_meals = calendar[meal_date.isoformat()]
+            if meal.meal_type in day_meals:
+                day_meals[meal.meal_type].append(meal.to_dict())
         
         return {
             'meal_plan': meal_plan.to_dict(),
@@ -555,7 +564,7 @@ class MealPlanWorkflowService:
             
             p.setFont("Helvetica", 10)
             for day, meals in meal_plan_data['calendar'].items():
-                p.drawString(50, y, f"{day.capitalize()}:")
+                p.drawString(50, y, f"{date.fromisoformat(day).strftime('%A %d/%m/%Y')}:")
                 y -= 15
                 for meal_type, meal_list in meals.items():
                     if meal_list:
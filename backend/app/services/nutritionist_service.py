@@ -4,7 +4,7 @@ Nutritionist Service - Handles nutritionist profile management and operations.
 from typing import Dict, Any, List, Optional, Tuple
 from sqlalchemy.exc import SQLAlchemyError
 from app.services.database_service import db
-from app.models.sql_models import Nutritionist, PatientInvitation, MealPlan, Patient
+from app.models.sql_models import Nutritionist, PatientInvitation, MealPlan, MealPlanTemplate, Patient
 
 class NutritionistService:
     """Service for managing nutritionist profiles and operations."""
@@ -208,6 +208,215 @@ class NutritionistService:
             db.session.rollback()
             return False, None, f"Error creating meal plan version: {str(e)}"
     
+    @staticmethod
+    def batch_generate_meal_plans(nutritionist_id: int, patient_ids: List[int], generated_by_uid: str,
+                                  chunk_size: int = 100) -> Tuple[bool, Optional[Dict[str, Any]], Optional[str]]:
+        """Generate meal plans for many of the nutritionist's patients in one call."""
+        try:
+            from app.services.meal_plan_generator import meal_plan_generator
+            
+            # Only patients invited by this nutritionist can be included
+            owned_ids = {
+                row.id for row in db.session.query(Patient.id)
+                .join(PatientInvitation, Patient.invitation_id == PatientInvitation.id)
+                .filter(
+                    Patient.id.in_(patient_ids),
+                    PatientInvitation.nutritionist_id == nutritionist_id
+                ).all()
+            }
+            
+            report = meal_plan_generator.generate_for_patients(
+                patient_ids=[patient_id for patient_id in patient_ids if patient_id in owned_ids],
+                generated_by_uid=generated_by_uid,
+                nutritionist_id=nutritionist_id,
+                chunk_size=chunk_size
+            )
+            
+            denied = [
+                {'patient_id': patient_id, 'success': False, 'error': 'Patient not found or access denied'}
+                for patient_id in dict.fromkeys(patient_ids) if patient_id not in owned_ids
+            ]
+            report['results'].extend(denied)
+            report['total'] += len(denied)
+            report['failed'] += len(denied)
+            
+            return True, report, None
+            
+        except Exception as e:
+            db.session.rollback()
+            return False, None, f"Error generating meal plans: {str(e)}"
+    
+    @staticmethod
+    def get_meal_substitutes(nutritionist_id: int, plan_id: int, meal_id: int,
+                             limit: int = 10) -> Tuple[bool, Optional[Dict[str, Any]], Optional[str]]:
+        """Suggest compatible, similar recipes to replace one meal of a plan."""
+        try:
+            from sqlalchemy.orm import selectinload
+            from app.services.meal_plan_generator import meal_plan_generator
+            from app.services.recipe_similarity import recipe_similarity_index
+            
+            meal_plan = db.session.query(MealPlan).options(
+                selectinload(MealPlan.meals)
+            ).filter(MealPlan.id == plan_id).first()
+            if not meal_plan:
+                return False, None, "Meal plan not found"
+            
+            if meal_plan.nutritionist_id != nutritionist_id:
+                return False, None, "Access denied"
+            
+            meal = next((meal for meal in meal_plan.meals if meal.id == meal_id), None)
+            if not meal:
+                return False, None, "Meal not found in this plan"
+            
+            patient = meal_plan_generator.get_patient_with_restrictions(meal_plan.patient_id)
+            substitutes = recipe_similarity_index.substitutes_for_meal(meal, meal_plan.meals, patient, limit)
+            
+            return True, {
+                'plan_id': meal_plan.id,
+                'meal': meal.to_dict(),
+                'substitutes': substitutes
+            }, None
+            
+        except Exception as e:
+            return False, None, f"Error finding substitutes: {str(e)}"
+    
+    @staticmethod
+    def simulate_meal_plan_changes(nutritionist_id: int, plan_id: int,
+                                   changes: List[Dict[str, Any]]) -> Tuple[bool, Optional[Dict[str, Any]], Optional[str]]:
+        """Preview how proposed meal swaps and servings changes affect a plan's nutrition (read-only)."""
+        try:
+            from app.services.meal_plan_generator import meal_plan_generator
+            from app.services.plan_simulation import plan_nutrition_simulator
+            
+            meal_plan = MealPlan.query.get(plan_id)
+            if not meal_plan:
+                return False, None, "Meal plan not found"
+            
+            if meal_plan.nutritionist_id != nutritionist_id:
+                return False, None, "Access denied"
+            
+            patient = meal_plan_generator.get_patient_with_restrictions(meal_plan.patient_id)
+            simulation = plan_nutrition_simulator.simulate(meal_plan, changes, patient)
+            
+            return True, simulation, None
+            
+        except ValueError as e:
+            return False, None, str(e)
+        except Exception as e:
+            return False, None, f"Error simulating meal plan changes: {str(e)}"
+    
+    @staticmethod
+    def get_meal_plan_nutrition(nutritionist_id: int, plan_id: int) -> Tuple[bool, Optional[Dict[str, Any]], Optional[str]]:
+        """Get a plan's per-day and per-week nutrition from the materialized nutrition table."""
+        try:
+            from app.services.plan_nutrition import plan_nutrition
+            
+            days = plan_nutrition.plan_days(plan_id, nutritionist_id=nutritionist_id)
+            if not days:
+                # Missing, not owned, or created before the nutrition table existed
+                meal_plan = MealPlan.query.get(plan_id)
+                if not meal_plan:
+                    return False, None, "Meal plan not found"
+                
+                if meal_plan.nutritionist_id != nutritionist_id:
+                    return False, None, "Access denied"
+                
+                # Computed in memory, not persisted (read path; the backfill script writes the rows)
+                days = plan_nutrition.compute_plan_days(plan_id)
+            
+            return True, {'plan_id': plan_id, **plan_nutrition.breakdown(days)}, None
+            
+        except Exception as e:
+            return False, None, f"Error getting meal plan nutrition: {str(e)}"
+    
+    @staticmethod
+    def get_meal_plan_templates(nutritionist_id: int) -> Tuple[bool, Optional[List[Dict[str, Any]]], Optional[str]]:
+        """List the nutritionist's active meal plan templates."""
+        try:
+            templates = MealPlanTemplate.query.filter_by(
+                nutritionist_id=nutritionist_id,
+                is_active=True
+            ).order_by(MealPlanTemplate.created_at.desc()).all()
+            
+            return True, [template.to_dict() for template in templates], None
+        
+        except Exception as e:
+            return False, None, f"Error getting meal plan templates: {str(e)}"
+    
+    @staticmethod
+    def create_meal_plan_template(nutritionist_id: int, template_data: Dict[str, Any]) -> Tuple[bool, Optional[MealPlanTemplate], Optional[str]]:
+        """Create a meal plan template from a slot grid or from one of the nutritionist's plans."""
+        try:
+            from app.services.meal_plan_templates import meal_plan_template_service
+            
+            slots = template_data.get('slots')
+            if template_data.get('plan_id'):
+                meal_plan = MealPlan.query.get(template_data['plan_id'])
+                if not meal_plan or meal_plan.nutritionist_id != nutritionist_id:
+                    return False, None, "Meal plan not found or access denied"
+                slots = meal_plan_template_service.slots_from_plan(meal_plan)
+            
+            template = meal_plan_template_service.create_template(
+                nutritionist_id=nutritionist_id,
+                template_name=template_data['template_name'],
+                slots=slots,
+                description=template_data.get('description')
+            )
+            db.session.commit()
+            
+            return True, template, None
+        
+        except ValueError as e:
+            db.session.rollback()
+            return False, None, str(e)
+        except Exception as e:
+            db.session.rollback()
+            return False, None, f"Error creating meal plan template: {str(e)}"
+    
+    @staticmethod
+    def assign_meal_plan_template(nutritionist_id: int, template_id: int, patient_ids: List[int],
+                                  generated_by_uid: str, start_date=None,
+                                  approve: bool = False) -> Tuple[bool, Optional[Dict[str, Any]], Optional[str]]:
+        """Create plans from a template for many of the nutritionist's patients in one pass."""
+        try:
+            from app.services.meal_plan_templates import meal_plan_template_service
+            
+            template = MealPlanTemplate.query.get(template_id)
+            if not template or not template.is_active or template.nutritionist_id != nutritionist_id:
+                return False, None, "Meal plan template not found or access denied"
+            
+            # Only patients invited by this nutritionist can be included
+            owned_ids = {
+                row.id for row in db.session.query(Patient.id)
+                .join(PatientInvitation, Patient.invitation_id == PatientInvitation.id)
+                .filter(
+                    Patient.id.in_(patient_ids),
+                    PatientInvitation.nutritionist_id == nutritionist_id
+                ).all()
+            }
+            
+            report = meal_plan_template_service.assign_template(
+                template=template,
+                patient_ids=[patient_id for patient_id in patient_ids if patient_id in owned_ids],
+                generated_by_uid=generated_by_uid,
+                start_date=start_date,
+                approve=approve
+            )
+            
+            denied = [
+                {'patient_id': patient_id, 'success': False, 'error': 'Patient not found or access denied'}
+                for patient_id in dict.fromkeys(patient_ids) if patient_id not in owned_ids
+            ]
+            report['results'].extend(denied)
+            report['total'] += len(denied)
+            report['failed'] += len(denied)
+            
+            return True, report, None
+        
+        except Exception as e:
+            db.session.rollback()
+            return False, None, f"Error assigning meal plan template: {str(e)}"
+    
     @staticmethod
     def migrate_existing_data(firebase_uid: str) -> Tuple[bool, Optional[str]]:
         """Migrate existing data to link with nutritionist entity."""
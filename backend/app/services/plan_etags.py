@@ -0,0 +1,131 @@
+"""
+ETags de las vistas del plan que consulta el paciente.
+
+El paciente vuelve a abrir su enlace muchas veces por semana y el plan casi
+nunca cambia. Cada vista tiene un validador que se obtiene con una sola
+consulta de columnas por el token (índice único), sin cargar el plan ni sus
+relaciones: ID, versión y ``updated_at`` del plan, ``updated_at`` del paciente
+(y de lo que la vista muestre además) y la huella del catálogo de recetas
+(``catalog_version.fingerprint_key``). Si el cliente ya tiene esa versión, la
+ruta responde 304 sin construir la respuesta.
+
+Las restricciones del paciente se muestran en las vistas pero viven en tablas
+de enlace; al cambiar un enlace se actualiza ``Patient.updated_at`` para que
+el ETag cambie.
+"""
+import hashlib
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import and_, event
+from sqlalchemy.orm import Session
+
+from app.services.database_service import db
+from app.services.catalog_version import catalog_version
+from app.models.sql_models import (
+    MealPlan, MealPlanToken, Nutritionist, Patient, PatientDietaryPreference, PatientIntolerance,
+    PatientInvitation, PatientMedicalCondition
+)
+
+# Enlaces de restricciones que muestran las vistas del paciente
+PATIENT_LINK_MODELS = (PatientMedicalCondition, PatientIntolerance, PatientDietaryPreference)
+
+
+class PlanETagService:
+    """Calcula los ETags de las vistas del plan del paciente sin cargar el plan."""
+
+    def for_public_token(self, token: str) -> Optional[str]:
+        """
+        ETag de ``GET /api/public/meal-plans/<token>``.
+
+        Returns:
+            ETag (sin comillas) o None si el token no existe o expiró
+        """
+        row = db.session.query(
+            MealPlanToken.expires_at, MealPlan.id, MealPlan.version, MealPlan.updated_at, Patient.updated_at
+        ).join(
+            MealPlan, MealPlan.id == MealPlanToken.plan_id
+        ).join(
+            Patient, Patient.id == MealPlan.patient_id
+        ).filter(MealPlanToken.token == token).first()
+
+        if row is None or (row[0] is not None and row[0] <= datetime.utcnow()):
+            return None
+        return self._etag('public', *row[1:])
+
+    def for_patient_token(self, token: str) -> Optional[str]:
+        """
+        ETag de ``GET /api/patient/meal-plan/<token>`` (último plan aprobado del paciente).
+
+        Returns:
+            ETag (sin comillas) o None si la invitación no es válida o no hay plan aprobado
+        """
+        row = db.session.query(
+            PatientInvitation.status, PatientInvitation.expires_at, Patient.updated_at,
+            MealPlan.id, MealPlan.version, MealPlan.updated_at, Nutritionist.updated_at
+        ).join(
+            Patient, Patient.invitation_id == PatientInvitation.id
+        ).join(
+            MealPlan, and_(MealPlan.patient_id == Patient.id, MealPlan.is_latest == True,
+                           MealPlan.status == 'approved')
+        ).outerjoin(
+            Nutritionist, Nutritionist.id == MealPlan.nutritionist_id
+        ).filter(PatientInvitation.token == token).first()
+
+        # Mismas condiciones que la ruta (PatientInvitation.is_valid)
+        if row is None or row[0] != 'pending' or row[1] <= datetime.utcnow():
+            return None
+        return self._etag('patient', *row[2:])
+
+    def for_workflow_token(self, token: str) -> Optional[str]:
+        """
+        ETag de ``GET /api/workflow/patient/<token>`` cuando el enlace muestra el plan.
+
+        Solo hay ETag si la invitación está completada y el plan más reciente
+        del paciente está aprobado; el formulario y los mensajes de revisión
+        pendiente se envían siempre completos.
+
+        Returns:
+            ETag (sin comillas) o None si el enlace no muestra un plan
+        """
+        row = db.session.query(
+            PatientInvitation.status, MealPlan.status, PatientInvitation.updated_at, Patient.updated_at,
+            MealPlan.id, MealPlan.version, MealPlan.updated_at
+        ).join(
+            Patient, Patient.invitation_id == PatientInvitation.id
+        ).join(
+            MealPlan, MealPlan.patient_id == Patient.id
+        ).filter(
+            PatientInvitation.token == token
+        ).order_by(MealPlan.created_at.desc()).first()
+
+        if row is None or row[0] != 'completed' or row[1] != 'approved':
+            return None
+        return self._etag('workflow', *row[2:])
+
+    def _etag(self, view: str, *parts) -> str:
+        """ETag fuerte a partir de la vista, las partes del validador y la huella del catálogo."""
+        key = repr((view, parts, catalog_version.fingerprint_key()))
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+@event.listens_for(Session, 'before_flush')
+def _touch_patients_with_changed_links(session, flush_context, instances):
+    now = datetime.utcnow()
+    for obj in list(session.new | session.dirty | session.deleted):
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        if isinstance(obj, PATIENT_LINK_MODELS):
+            # Los enlaces nuevos creados solo con patient_id no cargan la relación
+            patient = obj.patient or (session.get(Patient, obj.patient_id) if obj.patient_id else None)
+        elif isinstance(obj, Patient) and obj in session.dirty:
+            # Quitar enlaces de las colecciones del paciente no actualiza su fila
+            patient = obj
+        else:
+            continue
+        if patient is not None and patient not in session.deleted:
+            patient.updated_at = now
+
+
+# Instancia global
+plan_etags = PlanETagService()
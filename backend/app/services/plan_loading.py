@@ -0,0 +1,68 @@
+"""
+Perfiles de carga para las rutas que leen planes de comidas.
+
+Encadenar ``joinedload`` sobre varias colecciones (comidas → ingredientes de
+cada receta, condiciones e intolerancias del paciente) produce un solo SELECT
+con el producto cartesiano de todas ellas: miles de filas duplicadas para un
+plan semanal. Estos perfiles cargan cada colección con ``selectinload`` (un
+``SELECT ... WHERE id IN (...)`` por nivel) y solo usan ``joinedload`` en las
+relaciones muchos-a-uno (receta de una comida, ingrediente, condición), que
+no multiplican filas. Ver ``benchmarks/bench_plan_loading.py``.
+"""
+from typing import List, Optional
+
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.strategy_options import Load
+
+from app.models.sql_models import (
+    MealPlan, MealPlanMeal, Patient, PatientDietaryPreference, PatientIntolerance,
+    PatientMedicalCondition, Recipe, RecipeIngredient
+)
+
+
+def patient_restriction_options(patient: Optional[Load] = None, preferences: bool = True) -> List[Load]:
+    """
+    Opciones para cargar las restricciones de un paciente con su catálogo.
+
+    Args:
+        patient: Carga del paciente desde la entidad raíz (p. ej.
+            ``joinedload(MealPlan.patient)``); None si la raíz es ``Patient``
+        preferences: Cargar también las preferencias dietéticas
+
+    Returns:
+        Lista de opciones para ``Query.options``
+    """
+    load = patient.selectinload if patient is not None else selectinload
+    options = [
+        load(Patient.medical_conditions).joinedload(PatientMedicalCondition.condition),
+        load(Patient.intolerances).joinedload(PatientIntolerance.intolerance)
+    ]
+    if preferences:
+        options.append(load(Patient.dietary_preferences).joinedload(PatientDietaryPreference.preference))
+    return options
+
+
+# Comidas del plan con su receta e ingredientes
+PLAN_MEAL_RECIPES = selectinload(MealPlan.meals).joinedload(MealPlanMeal.recipe).selectinload(
+    Recipe.ingredients
+).joinedload(RecipeIngredient.ingredient)
+
+# Vista pública por token: paciente con condiciones e intolerancias, comidas con su receta
+# (los ingredientes ya están en Recipe.view_fragments)
+PUBLIC_PLAN_VIEW = (
+    *patient_restriction_options(joinedload(MealPlan.patient), preferences=False),
+    selectinload(MealPlan.meals).joinedload(MealPlanMeal.recipe)
+)
+
+# Vista del paciente por invitación: además las preferencias y el nutricionista
+PATIENT_PLAN_VIEW = (
+    *patient_restriction_options(joinedload(MealPlan.patient)),
+    joinedload(MealPlan.nutritionist),
+    PLAN_MEAL_RECIPES
+)
+
+# Comparación de versiones: el paciente y las comidas con su receta (macros desde la instantánea del catálogo)
+PLAN_COMPARISON = (
+    joinedload(MealPlan.patient),
+    selectinload(MealPlan.meals).joinedload(MealPlanMeal.recipe)
+)
@@ -0,0 +1,352 @@
+"""
+Nutrición materializada por plan y por día (tabla ``meal_plan_nutrition``).
+
+Cada plan tiene una fila por día (de ``start_date`` a ``end_date``) con el
+número de comidas y la suma de calorías, proteína, carbohidratos, grasa y
+fibra de sus recetas por las porciones. Los resúmenes y desgloses por día o
+por semana leen esas filas con una sola consulta por ``plan_id`` (índice de
+la restricción única ``plan_id, day_index``) en lugar de recorrer las comidas.
+
+Las filas se recalculan en la misma transacción que el cambio:
+
+- un listener ``after_flush`` cubre las comidas (nuevas, editadas o
+  borradas), las fechas del plan y los cambios de macros de una receta (solo
+  los planes vigentes que la usan);
+- las inserciones masivas sin ORM (``bulk_persist_plans``) llaman a
+  ``refresh`` directamente.
+
+El resto de planes que usan una receta editada (el historial de versiones) se
+recalcula fuera de la petición con el trabajo ``refresh_plan_nutrition``, que
+se encola en la misma transacción y recorre los planes por bloques.
+
+Los planes anteriores a la tabla se completan con
+``scripts/add_meal_plan_nutrition_table.py``.
+"""
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+from flask import has_app_context
+from sqlalchemy import delete, event, func, inspect, insert, select
+from sqlalchemy.orm import Session
+
+from app.services.database_service import db
+from app.services.job_queue import job_queue
+from app.services.recipe_catalog import NUTRIENT_FIELDS, nutrient_dict
+from app.models.sql_models import BackgroundJob, MealPlan, MealPlanMeal, MealPlanNutrition, Recipe
+
+# Tipo de trabajo en segundo plano para recalcular el historial de planes
+REFRESH_PLAN_NUTRITION_JOB = 'refresh_plan_nutrition'
+
+DAY_ORDER = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+# Columnas de macros de la receta, en el orden de NUTRIENT_FIELDS
+RECIPE_MACRO_COLUMNS = ('total_calories', 'total_protein', 'total_carbs', 'total_fat', 'total_fiber')
+
+# Planes por sentencia al recalcular
+BATCH_SIZE = 500
+
+
+def plan_day_index(start_date, days: int, meal_date, day_of_week: str) -> int:
+    """Día del plan de una comida (las comidas sin fecha se ubican por día de la semana)."""
+    if meal_date is not None:
+        day = (meal_date - start_date).days
+    else:
+        day = (DAY_ORDER.index(day_of_week) - start_date.weekday()) % 7
+    return min(max(day, 0), days - 1)
+
+
+def plan_meal_date(start_date, days: int, meal_date, day_of_week: str):
+    """Fecha de una comida del plan (las comidas sin fecha se ubican por día de la semana)."""
+    return start_date + timedelta(days=plan_day_index(start_date, days, meal_date, day_of_week))
+
+
+class PlanNutritionService:
+    """Mantiene y lee la tabla de nutrición por día de los planes."""
+
+    def refresh(self, session: Session, plan_ids: Iterable[int]) -> int:
+        """
+        Recalcula las filas por día de unos planes (sin commit).
+
+        Args:
+            session: Sesión cuya transacción se usa
+            plan_ids: IDs de los planes (los que ya no existen solo pierden sus filas)
+
+        Returns:
+            Número de filas escritas
+        """
+        plan_ids = sorted(set(plan_ids))
+        written = 0
+        for start in range(0, len(plan_ids), BATCH_SIZE):
+            written += self._refresh_batch(session, plan_ids[start:start + BATCH_SIZE])
+        return written
+
+    def enqueue_history_refresh(self, recipe_ids: Iterable[int], after_plan_id: int = 0) -> BackgroundJob:
+        """
+        Encola el recálculo de los planes que usan unas recetas (sin commit).
+
+        Args:
+            recipe_ids: Recetas con macros modificadas
+            after_plan_id: Cursor: solo planes con ID mayor
+
+        Returns:
+            Trabajo pendiente
+        """
+        return job_queue.enqueue(REFRESH_PLAN_NUTRITION_JOB, {
+            'recipe_ids': sorted(set(recipe_ids)),
+            'after_plan_id': after_plan_id
+        })
+
+    def run_history_refresh_job(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Handler del trabajo ``refresh_plan_nutrition``: recalcula un bloque y encola el siguiente."""
+        recipe_ids = payload.get('recipe_ids', [])
+        # Todos los planes que usan las recetas, no solo los no vigentes: un borrador
+        # aplazado puede haberse aprobado (y pasado a vigente) antes de que corra el trabajo
+        plan_ids = list(db.session.execute(
+            select(MealPlanMeal.plan_id).where(
+                MealPlanMeal.recipe_id.in_(recipe_ids),
+                MealPlanMeal.plan_id > payload.get('after_plan_id', 0)
+            ).distinct().order_by(MealPlanMeal.plan_id).limit(BATCH_SIZE)
+        ).scalars())
+
+        summary = {'plans_refreshed': len(plan_ids), 'rows_written': self.refresh(db.session, plan_ids)}
+        if len(plan_ids) == BATCH_SIZE:
+            next_job = self.enqueue_history_refresh(recipe_ids, after_plan_id=plan_ids[-1])
+            db.session.flush()
+            summary['next_job_id'] = next_job.id
+        return summary
+
+    def plan_days(self, plan_id: int, nutritionist_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Filas por día de un plan, en orden.
+
+        Args:
+            plan_id: ID del plan
+            nutritionist_id: Si se indica, solo devuelve filas de planes de ese nutricionista
+
+        Returns:
+            Lista de dicts por día (vacía si el plan no existe, no es accesible o no tiene filas)
+        """
+        query = db.session.query(MealPlanNutrition).filter(MealPlanNutrition.plan_id == plan_id)
+        if nutritionist_id is not None:
+            query = query.join(MealPlan, MealPlan.id == MealPlanNutrition.plan_id).filter(
+                MealPlan.nutritionist_id == nutritionist_id
+            )
+        return [row.to_dict() for row in query.order_by(MealPlanNutrition.day_index)]
+
+    def plan_totals(self, plan_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Totales de un plan en una sola consulta agregada.
+
+        Returns:
+            Dict con 'days', 'meal_count' y los totales de nutrientes, o None si el plan no tiene filas
+        """
+        row = db.session.query(
+            func.count(MealPlanNutrition.id), func.sum(MealPlanNutrition.meal_count),
+            *(func.sum(getattr(MealPlanNutrition, field)) for field in NUTRIENT_FIELDS)
+        ).filter(MealPlanNutrition.plan_id == plan_id).one()
+        if not row[0]:
+            return None
+        return {
+            'days': int(row[0]),
+            'meal_count': int(row[1] or 0),
+            **{field: float(value or 0) for field, value in zip(NUTRIENT_FIELDS, row[2:])}
+        }
+
+    def breakdown(self, days: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Desglose por día, por semana, en total y como promedio diario a partir de las filas.
+
+        Args:
+            days: Filas por día de ``plan_days``
+
+        Returns:
+            Dict con 'days', 'weeks', 'totals' y 'daily_averages'
+        """
+        values = np.array([[day[field] for field in NUTRIENT_FIELDS] for day in days],
+                          dtype=np.float64).reshape(len(days), len(NUTRIENT_FIELDS))
+        weeks = []
+        for week in range(-(-len(days) // 7)):
+            week_days = days[week * 7:week * 7 + 7]
+            weeks.append({
+                'week': week + 1,
+                'start_date': week_days[0]['date'],
+                'end_date': week_days[-1]['date'],
+                'meal_count': sum(day['meal_count'] for day in week_days),
+                **nutrient_dict(values[week * 7:week * 7 + 7].sum(axis=0), digits=2)
+            })
+        return {
+            'days': days,
+            'weeks': weeks,
+            'totals': {
+                'meal_count': sum(day['meal_count'] for day in days),
+                **nutrient_dict(values.sum(axis=0), digits=2)
+            },
+            'daily_averages': nutrient_dict(values.mean(axis=0) if days else np.zeros(len(NUTRIENT_FIELDS)))
+        }
+
+    def compute_plan_days(self, plan_id: int) -> List[Dict[str, Any]]:
+        """
+        Filas por día de un plan calculadas en memoria, sin guardarlas.
+
+        Para leer planes anteriores a la tabla sin escribir en una petición GET
+        (``scripts/add_meal_plan_nutrition_table.py`` los completa).
+
+        Returns:
+            Lista de dicts por día con el formato de ``plan_days`` (vacía si el plan no existe)
+        """
+        return [
+            {
+                'date': row['meal_date'].isoformat(),
+                'day_of_week': row['day_of_week'],
+                'meal_count': row['meal_count'],
+                **{field: row[field] for field in NUTRIENT_FIELDS}
+            }
+            for row in self._compute_rows(db.session, [plan_id])
+        ]
+
+    def _refresh_batch(self, session: Session, plan_ids: Sequence[int]) -> int:
+        rows = self._compute_rows(session, plan_ids)
+        session.execute(delete(MealPlanNutrition).where(MealPlanNutrition.plan_id.in_(plan_ids)),
+                        execution_options={'synchronize_session': False})
+        if rows:
+            session.execute(insert(MealPlanNutrition), rows)
+
+        # Las colecciones ya cargadas se vuelven a leer en el próximo acceso
+        for plan_id in plan_ids:
+            plan = session.identity_map.get(Session.identity_key(MealPlan, plan_id))
+            if plan is not None and 'nutrition_days' in plan.__dict__:
+                session.expire(plan, ['nutrition_days'])
+        return len(rows)
+
+    def _compute_rows(self, session: Session, plan_ids: Sequence[int]) -> List[Dict[str, Any]]:
+        """Filas por día (columnas de ``MealPlanNutrition``) de unos planes, en orden de plan y día."""
+        plans = session.execute(
+            select(MealPlan.id, MealPlan.start_date, MealPlan.end_date).where(MealPlan.id.in_(plan_ids))
+        ).all()
+        meals = session.execute(
+            select(
+                MealPlanMeal.plan_id, MealPlanMeal.meal_date, MealPlanMeal.day_of_week, MealPlanMeal.servings,
+                Recipe.id, *(getattr(Recipe, column) for column in RECIPE_MACRO_COLUMNS)
+            ).outerjoin(
+                Recipe, Recipe.id == MealPlanMeal.recipe_id
+            ).where(MealPlanMeal.plan_id.in_(plan_ids))
+        ).all()
+
+        meals_by_plan: Dict[int, list] = {}
+        for meal in meals:
+            meals_by_plan.setdefault(meal[0], []).append(meal)
+
+        rows = []
+        for plan in plans:
+            days = max((plan.end_date - plan.start_date).days + 1, 1)
+            totals = np.zeros((days, len(NUTRIENT_FIELDS)))
+            counts = np.zeros(days, dtype=np.int64)
+            for _, meal_date, day_of_week, servings, recipe_id, *macros in meals_by_plan.get(plan.id, ()):
+                if recipe_id is None:
+                    continue
+                day = plan_day_index(plan.start_date, days, meal_date, day_of_week)
+                totals[day] += np.array([float(value or 0) for value in macros]) * float(servings or 1)
+                counts[day] += 1
+            for day in range(days):
+                meal_date = plan.start_date + timedelta(days=day)
+                rows.append({
+                    'plan_id': plan.id,
+                    'day_index': day,
+                    'meal_date': meal_date,
+                    'day_of_week': DAY_ORDER[meal_date.weekday()],
+                    'meal_count': int(counts[day]),
+                    **{field: round(float(value), 2) for field, value in zip(NUTRIENT_FIELDS, totals[day])}
+                })
+        return rows
+
+
+def _changed(obj, columns: Sequence[str]) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[column].history.has_changes() for column in columns)
+
+
+def _defer_history(session) -> bool:
+    # Los trabajos se encolan en la sesión de la aplicación; fuera de ella se recalcula todo en el flush
+    return has_app_context() and session is db.session()
+
+
+def _collect_changed_plans(session: Session) -> Set[int]:
+    """
+    Planes cuya nutrición por día cambia con los objetos del flush.
+
+    De las recetas con macros modificadas solo se devuelven los planes vigentes
+    (``is_latest``); las recetas quedan en ``session.info`` para encolar el
+    recálculo del historial.
+    """
+    plan_ids, recipe_ids = set(), set()
+    for obj in session.new:
+        if isinstance(obj, MealPlan):
+            plan_ids.add(obj.id)
+        elif isinstance(obj, MealPlanMeal):
+            plan_ids.add(obj.plan_id)
+    for obj in session.dirty:
+        if isinstance(obj, MealPlan) and _changed(obj, ('start_date', 'end_date')):
+            plan_ids.add(obj.id)
+        elif isinstance(obj, MealPlanMeal) and _changed(
+            obj, ('plan_id', 'recipe_id', 'servings', 'meal_date', 'day_of_week')
+        ):
+            # Una comida movida de plan cambia el plan anterior y el nuevo
+            plan_ids.update(inspect(obj).attrs.plan_id.history.deleted or ())
+            plan_ids.add(obj.plan_id)
+        elif isinstance(obj, Recipe) and _changed(obj, RECIPE_MACRO_COLUMNS):
+            recipe_ids.add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, MealPlanMeal):
+            plan_ids.add(obj.plan_id)
+
+    if recipe_ids:
+        query = select(MealPlanMeal.plan_id).where(MealPlanMeal.recipe_id.in_(recipe_ids)).distinct()
+        if _defer_history(session):
+            query = query.join(MealPlan, MealPlan.id == MealPlanMeal.plan_id).where(MealPlan.is_latest == True)
+            session.info.setdefault('plan_nutrition_pending', set()).update(recipe_ids)
+        plan_ids.update(session.execute(query).scalars())
+    plan_ids.discard(None)
+    # Las filas de los planes borrados se borran en cascada con el plan
+    plan_ids.difference_update(obj.id for obj in session.deleted if isinstance(obj, MealPlan))
+    return plan_ids
+
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_changed_plans(session, flush_context):
+    plan_ids = _collect_changed_plans(session)
+    if plan_ids:
+        plan_nutrition.refresh(session, plan_ids)
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _enqueue_history_refresh(session, flush_context):
+    """Encola el recálculo del historial en la misma transacción que el cambio de la receta."""
+    recipe_ids = session.info.pop('plan_nutrition_pending', None)
+    if not recipe_ids:
+        return
+    has_history = session.execute(
+        select(MealPlanMeal.id).join(MealPlan, MealPlan.id == MealPlanMeal.plan_id).where(
+            MealPlanMeal.recipe_id.in_(recipe_ids), MealPlan.is_latest == False
+        ).limit(1)
+    ).first()
+    if has_history is not None:
+        plan_nutrition.enqueue_history_refresh(recipe_ids)
+        session.info['plan_nutrition_enqueued'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_history_refresh(session):
+    if session.info.pop('plan_nutrition_enqueued', False):
+        job_queue.dispatch(allow_inline=False)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_history_refresh(session):
+    session.info.pop('plan_nutrition_pending', None)
+    session.info.pop('plan_nutrition_enqueued', None)
+
+
+# Instancia global
+plan_nutrition = PlanNutritionService()
+job_queue.register(REFRESH_PLAN_NUTRITION_JOB, plan_nutrition.run_history_refresh_job)
@@ -0,0 +1,211 @@
+"""
+Optimizador de distribución semanal por objetivos de macronutrientes.
+
+Construye la grilla días × tipos de comida buscando que los totales diarios de
+calorías, proteína, carbohidratos y grasa se acerquen a los objetivos del
+paciente. La puntuación se calcula vectorizada sobre arreglos NumPy con las
+macros de las recetas y la búsqueda local respeta un presupuesto de tiempo.
+"""
+import time
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Orden de las columnas de macros: calorías, proteína, carbohidratos, grasa
+MACRO_FIELDS = ('calories', 'protein', 'carbs', 'fat')
+
+# Objetivos diarios por defecto según género
+DEFAULT_DAILY_TARGETS = {
+    'female': (1800.0, 90.0, 225.0, 60.0),
+    'male': (2200.0, 110.0, 275.0, 73.0),
+    'other': (2000.0, 100.0, 250.0, 67.0)
+}
+
+# Peso relativo de cada macro en la desviación (las calorías pesan el doble)
+MACRO_WEIGHTS = np.array([2.0, 1.0, 1.0, 1.0])
+
+
+def daily_targets_for_patient(patient) -> np.ndarray:
+    """
+    Calcula los objetivos diarios de macros para un paciente.
+
+    Args:
+        patient: Paciente (usa género y fecha de nacimiento)
+
+    Returns:
+        Arreglo con calorías, proteína, carbohidratos y grasa diarios
+    """
+    targets = np.array(DEFAULT_DAILY_TARGETS.get(patient.gender, DEFAULT_DAILY_TARGETS['other']))
+
+    # Reducir requerimiento energético a partir de los 50 años
+    if patient.date_of_birth:
+        age = (date.today() - patient.date_of_birth).days / 365.25
+        if age >= 50:
+            targets = targets * 0.9
+
+    return targets
+
+
+def random_schedule(candidate_counts: Sequence[int], days: int, no_repeat_days: int,
+                    rng: np.random.Generator) -> List[np.ndarray]:
+    """
+    Asignación aleatoria día a día que respeta la ventana sin repeticiones.
+
+    Cada tipo de comida lleva un arreglo con el último día en que se usó cada
+    receta; en cada día solo son elegibles las recetas fuera de la ventana.
+
+    Args:
+        candidate_counts: Número de recetas candidatas por tipo de comida
+        days: Número de días del plan
+        no_repeat_days: Una receta no se repite dentro de esta cantidad de días
+        rng: Generador aleatorio
+
+    Returns:
+        Índices de fila por tipo de comida, uno por día
+    """
+    window = max(1, min(no_repeat_days, days))
+    schedule = []
+    for count in candidate_counts:
+        if window >= days:
+            schedule.append(rng.choice(count, size=days, replace=False))
+            continue
+        last_used = np.full(count, -window, dtype=np.int64)
+        rows = np.empty(days, dtype=np.int64)
+        for day in range(days):
+            eligible = np.flatnonzero(last_used <= day - window)
+            rows[day] = eligible[rng.integers(len(eligible))]
+            last_used[rows[day]] = day
+        schedule.append(rows)
+    return schedule
+
+
+class WeeklyPlanOptimizer:
+    """Búsqueda local sobre la grilla de comidas con presupuesto de tiempo."""
+
+    def __init__(self, time_budget_ms: float = 50.0, seed: Optional[int] = None):
+        self.time_budget = time_budget_ms / 1000.0
+        self.rng = np.random.default_rng(seed)
+
+    def optimize(self, macros_by_type: Dict[str, np.ndarray], targets: Sequence[float],
+                 days: int = 7, no_repeat_days: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Asigna una receta por día y tipo de comida.
+
+        Args:
+            macros_by_type: Macros (n, 4) de las recetas candidatas por tipo de comida
+            targets: Objetivos diarios (calorías, proteína, carbohidratos, grasa)
+            days: Número de días de la grilla
+            no_repeat_days: Una receta no se repite dentro de esta cantidad de días
+                (por defecto ``days``: todas distintas)
+
+        Returns:
+            Dict con los índices de fila elegidos por tipo de comida, uno por día
+        """
+        deadline = time.perf_counter() + self.time_budget
+        targets = np.asarray(targets, dtype=np.float64)
+        scale = MACRO_WEIGHTS / np.square(targets)
+        window = max(1, min(no_repeat_days or days, days))
+
+        meal_types = list(macros_by_type.keys())
+        macros = [np.nan_to_num(np.asarray(macros_by_type[m], dtype=np.float64)) for m in meal_types]
+
+        for meal_type, candidates in zip(meal_types, macros):
+            if len(candidates) < window:
+                raise ValueError(
+                    f"No hay suficientes recetas de {meal_type}. "
+                    f"Se necesitan {window}, solo hay {len(candidates)}"
+                )
+
+        # Asignación inicial aleatoria, sin repetir recetas dentro de la ventana
+        assignment = random_schedule([len(c) for c in macros], days, window, self.rng)
+
+        day_totals = np.zeros((days, len(MACRO_FIELDS)))
+        for candidates, rows in zip(macros, assignment):
+            day_totals += candidates[rows]
+
+        slots = [(day, t) for day in range(days) for t in range(len(meal_types))]
+        stale = 0
+        while stale < len(slots) and time.perf_counter() < deadline:
+            day, t = slots[self.rng.integers(len(slots))]
+            if self._improve_slot(day, t, macros, assignment, window, day_totals, targets, scale):
+                stale = 0
+            else:
+                stale += 1
+
+        return {meal_type: assignment[t] for t, meal_type in enumerate(meal_types)}
+
+    def _improve_slot(self, day, t, macros, assignment, window, day_totals, targets, scale) -> bool:
+        """Prueba reemplazar la receta del slot o intercambiarla con otro día."""
+        candidates = macros[t]
+        rows = assignment[t]
+        days = len(rows)
+        current = rows[day]
+        base = day_totals[day] - candidates[current]
+        current_cost = self._cost(day_totals[day], targets, scale)
+
+        # Reemplazo: evaluar todas las recetas fuera de la ventana de una vez
+        replace_costs = (np.square(base + candidates - targets) * scale).sum(axis=1)
+        replace_costs[rows[max(0, day - window + 1):day + window]] = np.inf
+        best = int(np.argmin(replace_costs))
+        replace_gain = current_cost - replace_costs[best]
+
+        # Intercambio: mover la receta de este día con la de cada otro día
+        others = candidates[rows]  # (days, 4)
+        other_base = day_totals - others
+        swapped_here = base + others
+        swapped_there = other_base + candidates[current]
+        swap_costs = (
+            (np.square(swapped_here - targets) * scale).sum(axis=1)
+            + (np.square(swapped_there - targets) * scale).sum(axis=1)
+        )
+        pair_costs = current_cost + (np.square(day_totals - targets) * scale).sum(axis=1)
+        swap_gains = pair_costs - swap_costs
+        swap_gains[day] = 0.0
+        if window < days:
+            swap_gains[self._invalid_swaps(rows, day, window)] = 0.0
+        other_day = int(np.argmax(swap_gains))
+        swap_gain = swap_gains[other_day]
+
+        if replace_gain <= 1e-12 and swap_gain <= 1e-12:
+            return False
+
+        if replace_gain >= swap_gain:
+            rows[day] = best
+            day_totals[day] = base + candidates[best]
+        else:
+            other = rows[other_day]
+            rows[day], rows[other_day] = other, current
+            day_totals[day] = swapped_here[other_day]
+            day_totals[other_day] = swapped_there[other_day]
+        return True
+
+    @staticmethod
+    def _invalid_swaps(rows: np.ndarray, day: int, window: int) -> np.ndarray:
+        """Días con los que intercambiar ``day`` repetiría una receta dentro de la ventana."""
+        positions = np.arange(len(rows))
+        # La receta de ``day`` movida a cada otro día choca con sus otros usos cercanos
+        current_uses = np.flatnonzero((rows == rows[day]) & (positions != day))
+        invalid = (np.abs(current_uses[:, None] - positions[None, :]) < window).any(axis=0)
+        # La receta de cada otro día movida a ``day`` choca con sus usos cerca de ``day``
+        same = rows[:, None] == rows[None, :]
+        near_day = (np.abs(positions - day) < window) & (positions != day)
+        invalid |= (same & near_day[None, :] & (positions[None, :] != positions[:, None])).any(axis=1)
+        return invalid
+
+    @staticmethod
+    def _cost(totals, targets, scale) -> float:
+        return float((np.square(totals - targets) * scale).sum())
+
+
+def plan_deviation(macros_by_type: Dict[str, np.ndarray], assignment: Dict[str, np.ndarray],
+                   targets: Sequence[float]) -> np.ndarray:
+    """
+    Calcula la desviación relativa media de los totales diarios respecto al objetivo.
+
+    Returns:
+        Desviación absoluta relativa media por macro (calorías, proteína, carbohidratos, grasa)
+    """
+    targets = np.asarray(targets, dtype=np.float64)
+    day_totals = sum(np.asarray(macros_by_type[m], dtype=np.float64)[rows] for m, rows in assignment.items())
+    return np.abs(day_totals - targets).mean(axis=0) / targets
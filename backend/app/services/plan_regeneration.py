@@ -0,0 +1,389 @@
+"""
+Regeneración masiva de planes en paralelo (p. ej. tras renovar el catálogo).
+
+La parte de CPU (puntuar y armar la grilla de cada plan) se reparte en un
+``ProcessPoolExecutor``. Cada worker recibe una sola vez, al iniciar, las
+tablas de solo lectura del catálogo (IDs y macros de las recetas activas por
+tipo de comida) y procesa bloques de pacientes descritos de forma compacta
+(plan, candidatas por firma de restricciones, objetivos, días). Solo devuelve
+la asignación de recetas por slot; el proceso principal arma las filas y hace
+las inserciones masivas por bloques mientras los workers siguen calculando.
+
+El filtrado de compatibilidad se hace en el proceso principal, una vez por
+firma de restricciones, con el índice en memoria: las reglas de condiciones y
+preferencias vienen de la base de datos, que los workers no usan.
+
+Cada plan regenerado es una nueva versión en borrador del plan aprobado
+vigente, para el mismo rango de fechas, que el nutricionista revisa. El
+borrador no desplaza al plan aprobado: el paciente lo sigue viendo hasta que
+se aprueba la nueva versión. Los planes que ya tienen su borrador regenerado
+se omiten, así que una ejecución interrumpida se reanuda al repetirla.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import exists
+from sqlalchemy.orm import aliased
+
+from app.services.database_service import db
+from app.services.meal_plan_generator import meal_plan_generator
+from app.services.recipe_index import recipe_compatibility_index
+from app.services.restriction_resolver import restriction_resolver
+from app.services.plan_optimizer import WeeklyPlanOptimizer, daily_targets_for_patient, random_schedule
+from app.models.sql_models import (
+    MealPlan, Patient, PatientIntolerance, PatientMedicalCondition, PatientDietaryPreference
+)
+
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner')
+DEFAULT_SHARD_SIZE = 250
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_CHUNK_SIZE = 500
+
+# Tablas del catálogo y ajustes de cada worker (fijados por _init_worker)
+_worker_tables: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+_worker_settings: Dict[str, Any] = {}
+
+
+def _init_worker(tables: Dict[str, Tuple[np.ndarray, np.ndarray]], settings: Dict[str, Any]):
+    """Inicializa un worker con las tablas de solo lectura del catálogo."""
+    global _worker_tables, _worker_settings
+    for recipe_ids, macros in tables.values():
+        recipe_ids.flags.writeable = False
+        macros.flags.writeable = False
+    _worker_tables = tables
+    _worker_settings = settings
+
+
+def build_shard(shard_index: int, candidates: Dict[int, Dict[str, np.ndarray]],
+                jobs: List[tuple]) -> List[tuple]:
+    """
+    Arma la grilla de un bloque de planes (se ejecuta en un worker).
+
+    Args:
+        shard_index: Número de bloque (deriva la semilla aleatoria)
+        candidates: Firma -> tipo de comida -> filas candidatas en las tablas del catálogo
+        jobs: Tuplas (plan_id, firma, objetivos, días, ventana sin repeticiones)
+
+    Returns:
+        Tuplas (plan_id, IDs de recetas (tipos, días) int64 o None, error o None)
+    """
+    seed = _worker_settings.get('seed')
+    rng = np.random.default_rng(None if seed is None else (seed, shard_index))
+    optimizer = WeeklyPlanOptimizer(time_budget_ms=_worker_settings['budget_ms'], seed=rng.integers(2 ** 32))
+
+    results = []
+    for plan_id, signature, targets, days, window in jobs:
+        rows_by_type = candidates[signature]
+        try:
+            if _worker_settings['mode'] == 'optimized':
+                macros_by_type = {
+                    meal_type: _worker_tables[meal_type][1][rows] for meal_type, rows in rows_by_type.items()
+                }
+                assignment = optimizer.optimize(macros_by_type, targets, days=days, no_repeat_days=window)
+                schedule = [assignment[meal_type] for meal_type in rows_by_type]
+            else:
+                schedule = random_schedule([len(rows) for rows in rows_by_type.values()], days, window, rng)
+        except Exception as e:
+            results.append((plan_id, None, str(e)))
+            continue
+
+        slots = np.stack([
+            _worker_tables[meal_type][0][rows[chosen]]
+            for (meal_type, rows), chosen in zip(rows_by_type.items(), schedule)
+        ])
+        results.append((plan_id, slots, None))
+    return results
+
+
+class PlanRegenerationService:
+    """Regenera los planes aprobados vigentes de muchos pacientes con un pool de procesos."""
+
+    def regenerate(self, patient_ids: Optional[Iterable[int]] = None, workers: Optional[int] = None,
+                   shard_size: int = DEFAULT_SHARD_SIZE, batch_size: int = DEFAULT_BATCH_SIZE,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE, seed: Optional[int] = None,
+                   dry_run: bool = False,
+                   progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Regenera el plan aprobado vigente de los pacientes activos.
+
+        Args:
+            patient_ids: Limitar a estos pacientes (por defecto todos los activos)
+            workers: Procesos del pool (por defecto ``os.cpu_count()``; 1 = sin pool)
+            shard_size: Planes por tarea enviada a un worker
+            batch_size: Pacientes leídos de la base de datos por consulta
+            chunk_size: Planes por transacción de escritura
+            seed: Semilla para resultados reproducibles
+            dry_run: Solo contar los planes a regenerar
+            progress: Función llamada con el resumen parcial tras cada escritura
+
+        Returns:
+            Resumen con planes revisados, generados, fallidos y tiempos
+        """
+        started = time.perf_counter()
+        workers = max(1, workers or os.cpu_count() or 1)
+        summary = {
+            'dry_run': dry_run,
+            'workers': workers,
+            'checked': 0,
+            'generated': 0,
+            'failed': 0,
+            'shards': 0,
+            'restriction_groups': 0,
+            'errors': {},
+            'persist_seconds': 0.0
+        }
+
+        tables = {
+            meal_type: table for meal_type, table in recipe_compatibility_index.macro_tables().items()
+            if meal_type in MEAL_TYPES
+        }
+        settings = {
+            'mode': meal_plan_generator.get_setting('MEAL_PLAN_DISTRIBUTION_MODE', 'optimized'),
+            'budget_ms': float(meal_plan_generator.get_setting('MEAL_PLAN_OPTIMIZER_BUDGET_MS', 50.0)),
+            'seed': seed
+        }
+        no_repeat_days = int(meal_plan_generator.get_setting('MEAL_PLAN_NO_REPEAT_DAYS', 7))
+
+        candidates: Dict[tuple, Dict[str, np.ndarray]] = {}
+        signature_ids: Dict[tuple, int] = {}
+        plans: Dict[int, Any] = {}
+        shards: List[Tuple[Dict[int, Dict[str, np.ndarray]], List[tuple]]] = []
+
+        # 1. Leer planes y restricciones por bloques y describir cada plan de forma compacta
+        jobs: List[tuple] = []
+        for batch, restrictions in self._iter_batches(patient_ids, batch_size):
+            summary['checked'] += len(batch)
+            for plan in batch:
+                signature = restrictions.get(plan.patient_id, ((), (), ()))
+                days = (plan.end_date - plan.start_date).days + 1
+                window = min(no_repeat_days, days) if days > 7 else days
+
+                if signature not in candidates:
+                    candidates[signature] = self._candidate_rows(signature, tables)
+                    signature_ids[signature] = len(signature_ids)
+                rows_by_type = candidates[signature]
+                try:
+                    meal_plan_generator.validate_recipe_availability(rows_by_type, required_per_type=window)
+                except ValueError as e:
+                    summary['errors'][plan.patient_id] = str(e)
+                    continue
+
+                plans[plan.id] = plan
+                jobs.append((plan.id, signature_ids[signature], daily_targets_for_patient(plan), days, window))
+                if len(jobs) >= shard_size:
+                    shards.append(self._make_shard(jobs, candidates, signature_ids))
+                    jobs = []
+        if jobs:
+            shards.append(self._make_shard(jobs, candidates, signature_ids))
+
+        summary['shards'] = len(shards)
+        summary['restriction_groups'] = len(candidates)
+        summary['failed'] = len(summary['errors'])
+        if dry_run or not shards:
+            return self._finish(summary, started)
+
+        # 2. Armar las grillas en paralelo y escribir por bloques a medida que llegan
+        pending: List[Dict[str, Any]] = []
+        for results in self._run_shards(shards, tables, settings, workers):
+            for plan_id, slots, error in results:
+                plan = plans[plan_id]
+                if error is not None:
+                    summary['errors'][plan.patient_id] = error
+                    summary['failed'] += 1
+                    continue
+                pending.append(self._build_spec(plan, slots))
+                if len(pending) >= chunk_size:
+                    self._persist(pending, summary, progress)
+                    pending = []
+        if pending:
+            self._persist(pending, summary, progress)
+
+        return self._finish(summary, started)
+
+    def _iter_batches(self, patient_ids: Optional[Iterable[int]], batch_size: int):
+        """
+        Recorre los planes aprobados vigentes de pacientes activos por bloques ordenados por paciente.
+
+        Se omiten los planes que ya tienen un borrador regenerado (mismo rango
+        de fechas), así que volver a ejecutar una regeneración interrumpida
+        continúa donde se quedó.
+
+        Yields:
+            (planes del bloque, firma de restricciones por paciente)
+        """
+        selected = sorted(set(patient_ids)) if patient_ids is not None else None
+        draft = aliased(MealPlan)
+        cursor = 0
+        while True:
+            query = db.session.query(
+                MealPlan.id, MealPlan.patient_id, MealPlan.nutritionist_id, MealPlan.start_date,
+                MealPlan.end_date, MealPlan.generated_by_uid, Patient.gender, Patient.date_of_birth
+            ).join(Patient, Patient.id == MealPlan.patient_id).filter(
+                Patient.is_active == True,
+                MealPlan.is_latest == True,
+                MealPlan.status == 'approved',
+                MealPlan.patient_id > cursor,
+                # Sin borrador regenerado pendiente de revisión
+                ~exists().where(
+                    draft.parent_plan_id == MealPlan.id,
+                    draft.status == 'draft',
+                    draft.start_date == MealPlan.start_date
+                )
+            )
+            if selected is not None:
+                # Los pacientes elegidos sin plan que regenerar no acortan el recorrido:
+                # el cursor avanza por tramos de la lista, no por el último plan devuelto
+                id_slice = [patient_id for patient_id in selected if patient_id > cursor][:batch_size]
+                if not id_slice:
+                    return
+                query = query.filter(MealPlan.patient_id.in_(id_slice))
+            batch = query.order_by(MealPlan.patient_id).limit(batch_size).all()
+
+            if selected is not None:
+                cursor = id_slice[-1]
+                if batch:
+                    yield batch, self._restriction_signatures([plan.patient_id for plan in batch])
+                continue
+
+            if not batch:
+                return
+            yield batch, self._restriction_signatures([plan.patient_id for plan in batch])
+            cursor = batch[-1].patient_id
+            if len(batch) < batch_size:
+                return
+
+    def _restriction_signatures(self, patient_ids: List[int]) -> Dict[int, tuple]:
+        """Firma (intolerancias, condiciones, preferencias) de cada paciente en tres consultas."""
+        collected: Dict[int, Tuple[set, set, set]] = {}
+        for position, (model, column) in enumerate((
+            (PatientIntolerance, PatientIntolerance.intolerance_id),
+            (PatientMedicalCondition, PatientMedicalCondition.condition_id),
+            (PatientDietaryPreference, PatientDietaryPreference.preference_id)
+        )):
+            rows = db.session.query(model.patient_id, column).filter(model.patient_id.in_(patient_ids)).all()
+            for patient_id, value in rows:
+                collected.setdefault(patient_id, (set(), set(), set()))[position].add(value)
+
+        return {
+            patient_id: tuple(tuple(sorted(ids)) for ids in sets)
+            for patient_id, sets in collected.items()
+        }
+
+    def _candidate_rows(self, signature: tuple,
+                        tables: Dict[str, Tuple[np.ndarray, np.ndarray]]) -> Dict[str, np.ndarray]:
+        """Filas candidatas por tipo de comida de una firma de restricciones."""
+        intolerance_ids, condition_ids, preference_ids = signature
+        compatible = recipe_compatibility_index.compatible_recipe_ids(
+            restriction_resolver.for_intolerances(intolerance_ids), condition_ids, preference_ids
+        )
+
+        rows_by_type = {}
+        for meal_type in MEAL_TYPES:
+            recipe_ids = tables[meal_type][0] if meal_type in tables else np.empty(0, dtype=np.int64)
+            ids = compatible.get(meal_type, np.empty(0, dtype=np.int64))
+            rows = np.searchsorted(recipe_ids, ids)
+            # Recetas que entraron al catálogo después de leer las tablas se omiten
+            valid = rows < len(recipe_ids)
+            valid[valid] = recipe_ids[rows[valid]] == ids[valid]
+            rows_by_type[meal_type] = rows[valid].astype(np.int32)
+        return rows_by_type
+
+    def _make_shard(self, jobs: List[tuple], candidates: Dict[tuple, Dict[str, np.ndarray]],
+                    signature_ids: Dict[tuple, int]) -> tuple:
+        """Empaqueta un bloque con las candidatas de las firmas que usa."""
+        used = {job[1] for job in jobs}
+        shard_candidates = {
+            signature_ids[signature]: rows for signature, rows in candidates.items()
+            if signature_ids[signature] in used
+        }
+        return shard_candidates, jobs
+
+    def _run_shards(self, shards: List[tuple], tables: Dict[str, tuple], settings: Dict[str, Any],
+                    workers: int):
+        """Ejecuta los bloques en el pool (o en este proceso si hay un solo worker)."""
+        if workers == 1:
+            _init_worker(tables, settings)
+            for index, (shard_candidates, jobs) in enumerate(shards):
+                yield build_shard(index, shard_candidates, jobs)
+            return
+
+        # 'spawn': un proceso hijo de fork heredaría las conexiones a la base de datos
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(shards)),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(tables, settings)
+        ) as executor:
+            futures = [
+                executor.submit(build_shard, index, shard_candidates, jobs)
+                for index, (shard_candidates, jobs) in enumerate(shards)
+            ]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def _build_spec(self, plan, slots: np.ndarray) -> Dict[str, Any]:
+        """Convierte la asignación compacta de un plan en su especificación de inserción."""
+        days = slots.shape[1]
+        meals = []
+        for day_index in range(days):
+            meal_date = plan.start_date + timedelta(days=day_index)
+            day_name = meal_plan_generator.DAY_ORDER[meal_date.weekday()]
+            for position, meal_type in enumerate(MEAL_TYPES):
+                meals.append({
+                    'day_of_week': day_name,
+                    'meal_date': meal_date,
+                    'meal_type': meal_type,
+                    'recipe_id': int(slots[position, day_index]),
+                    'scheduled_time': meal_plan_generator.MEAL_TIMES[meal_type],
+                    'servings': 1.0
+                })
+
+        spec = meal_plan_generator.build_plan_spec(
+            patient_id=plan.patient_id,
+            start_date=plan.start_date,
+            end_date=plan.end_date,
+            generated_by_uid=plan.generated_by_uid,
+            meals=meals,
+            nutritionist_id=plan.nutritionist_id,
+            notes="Plan regenerado tras cambios en el catálogo",
+            draft=True
+        )
+        spec['parent_plan_id'] = plan.id
+        if days != 7:
+            spec['plan_name'] = (
+                f"Plan {plan.start_date.strftime('%d/%m/%Y')} - {plan.end_date.strftime('%d/%m/%Y')}"
+            )
+        return spec
+
+    def _persist(self, specs: List[Dict[str, Any]], summary: Dict[str, Any],
+                 progress: Optional[Callable[[Dict[str, Any]], None]]):
+        """Guarda un bloque de planes en una sola transacción."""
+        started = time.perf_counter()
+        try:
+            meal_plan_generator.bulk_persist_plans(specs, create_tokens=False)
+            db.session.commit()
+            summary['generated'] += len(specs)
+        except Exception as e:
+            db.session.rollback()
+            summary['errors'].update({spec['patient_id']: str(e) for spec in specs})
+            summary['failed'] += len(specs)
+        summary['persist_seconds'] += time.perf_counter() - started
+        if progress:
+            progress(summary)
+
+    def _finish(self, summary: Dict[str, Any], started: float) -> Dict[str, Any]:
+        summary['persist_seconds'] = round(summary['persist_seconds'], 2)
+        summary['elapsed_seconds'] = round(time.perf_counter() - started, 2)
+        summary['plans_per_second'] = (
+            round(summary['generated'] / summary['elapsed_seconds'], 1) if summary['elapsed_seconds'] else None
+        )
+        return summary
+
+
+# Instancia global
+plan_regeneration_service = PlanRegenerationService()
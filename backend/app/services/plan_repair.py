@@ -0,0 +1,349 @@
+"""
+Reparación incremental de planes ante cambios del catálogo.
+
+Cuando una receta se desactiva, gana un ingrediente o un ingrediente se
+asocia a una nueva intolerancia, los planes vigentes pueden quedar con
+comidas incompatibles. En lugar de regenerarlos, se recorre el índice
+inverso ingrediente → recetas → comidas de planes vigentes, se reemplazan
+solo los slots afectados por la alternativa compatible de macros más
+parecidas y el resultado se guarda como una nueva versión del plan.
+
+El trabajo ``repair_plans`` procesa los planes en bloques; cada bloque es una
+transacción corta que encola el siguiente, así una edición del catálogo que
+afecta a miles de planes no mantiene bloqueadas las tablas.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from flask import current_app, has_app_context
+from sqlalchemy import case, event, inspect, or_, select, update
+from sqlalchemy.orm import Session, selectinload
+
+from app.services.database_service import db
+from app.services.catalog_version import catalog_version
+from app.services.job_queue import job_queue
+from app.services.meal_plan_generator import meal_plan_generator
+from app.services.recipe_index import recipe_compatibility_index
+from app.services.recipe_catalog import recipe_catalog
+from app.services.plan_optimizer import MACRO_WEIGHTS
+from app.services.public_plan_cache import public_plan_cache
+from app.models.sql_models import (
+    BackgroundJob, IntoleranceIngredient, MealPlan, MealPlanMeal, MealPlanToken,
+    Recipe, RecipeIngredient
+)
+
+# Tipo de trabajo en segundo plano para reparar planes afectados
+REPAIR_PLANS_JOB = 'repair_plans'
+
+DEFAULT_CHUNK_SIZE = 200
+
+
+class PlanRepairService:
+    """Encuentra y repara slots incompatibles en los planes vigentes."""
+
+    def enqueue_repair(self, recipe_ids: Iterable[int] = (), ingredient_ids: Iterable[int] = (),
+                       after_plan_id: int = 0, chunk_size: Optional[int] = None) -> BackgroundJob:
+        """
+        Encola la reparación de los planes que usan ciertas recetas o ingredientes (sin commit).
+
+        Args:
+            recipe_ids: Recetas desactivadas o modificadas
+            ingredient_ids: Ingredientes asociados a nuevas intolerancias
+            after_plan_id: Cursor: solo planes con ID mayor
+            chunk_size: Planes por bloque
+
+        Returns:
+            Trabajo pendiente
+        """
+        return job_queue.enqueue(REPAIR_PLANS_JOB, {
+            'recipe_ids': sorted(set(recipe_ids)),
+            'ingredient_ids': sorted(set(ingredient_ids)),
+            'after_plan_id': after_plan_id,
+            'chunk_size': chunk_size or self._chunk_size()
+        })
+
+    def run_repair_job(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Handler del trabajo ``repair_plans``: repara un bloque y encola el siguiente."""
+        # El cambio puede venir de otro proceso hace menos de CATALOG_VERSION_TTL: sin
+        # releer la huella, los índices en caché aún darían la receta por compatible
+        catalog_version.refresh()
+        chunk_size = int(payload.get('chunk_size') or self._chunk_size())
+        recipe_ids = self.affected_recipe_ids(payload.get('recipe_ids', []), payload.get('ingredient_ids', []))
+        plan_ids = self.affected_plan_ids(recipe_ids, payload.get('after_plan_id', 0), chunk_size)
+
+        summary = self.repair_plans(plan_ids)
+
+        if len(plan_ids) == chunk_size:
+            next_job = self.enqueue_repair(recipe_ids=recipe_ids, after_plan_id=plan_ids[-1], chunk_size=chunk_size)
+            db.session.flush()
+            summary['next_job_id'] = next_job.id
+        return summary
+
+    def affected_recipe_ids(self, recipe_ids: Iterable[int], ingredient_ids: Iterable[int] = ()) -> List[int]:
+        """
+        Índice inverso ingrediente → recetas.
+
+        Returns:
+            IDs de recetas indicadas más las que contienen alguno de los ingredientes
+        """
+        affected = set(recipe_ids)
+        ingredient_ids = list(ingredient_ids)
+        if ingredient_ids:
+            rows = db.session.query(RecipeIngredient.recipe_id).filter(
+                RecipeIngredient.ingredient_id.in_(ingredient_ids)
+            ).distinct().all()
+            affected.update(row.recipe_id for row in rows)
+        return sorted(affected)
+
+    def has_affected_plans(self, recipe_ids: Iterable[int], ingredient_ids: Iterable[int] = ()) -> bool:
+        """Comprueba con una consulta indexada si algún plan vigente usa esas recetas o ingredientes."""
+        recipe_ids = list(recipe_ids)
+        ingredient_ids = list(ingredient_ids)
+        if not recipe_ids and not ingredient_ids:
+            return False
+
+        affected_recipes = []
+        if recipe_ids:
+            affected_recipes.append(MealPlanMeal.recipe_id.in_(recipe_ids))
+        if ingredient_ids:
+            affected_recipes.append(MealPlanMeal.recipe_id.in_(
+                select(RecipeIngredient.recipe_id).where(RecipeIngredient.ingredient_id.in_(ingredient_ids))
+            ))
+
+        return db.session.query(
+            db.session.query(MealPlanMeal.id).join(
+                MealPlan, MealPlan.id == MealPlanMeal.plan_id
+            ).filter(MealPlan.is_latest == True, or_(*affected_recipes)).exists()
+        ).scalar()
+
+    def affected_plan_ids(self, recipe_ids: List[int], after_plan_id: int = 0,
+                          limit: Optional[int] = None) -> List[int]:
+        """
+        Índice inverso receta → planes vigentes con alguna comida de esas recetas.
+
+        Args:
+            recipe_ids: Recetas afectadas
+            after_plan_id: Cursor: solo planes con ID mayor
+            limit: Máximo de planes
+
+        Returns:
+            IDs de planes ordenados
+        """
+        if not recipe_ids:
+            return []
+        query = db.session.query(MealPlanMeal.plan_id).join(
+            MealPlan, MealPlan.id == MealPlanMeal.plan_id
+        ).filter(
+            MealPlanMeal.recipe_id.in_(recipe_ids),
+            MealPlan.is_latest == True,
+            MealPlan.id > after_plan_id
+        ).distinct().order_by(MealPlanMeal.plan_id)
+        if limit:
+            query = query.limit(limit)
+        return [row.plan_id for row in query.all()]
+
+    def repair_plans(self, plan_ids: List[int]) -> Dict[str, Any]:
+        """
+        Reemplaza las comidas incompatibles de los planes y guarda nuevas versiones (sin commit).
+
+        Los tokens públicos del plan anterior pasan a la nueva versión para que
+        los enlaces del paciente sigan funcionando.
+
+        Returns:
+            Resumen con planes revisados y reparados y slots reemplazados o sin alternativa
+        """
+        summary = {
+            'plans_checked': len(plan_ids),
+            'plans_repaired': 0,
+            'slots_replaced': 0,
+            'slots_unrepairable': 0,
+            'repaired_plan_ids': []
+        }
+        if not plan_ids:
+            return summary
+
+        plans = db.session.query(MealPlan).options(
+            selectinload(MealPlan.meals)
+        ).filter(MealPlan.id.in_(plan_ids)).order_by(MealPlan.id).all()
+        patients = {
+            patient.id: patient
+            for patient in meal_plan_generator.get_patients_with_restrictions(
+                list({plan.patient_id for plan in plans})
+            )
+        }
+        macros = self._recipe_macros({meal.recipe_id for plan in plans for meal in plan.meals})
+
+        specs = []
+        base_plan_ids = []
+        for plan in plans:
+            compatible = meal_plan_generator.filter_compatible_recipes(patients[plan.patient_id])
+            meals, replaced, unrepairable = self._repair_meals(plan.meals, compatible, macros)
+            summary['slots_unrepairable'] += unrepairable
+            if not replaced:
+                continue
+
+            summary['slots_replaced'] += replaced
+            specs.append(self._build_repair_spec(plan, meals, replaced))
+            base_plan_ids.append(plan.id)
+
+        if not specs:
+            return summary
+
+        persisted = meal_plan_generator.bulk_persist_plans(specs, create_tokens=False)
+        new_plan_ids = {base_id: plan_id for base_id, (plan_id, _) in zip(base_plan_ids, persisted)}
+        db.session.execute(
+            update(MealPlanToken).where(
+                MealPlanToken.plan_id.in_(base_plan_ids)
+            ).values(plan_id=case(new_plan_ids, value=MealPlanToken.plan_id)),
+            execution_options={'synchronize_session': False}
+        )
+        # Los tokens movidos dejan de mostrar el plan anterior (la sentencia Core no pasa por el ORM)
+        public_plan_cache.invalidate_on_commit(db.session, plan_ids=base_plan_ids)
+
+        summary['plans_repaired'] = len(specs)
+        summary['repaired_plan_ids'] = [new_plan_ids[base_id] for base_id in base_plan_ids]
+        return summary
+
+    def _repair_meals(self, meals: List[MealPlanMeal], compatible: Dict[str, List[int]],
+                      macros: Dict[int, np.ndarray]) -> Tuple[List[Dict], int, int]:
+        """Copia las comidas del plan reemplazando las incompatibles."""
+        compatible_sets = {meal_type: set(recipe_ids) for meal_type, recipe_ids in compatible.items()}
+        used: Dict[str, set] = {}
+        for meal in meals:
+            used.setdefault(meal.meal_type, set()).add(meal.recipe_id)
+
+        repaired = []
+        replaced = 0
+        unrepairable = 0
+        for meal in meals:
+            recipe_id = meal.recipe_id
+            allowed = compatible_sets.get(meal.meal_type)
+            if allowed is not None and recipe_id not in allowed:
+                alternative = self._closest_alternative(
+                    meal.meal_type, recipe_id,
+                    [candidate for candidate in compatible[meal.meal_type] if candidate not in used[meal.meal_type]],
+                    macros
+                )
+                if alternative is None:
+                    unrepairable += 1
+                else:
+                    used[meal.meal_type].add(alternative)
+                    recipe_id = alternative
+                    replaced += 1
+
+            repaired.append({
+                'recipe_id': recipe_id,
+                'day_of_week': meal.day_of_week,
+                'meal_date': meal.meal_date,
+                'meal_type': meal.meal_type,
+                'scheduled_time': meal.scheduled_time,
+                'servings': meal.servings
+            })
+        return repaired, replaced, unrepairable
+
+    def _closest_alternative(self, meal_type: str, recipe_id: int, candidates: List[int],
+                             macros: Dict[int, np.ndarray]) -> Optional[int]:
+        """Elige la receta candidata con macros más parecidas a la reemplazada."""
+        if not candidates:
+            return None
+        original = macros.get(recipe_id)
+        if original is None:
+            return candidates[0]
+
+        candidate_macros = recipe_compatibility_index.recipe_macros(meal_type, candidates)
+        relative = (candidate_macros - original) / np.maximum(original, 1.0)
+        distances = (np.square(relative) * MACRO_WEIGHTS).sum(axis=1)
+        return candidates[int(np.argmin(distances))]
+
+    def _build_repair_spec(self, plan: MealPlan, meals: List[Dict], replaced: int) -> Dict[str, Any]:
+        """Describe la nueva versión de un plan reparado."""
+        note = f"Reparación automática: {replaced} comida(s) reemplazada(s) por cambios en el catálogo"
+        return {
+            'patient_id': plan.patient_id,
+            'nutritionist_id': plan.nutritionist_id,
+            'plan_name': plan.plan_name,
+            'start_date': plan.start_date,
+            'end_date': plan.end_date,
+            'status': plan.status,
+            'notes': f"{plan.notes}\n\n{note}" if plan.notes else note,
+            'generated_by_uid': plan.generated_by_uid,
+            'approved_by_uid': plan.approved_by_uid,
+            'approved_at': plan.approved_at,
+            'parent_plan_id': plan.id,
+            'meals': meals
+        }
+
+    def _recipe_macros(self, recipe_ids: Iterable[int]) -> Dict[int, np.ndarray]:
+        """Macros de recetas (incluidas las inactivas) desde la instantánea del catálogo."""
+        snapshot = recipe_catalog.snapshot()
+        recipe_ids = list(recipe_ids)
+        rows = snapshot.rows(recipe_ids)
+        return {
+            recipe_id: snapshot.macros[row, :4].astype(np.float64)
+            for recipe_id, row in zip(recipe_ids, rows.tolist())
+            if row >= 0
+        }
+
+    def _chunk_size(self) -> int:
+        if has_app_context():
+            return int(current_app.config.get('PLAN_REPAIR_CHUNK_SIZE', DEFAULT_CHUNK_SIZE))
+        return DEFAULT_CHUNK_SIZE
+
+
+def _repair_enabled(session) -> bool:
+    if not has_app_context() or not current_app.config.get('PLAN_REPAIR_ON_CATALOG_CHANGE', True):
+        return False
+    # Los trabajos se encolan en la sesión de la aplicación
+    return session is db.session()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_catalog_changes(session, flush_context):
+    """Recuerda recetas desactivadas o con ingredientes nuevos y nuevas asociaciones de intolerancias."""
+    if not _repair_enabled(session):
+        return
+
+    recipe_ids = set()
+    ingredient_ids = set()
+    for obj in session.dirty:
+        if isinstance(obj, Recipe) and session.is_modified(obj):
+            added = inspect(obj).attrs.is_active.history.added
+            if added and not added[0]:
+                recipe_ids.add(obj.id)
+    for obj in session.new:
+        if isinstance(obj, RecipeIngredient) and obj.recipe_id:
+            recipe_ids.add(obj.recipe_id)
+        elif isinstance(obj, IntoleranceIngredient):
+            ingredient_ids.add(obj.ingredient_id)
+
+    if recipe_ids or ingredient_ids:
+        pending = session.info.setdefault('plan_repair_pending', (set(), set()))
+        pending[0].update(recipe_ids)
+        pending[1].update(ingredient_ids)
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _enqueue_plan_repair(session, flush_context):
+    """Encola la reparación en la misma transacción que el cambio del catálogo."""
+    pending = session.info.pop('plan_repair_pending', None)
+    # Sin planes afectados (ej. al importar recetas nuevas) no hace falta encolar nada
+    if pending and plan_repair_service.has_affected_plans(*pending):
+        plan_repair_service.enqueue_repair(recipe_ids=pending[0], ingredient_ids=pending[1])
+        session.info['plan_repair_enqueued'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_plan_repair(session):
+    if session.info.pop('plan_repair_enqueued', False):
+        job_queue.dispatch(allow_inline=False)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_plan_repair(session):
+    session.info.pop('plan_repair_pending', None)
+    session.info.pop('plan_repair_enqueued', None)
+
+
+# Instancia global
+plan_repair_service = PlanRepairService()
+job_queue.register(REPAIR_PLANS_JOB, plan_repair_service.run_repair_job)
@@ -0,0 +1,188 @@
+"""
+Renovación periódica de planes: genera por adelantado el siguiente plan de
+los pacientes cuyo plan aprobado vigente está por terminar.
+
+Se ejecuta fuera de las peticiones (comando ``flask plans rollover``). Los
+pacientes se recorren por bloques ordenados por ID con una pausa entre
+bloques; cada bloque se confirma por separado. El sucesor es un borrador que
+no desplaza al plan aprobado vigente (el paciente lo sigue viendo hasta que
+el nutricionista aprueba el sucesor); los planes que ya tienen sucesor se
+omiten, así que volver a ejecutar el comando continúa donde se quedó.
+"""
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import exists
+from sqlalchemy.orm import aliased, load_only
+
+from app.services.database_service import db
+from app.services.meal_plan_generator import meal_plan_generator
+from app.services.plan_optimizer import daily_targets_for_patient
+from app.models.sql_models import MealPlan, Patient
+
+DEFAULT_WITHIN_DAYS = 3
+DEFAULT_CHUNK_SIZE = 100
+
+
+class PlanRolloverService:
+    """Genera borradores sucesores para los planes aprobados que están por terminar."""
+
+    def find_due_plans(self, within_days: int = DEFAULT_WITHIN_DAYS, today: Optional[date] = None,
+                       after_patient_id: int = 0, limit: Optional[int] = None) -> List[MealPlan]:
+        """
+        Obtiene los planes vigentes aprobados de pacientes activos que terminan pronto y aún no tienen sucesor.
+
+        Args:
+            within_days: Planes que terminan dentro de esta cantidad de días
+            today: Fecha de referencia (por defecto hoy)
+            after_patient_id: Cursor: solo pacientes con ID mayor
+            limit: Máximo de planes
+
+        Returns:
+            Planes ordenados por ID de paciente
+        """
+        today = today or date.today()
+        successor = aliased(MealPlan)
+        query = db.session.query(MealPlan).options(
+            load_only(
+                MealPlan.id, MealPlan.patient_id, MealPlan.nutritionist_id, MealPlan.start_date,
+                MealPlan.end_date, MealPlan.generated_by_uid
+            )
+        ).join(Patient, Patient.id == MealPlan.patient_id).filter(
+            Patient.is_active == True,
+            MealPlan.is_latest == True,
+            MealPlan.status == 'approved',
+            MealPlan.end_date <= today + timedelta(days=within_days),
+            MealPlan.patient_id > after_patient_id,
+            # Sin sucesor ya generado
+            ~exists().where(successor.parent_plan_id == MealPlan.id, successor.start_date > MealPlan.end_date)
+        ).order_by(MealPlan.patient_id)
+        if limit:
+            query = query.limit(limit)
+        return query.all()
+
+    def rollover(self, within_days: int = DEFAULT_WITHIN_DAYS, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 pause_seconds: float = 0.0, max_plans: Optional[int] = None,
+                 after_patient_id: int = 0, today: Optional[date] = None, dry_run: bool = False,
+                 progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Genera los borradores sucesores por bloques.
+
+        Args:
+            within_days: Renovar planes que terminan dentro de esta cantidad de días
+            chunk_size: Pacientes por bloque (una transacción por bloque)
+            pause_seconds: Pausa entre bloques para no saturar la base de datos
+            max_plans: Detenerse tras revisar esta cantidad de planes
+            after_patient_id: Reanudar después de este paciente
+            today: Fecha de referencia (por defecto hoy)
+            dry_run: Solo contar los planes pendientes
+            progress: Función llamada con el resumen parcial tras cada bloque
+
+        Returns:
+            Resumen con planes revisados, generados, fallidos y el último paciente procesado
+        """
+        started = time.perf_counter()
+        summary = {
+            'within_days': within_days,
+            'dry_run': dry_run,
+            'checked': 0,
+            'generated': 0,
+            'failed': 0,
+            'chunks': 0,
+            'errors': {},
+            'last_patient_id': after_patient_id
+        }
+
+        cursor = after_patient_id
+        while max_plans is None or summary['checked'] < max_plans:
+            limit = chunk_size if max_plans is None else min(chunk_size, max_plans - summary['checked'])
+            plans = self.find_due_plans(within_days, today, cursor, limit)
+            if not plans:
+                break
+
+            if dry_run:
+                generated, errors = 0, {}
+            else:
+                generated, errors = self._rollover_chunk(plans)
+
+            cursor = plans[-1].patient_id
+            summary['checked'] += len(plans)
+            summary['generated'] += generated
+            summary['failed'] += len(errors)
+            summary['errors'].update(errors)
+            summary['chunks'] += 1
+            summary['last_patient_id'] = cursor
+            if progress:
+                progress(summary)
+
+            if len(plans) < limit:
+                break
+            if pause_seconds:
+                time.sleep(pause_seconds)
+
+        summary['elapsed_seconds'] = round(time.perf_counter() - started, 2)
+        summary['plans_per_second'] = (
+            round(summary['generated'] / summary['elapsed_seconds'], 1) if summary['elapsed_seconds'] else None
+        )
+        return summary
+
+    def _rollover_chunk(self, plans: List[MealPlan]) -> tuple:
+        """Genera y guarda los sucesores de un bloque en una sola transacción."""
+        patients = {
+            patient.id: patient
+            for patient in meal_plan_generator.get_patients_with_restrictions([plan.patient_id for plan in plans])
+        }
+        no_repeat_days = int(meal_plan_generator.get_setting('MEAL_PLAN_NO_REPEAT_DAYS', 7))
+
+        specs = []
+        errors: Dict[int, str] = {}
+        for plan in plans:
+            patient = patients[plan.patient_id]
+            days = (plan.end_date - plan.start_date).days + 1
+            start_date = plan.end_date + timedelta(days=1)
+            end_date = start_date + timedelta(days=days - 1)
+            window = min(no_repeat_days, days) if days > 7 else days
+            try:
+                compatible_recipes = meal_plan_generator.filter_compatible_recipes(patient)
+                meal_plan_generator.validate_recipe_availability(compatible_recipes, required_per_type=window)
+                meals = meal_plan_generator.distribute_recipes_across_days(
+                    compatible_recipes,
+                    days=days,
+                    start_date=start_date,
+                    targets=daily_targets_for_patient(patient),
+                    no_repeat_days=window
+                )
+            except Exception as e:
+                errors[plan.patient_id] = str(e)
+                continue
+
+            spec = meal_plan_generator.build_plan_spec(
+                patient_id=plan.patient_id,
+                start_date=start_date,
+                end_date=end_date,
+                generated_by_uid=plan.generated_by_uid,
+                meals=meals,
+                nutritionist_id=plan.nutritionist_id,
+                notes="Plan generado automáticamente (renovación)",
+                draft=True
+            )
+            spec['parent_plan_id'] = plan.id
+            if days != 7:
+                spec['plan_name'] = f"Plan {start_date.strftime('%d/%m/%Y')} - {end_date.strftime('%d/%m/%Y')}"
+            specs.append(spec)
+
+        try:
+            if specs:
+                meal_plan_generator.bulk_persist_plans(specs, create_tokens=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            errors.update({spec['patient_id']: str(e) for spec in specs})
+            return 0, errors
+
+        return len(specs), errors
+
+
+# Instancia global
+plan_rollover_service = PlanRolloverService()
@@ -0,0 +1,184 @@
+"""
+Simulación de cambios de comidas sobre un plan ("qué pasaría si").
+
+Antes de crear una nueva versión, el nutricionista puede proponer cambios de
+receta y de porciones en varios slots y ver cómo cambian los nutrientes por
+día, por semana y en total. Todo se calcula en memoria con las macros de la
+instantánea columnar del catálogo: se leen las comidas del plan en una sola
+consulta de columnas y no se escribe nada en la base de datos.
+"""
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.services.database_service import db
+from app.services.meal_plan_generator import meal_plan_generator
+from app.services.plan_nutrition import plan_day_index
+from app.services.plan_optimizer import MACRO_FIELDS, daily_targets_for_patient
+from app.services.recipe_catalog import MEAL_TYPES, NUTRIENT_FIELDS, nutrient_dict, recipe_catalog
+from app.models.sql_models import MealPlan, MealPlanMeal
+
+MAX_SERVINGS = 10
+
+
+class PlanNutritionSimulator:
+    """Calcula las diferencias de nutrientes de cambios propuestos sobre un plan."""
+
+    def simulate(self, plan: MealPlan, changes: List[Dict[str, Any]], patient=None) -> Dict[str, Any]:
+        """
+        Simula cambios de receta y porciones sobre las comidas de un plan.
+
+        Args:
+            plan: Plan base (no se modifica)
+            changes: Lista de cambios; cada uno identifica el slot con ``meal_id``
+                (o ``meal_date``/``day_of_week`` y ``meal_type``) y trae
+                ``recipe_id`` y/o ``servings``. ``day_of_week`` solo sirve si
+                ese día aparece una vez en el plan
+            patient: Paciente con restricciones cargadas, para avisar de recetas
+                incompatibles y devolver los objetivos diarios (opcional)
+
+        Returns:
+            Nutrientes antes, después y diferencia por día, por semana, en total
+            y como promedio diario, más el detalle de los slots cambiados
+
+        Raises:
+            ValueError: Si un cambio no identifica un slot del plan (o lo hace
+                con un día de la semana repetido) o trae una
+                receta o porciones no válidas
+        """
+        meals = db.session.query(
+            MealPlanMeal.id, MealPlanMeal.recipe_id, MealPlanMeal.servings, MealPlanMeal.meal_date,
+            MealPlanMeal.day_of_week, MealPlanMeal.meal_type
+        ).filter(MealPlanMeal.plan_id == plan.id).order_by(MealPlanMeal.id).all()
+
+        snapshot = recipe_catalog.snapshot()
+        recipe_ids = np.array([meal.recipe_id for meal in meals], dtype=np.int64)
+        servings = np.array([float(meal.servings or 1) for meal in meals], dtype=np.float64)
+        new_recipe_ids = recipe_ids.copy()
+        new_servings = servings.copy()
+
+        # Índices de slots: por ID de comida y por (fecha o día de la semana, tipo de comida)
+        days = (plan.end_date - plan.start_date).days + 1
+        day_indexes = np.array([
+            plan_day_index(plan.start_date, days, meal.meal_date, meal.day_of_week) for meal in meals
+        ], dtype=np.int64)
+        positions = {meal.id: i for i, meal in enumerate(meals)}
+        slots = {}
+        for i, meal in enumerate(meals):
+            meal_date = plan.start_date + timedelta(days=int(day_indexes[i]))
+            slots.setdefault((meal_date.isoformat(), meal.meal_type), i)
+            slots.setdefault((meal.day_of_week, meal.meal_type), i)
+        # Días de la semana que aparecen más de una vez en el plan (no identifican un slot)
+        repeated_weekdays = {
+            meal_plan_generator.DAY_ORDER[(plan.start_date + timedelta(days=day)).weekday()]
+            for day in range(7, days)
+        }
+
+        compatible = meal_plan_generator.filter_compatible_recipes(patient) if patient is not None else None
+        changed: Dict[int, Dict[str, Any]] = {}
+        warnings = []
+        for number, change in enumerate(changes, start=1):
+            if change.get('meal_id') is None and not change.get('meal_date') \
+                    and change.get('day_of_week') in repeated_weekdays:
+                raise ValueError(
+                    f"Cambio {number}: el plan tiene más de un {change['day_of_week']}; "
+                    f"indique meal_date o meal_id"
+                )
+            position = self._find_slot(change, positions, slots)
+            if position is None:
+                raise ValueError(f"Cambio {number}: no corresponde a ninguna comida del plan")
+            meal = meals[position]
+
+            if change.get('recipe_id') is not None:
+                recipe_id = change['recipe_id']
+                row = snapshot.row(recipe_id) if isinstance(recipe_id, int) else None
+                if row is None:
+                    raise ValueError(f"Cambio {number}: receta {recipe_id} no encontrada")
+                if MEAL_TYPES[snapshot.meal_type_codes[row]] != meal.meal_type:
+                    raise ValueError(f"Cambio {number}: la receta {recipe_id} no es de tipo {meal.meal_type}")
+                if not snapshot.active[row]:
+                    warnings.append(f"La receta {recipe_id} está inactiva")
+                if compatible is not None and recipe_id not in compatible.get(meal.meal_type, ()):
+                    warnings.append(
+                        f"La receta {recipe_id} no es compatible con las restricciones del paciente"
+                    )
+                new_recipe_ids[position] = recipe_id
+
+            if change.get('servings') is not None:
+                value = change['servings']
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 < value <= MAX_SERVINGS:
+                    raise ValueError(f"Cambio {number}: las porciones deben ser mayores que 0 y como máximo {MAX_SERVINGS}")
+                new_servings[position] = float(value)
+            changed[position] = meal
+
+        before = snapshot.meal_macros(recipe_ids.tolist(), servings)
+        after = snapshot.meal_macros(new_recipe_ids.tolist(), new_servings)
+
+        day_before = np.zeros((days, len(NUTRIENT_FIELDS)))
+        day_after = np.zeros((days, len(NUTRIENT_FIELDS)))
+        np.add.at(day_before, day_indexes, before)
+        np.add.at(day_after, day_indexes, after)
+
+        result = {
+            'plan_id': plan.id,
+            'changes_applied': len(changed),
+            'days': [
+                {
+                    'date': (plan.start_date + timedelta(days=day)).isoformat(),
+                    'day_of_week': meal_plan_generator.DAY_ORDER[(plan.start_date + timedelta(days=day)).weekday()],
+                    **self._compare(day_before[day], day_after[day])
+                }
+                for day in range(days)
+            ],
+            'weeks': [
+                {
+                    'week': week + 1,
+                    'start_date': (plan.start_date + timedelta(days=week * 7)).isoformat(),
+                    'end_date': (plan.start_date + timedelta(days=min(week * 7 + 6, days - 1))).isoformat(),
+                    **self._compare(day_before[week * 7:week * 7 + 7].sum(axis=0),
+                                    day_after[week * 7:week * 7 + 7].sum(axis=0))
+                }
+                for week in range(-(-days // 7))
+            ],
+            'totals': self._compare(day_before.sum(axis=0), day_after.sum(axis=0)),
+            'daily_averages': self._compare(day_before.mean(axis=0), day_after.mean(axis=0)),
+            'changed_meals': [
+                {
+                    'meal_id': meal.id,
+                    'meal_date': meal.meal_date.isoformat() if meal.meal_date else None,
+                    'day_of_week': meal.day_of_week,
+                    'meal_type': meal.meal_type,
+                    'recipe_id': int(recipe_ids[position]),
+                    'new_recipe_id': int(new_recipe_ids[position]),
+                    'new_recipe_name': snapshot.name(int(new_recipe_ids[position])),
+                    'servings': float(servings[position]),
+                    'new_servings': float(new_servings[position]),
+                    **self._compare(before[position], after[position])
+                }
+                for position, meal in sorted(changed.items())
+            ],
+            'warnings': list(dict.fromkeys(warnings))
+        }
+        if patient is not None:
+            result['daily_targets'] = dict(zip(MACRO_FIELDS, (round(float(value), 1)
+                                                               for value in daily_targets_for_patient(patient))))
+        return result
+
+    def _find_slot(self, change: Dict[str, Any], positions: Dict[int, int],
+                   slots: Dict[tuple, int]) -> Optional[int]:
+        if change.get('meal_id') is not None:
+            return positions.get(change['meal_id'])
+        day = change.get('meal_date') or change.get('day_of_week')
+        return slots.get((day, change.get('meal_type')))
+
+    def _compare(self, before: np.ndarray, after: np.ndarray) -> Dict[str, Dict[str, float]]:
+        return {
+            'before': nutrient_dict(before),
+            'after': nutrient_dict(after),
+            'delta': nutrient_dict(after - before)
+        }
+
+
+# Instancia global
+plan_nutrition_simulator = PlanNutritionSimulator()
@@ -0,0 +1,89 @@
+"""
+Preferencias dietéticas expresadas como etiquetas de recetas.
+
+Cada ``DietaryPreference`` se asocia a etiquetas (``dietary_preference_tags``)
+que las recetas deben tener (``require``) o no pueden tener (``forbid``). Las
+reglas de un conjunto de preferencias se combinan en un par de conjuntos de
+etiquetas que el índice de recetas aplica como intersecciones de bitsets.
+Las reglas se cargan una vez por versión del catálogo.
+"""
+import threading
+from typing import Dict, FrozenSet, Iterable, NamedTuple, Optional, Set
+
+from app.services.database_service import db
+from app.services.catalog_version import catalog_version
+from app.models.sql_models import DietaryPreferenceTag, RecipeTag
+
+
+class PreferenceTags(NamedTuple):
+    """Etiquetas exigidas y prohibidas por una o más preferencias."""
+    required: FrozenSet[int]
+    forbidden: FrozenSet[int]
+
+
+class PreferenceTagRules:
+    """Obtiene las etiquetas exigidas y prohibidas por las preferencias de un paciente."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._rules: Dict[int, PreferenceTags] = {}
+
+    def tags_for(self, preference_ids: Iterable[int]) -> Optional[PreferenceTags]:
+        """
+        Combina las etiquetas de un conjunto de preferencias dietéticas.
+
+        Args:
+            preference_ids: IDs de ``DietaryPreference``
+
+        Returns:
+            Etiquetas combinadas, o None si ninguna preferencia tiene reglas
+        """
+        rules = self._get_rules()
+        selected = [rules[preference_id] for preference_id in set(preference_ids) if preference_id in rules]
+        if not selected:
+            return None
+
+        return PreferenceTags(
+            required=frozenset().union(*(rule.required for rule in selected)),
+            forbidden=frozenset().union(*(rule.forbidden for rule in selected))
+        )
+
+    def _get_rules(self) -> Dict[int, PreferenceTags]:
+        version = catalog_version.current()
+        with self._lock:
+            if self._version == version:
+                return self._rules
+
+        rules = self._load()
+        with self._lock:
+            self._rules = rules
+            self._version = version
+        return rules
+
+    def _load(self) -> Dict[int, PreferenceTags]:
+        """Carga todas las reglas de etiquetas activas en una sola consulta."""
+        rows = db.session.query(
+            DietaryPreferenceTag.preference_id, DietaryPreferenceTag.tag_id, DietaryPreferenceTag.mode
+        ).join(
+            RecipeTag, RecipeTag.id == DietaryPreferenceTag.tag_id
+        ).filter(RecipeTag.is_active == True).all()
+
+        required: Dict[int, Set[int]] = {}
+        forbidden: Dict[int, Set[int]] = {}
+        for preference_id, tag_id, mode in rows:
+            required.setdefault(preference_id, set())
+            forbidden.setdefault(preference_id, set())
+            (required if mode == 'require' else forbidden)[preference_id].add(tag_id)
+
+        return {
+            preference_id: PreferenceTags(
+                required=frozenset(required[preference_id]),
+                forbidden=frozenset(forbidden[preference_id])
+            )
+            for preference_id in required
+        }
+
+
+# Instancia global
+preference_tag_rules = PreferenceTagRules()
@@ -0,0 +1,330 @@
+"""
+Caché de la vista pública de planes ya renderizada (bytes JSON por token).
+
+La vista pública de un plan (``GET /api/public/meal-plans/<token>``) carga el
+plan con todas sus relaciones y lo formatea en Python, pero un plan aprobado
+casi nunca cambia. Aquí se guarda la respuesta JSON final por token, así que
+una vista repetida cuesta una sola búsqueda en la caché.
+
+La clave incluye la huella del catálogo (``catalog_version.fingerprint_key``)
+y la versión del plan que lee la ruta para su ETag (``plan_etags``: plan al
+que apunta el token, ``version`` y ``updated_at`` del plan y del paciente),
+que coinciden entre procesos: si otro worker edita una receta, aprueba el
+plan o mueve el token a otro plan, la clave cambia y las entradas anteriores
+dejan de usarse aunque este proceso no se haya enterado.
+
+Además cada entrada se etiqueta con su plan y su paciente y, al confirmar
+cambios en un plan (aprobación, comidas, nueva versión con
+``parent_plan_id``) o en los datos del paciente que muestra la vista, se
+borran las entradas con esas etiquetas. Los cambios hechos con objetos del ORM
+se detectan solos; las escrituras con sentencias Core (inserciones masivas de
+planes, movimiento de tokens al reparar) los registran con
+``invalidate_on_commit``.
+
+Hay dos backends: ``memory`` (LRU por proceso, por defecto) y ``redis``
+(compartido entre workers; requiere el paquete ``redis``). La invalidación
+por etiquetas solo llega a la caché en memoria del proceso que confirma, así
+que con varios workers conviene ``redis``. ``none`` desactiva la caché.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, NamedTuple, Optional, Set
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.services.catalog_version import catalog_version
+from app.models.sql_models import (
+    MealPlan, MealPlanMeal, MealPlanToken, Patient, PatientIntolerance, PatientMedicalCondition
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 24 * 3600
+KEY_PREFIX = 'public-plan'
+
+
+class RenderedPlan(NamedTuple):
+    """Vista pública renderizada de un plan y los datos para invalidarla."""
+    body: bytes
+    plan_id: int
+    patient_id: int
+    expires_at: Optional[float] = None  # Expiración del token (epoch), None si no expira
+
+
+class MemoryRenderCacheBackend:
+    """LRU en memoria con índice de etiquetas (plan, paciente) → claves."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            body, expires_at, _ = entry
+            if time.time() >= expires_at:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return body
+
+    def set(self, key: str, body: bytes, ttl: float, tags: Iterable[str]):
+        tags = tuple(tags)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (body, time.time() + ttl, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self._max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        removed = 0
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    removed += self._remove(key)
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str) -> int:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return 0
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+        return 1
+
+
+class RedisRenderCacheBackend:
+    """Backend compartido en Redis: un valor por clave y un conjunto por etiqueta."""
+
+    def __init__(self, url: str):
+        import redis  # Dependencia opcional, solo para este backend
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(f'{KEY_PREFIX}:{key}')
+
+    def set(self, key: str, body: bytes, ttl: float, tags: Iterable[str]):
+        pipeline = self._client.pipeline()
+        pipeline.set(f'{KEY_PREFIX}:{key}', body, ex=max(1, int(ttl)))
+        for tag in tags:
+            pipeline.sadd(f'{KEY_PREFIX}:tag:{tag}', key)
+            pipeline.expire(f'{KEY_PREFIX}:tag:{tag}', max(1, int(ttl)))
+        pipeline.execute()
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        tag_keys = [f'{KEY_PREFIX}:tag:{tag}' for tag in tags]
+        if not tag_keys:
+            return 0
+        keys = set().union(*(self._client.smembers(tag_key) for tag_key in tag_keys))
+        pipeline = self._client.pipeline()
+        for key in keys:
+            pipeline.delete(f'{KEY_PREFIX}:{key.decode() if isinstance(key, bytes) else key}')
+        pipeline.delete(*tag_keys)
+        pipeline.execute()
+        return len(keys)
+
+    def clear(self):
+        keys = list(self._client.scan_iter(f'{KEY_PREFIX}:*'))
+        if keys:
+            self._client.delete(*keys)
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class PublicPlanCache:
+    """Caché de vistas públicas renderizadas, con backend configurable."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._backend = None
+        self._backend_name = None
+        self._hits = 0
+        self._misses = 0
+
+    def get_or_render(self, token: str, render: Callable[[], Optional[RenderedPlan]],
+                      version: Optional[str] = None) -> Optional[bytes]:
+        """
+        Obtiene la vista pública de un token, renderizándola si no está en caché.
+
+        Args:
+            token: Token público del plan
+            render: Función que carga y renderiza el plan (None si el token no es válido)
+            version: Versión actual del plan en la base de datos (p. ej. su ETag),
+                para no servir una vista que otro proceso dejó obsoleta
+
+        Returns:
+            Bytes JSON de la vista, o None si el token no es válido
+        """
+        backend = self._get_backend()
+        if backend is None:
+            rendered = render()
+            return rendered.body if rendered is not None else None
+
+        key = f'{token}:{catalog_version.fingerprint_key()}'
+        if version:
+            key = f'{key}:{version}'
+        body = backend.get(key)
+        if body is not None:
+            self._hits += 1
+            return body
+
+        self._misses += 1
+        rendered = render()
+        if rendered is None:
+            return None
+
+        ttl = float(self._setting('PUBLIC_PLAN_CACHE_TTL', DEFAULT_TTL_SECONDS))
+        if rendered.expires_at is not None:
+            ttl = min(ttl, rendered.expires_at - time.time())
+        if ttl > 0:
+            backend.set(key, rendered.body, ttl, (f'plan:{rendered.plan_id}', f'patient:{rendered.patient_id}'))
+        return rendered.body
+
+    def invalidate(self, plan_ids: Iterable[int] = (), patient_ids: Iterable[int] = ()) -> int:
+        """
+        Borra las vistas de unos planes y de todos los planes de unos pacientes.
+
+        Returns:
+            Número de entradas borradas (si el backend lo sabe)
+        """
+        backend = self._get_backend()
+        tags = [f'plan:{plan_id}' for plan_id in plan_ids] + [f'patient:{patient_id}' for patient_id in patient_ids]
+        if backend is None or not tags:
+            return 0
+        try:
+            return backend.invalidate_tags(tags)
+        except Exception as e:
+            logger.warning("No se pudo invalidar la caché de planes públicos: %s", e)
+            return 0
+
+    def invalidate_on_commit(self, session: Session, plan_ids: Iterable[int] = (),
+                             patient_ids: Iterable[int] = ()):
+        """
+        Invalida las vistas de unos planes y pacientes cuando la sesión confirme.
+
+        Para escrituras con sentencias Core, que no pasan por la detección de
+        objetos del ORM. Si la transacción se revierte no se invalida nada.
+        """
+        pending = session.info.setdefault('public_plan_changes', (set(), set()))
+        pending[0].update(plan_id for plan_id in plan_ids if plan_id is not None)
+        pending[1].update(patient_id for patient_id in patient_ids if patient_id is not None)
+
+    def clear(self):
+        """Vacía la caché."""
+        backend = self._get_backend()
+        if backend is not None:
+            backend.clear()
+
+    def configure(self, backend):
+        """Reemplaza el backend (None desactiva la caché hasta la próxima configuración)."""
+        with self._lock:
+            self._backend = backend
+            self._backend_name = type(backend).__name__ if backend is not None else 'none'
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """Estadísticas de uso de la caché en este proceso."""
+        backend = self._get_backend()
+        lookups = self._hits + self._misses
+        return {
+            'backend': self._backend_name,
+            'entries': backend.size() if backend is not None else 0,
+            'hits': self._hits,
+            'misses': self._misses,
+            'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0
+        }
+
+    def _get_backend(self):
+        if self._backend_name is not None:
+            return self._backend
+
+        with self._lock:
+            if self._backend_name is None:
+                name = str(self._setting('PUBLIC_PLAN_CACHE_BACKEND', 'memory')).lower()
+                backend = None
+                if name == 'redis':
+                    try:
+                        backend = RedisRenderCacheBackend(self._setting('PUBLIC_PLAN_CACHE_URL', None))
+                    except Exception as e:
+                        logger.warning("Caché Redis no disponible (%s); se usa la caché en memoria", e)
+                        name = 'memory'
+                if name == 'memory':
+                    backend = MemoryRenderCacheBackend(
+                        int(self._setting('PUBLIC_PLAN_CACHE_SIZE', DEFAULT_MAX_ENTRIES))
+                    )
+                self._backend = backend
+                self._backend_name = name if backend is not None else 'none'
+            return self._backend
+
+    def _setting(self, name: str, default):
+        if has_app_context():
+            return current_app.config.get(name, default)
+        return default
+
+
+def _collect_plan_changes(session: Session) -> tuple:
+    """Planes y pacientes cuya vista pública cambia con los objetos pendientes de la sesión."""
+    plan_ids, patient_ids = set(), set()
+    for obj in session.new | session.dirty | session.deleted:
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        if isinstance(obj, MealPlan):
+            plan_ids.add(obj.id)
+            # Una nueva versión reemplaza la vista de la versión de la que parte
+            if obj.parent_plan_id:
+                plan_ids.add(obj.parent_plan_id)
+        elif isinstance(obj, (MealPlanMeal, MealPlanToken)):
+            plan_ids.add(obj.plan_id)
+        elif isinstance(obj, Patient):
+            patient_ids.add(obj.id)
+        elif isinstance(obj, (PatientMedicalCondition, PatientIntolerance)):
+            patient_ids.add(obj.patient_id)
+    plan_ids.discard(None)
+    patient_ids.discard(None)
+    return plan_ids, patient_ids
+
+
+@event.listens_for(Session, 'after_flush')
+def _remember_plan_changes(session, flush_context):
+    plan_ids, patient_ids = _collect_plan_changes(session)
+    if plan_ids or patient_ids:
+        public_plan_cache.invalidate_on_commit(session, plan_ids, patient_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_plans(session):
+    pending = session.info.pop('public_plan_changes', None)
+    if pending:
+        public_plan_cache.invalidate(plan_ids=pending[0], patient_ids=pending[1])
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_plan_changes(session):
+    session.info.pop('public_plan_changes', None)
+
+
+# Instancia global
+public_plan_cache = PublicPlanCache()
@@ -0,0 +1,312 @@
+"""
+Instantánea columnar del catálogo de recetas.
+
+Arreglos NumPy paralelos (IDs, código de tipo de comida, macros en float32,
+activa) más un índice ID → fila, para sumar la nutrición de un plan con
+indexado vectorizado en lugar de hidratar objetos ``Recipe`` y convertir
+``Decimal`` comida por comida. Incluye las recetas inactivas porque los planes
+existentes pueden seguir apuntando a ellas. Los ingredientes (con su
+categoría) y las etiquetas de cada receta se guardan en formato CSR
+(desplazamientos por receta + arreglo plano). Se reconstruye cuando cambia la
+versión del catálogo.
+
+Con ``RECIPE_SNAPSHOT_DIR`` configurado, la instantánea se publica como un
+conjunto de archivos ``.npy`` en un directorio por versión (clave de la huella
+del catálogo) y cada worker los abre con ``mmap`` de solo lectura: las páginas
+se comparten entre procesos y la memoria por worker no crece con el catálogo.
+El primer worker que ve una versión nueva la escribe en un directorio temporal
+y lo renombra (operación atómica); los demás simplemente lo abren.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from typing import Dict, Iterable, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from flask import current_app, has_app_context
+
+from app.services.database_service import db
+from app.services.catalog_version import catalog_version
+from app.services.condition_rules import normalize_category
+from app.models.sql_models import Recipe, RecipeIngredient, Ingredient, RecipeTagAssignment
+
+logger = logging.getLogger(__name__)
+
+# Códigos de tipo de comida (posición en la tupla)
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner', 'snack')
+MEAL_TYPE_CODES = {meal_type: code for code, meal_type in enumerate(MEAL_TYPES)}
+
+# Orden de las columnas de macros; las cuatro primeras coinciden con plan_optimizer.MACRO_FIELDS
+NUTRIENT_FIELDS = ('calories', 'protein', 'carbs', 'fat', 'fiber')
+
+# Arreglos que forman la instantánea (un archivo .npy cada uno)
+ARRAY_FIELDS = (
+    'recipe_ids', 'meal_type_codes', 'macros', 'active', 'name_offsets', 'name_bytes',
+    'ingredient_offsets', 'ingredient_ids', 'ingredient_category_codes', 'tag_offsets', 'tag_ids'
+)
+SNAPSHOT_FORMAT = 1
+DEFAULT_KEEP_VERSIONS = 3
+
+
+class RecipeCatalogSnapshot(NamedTuple):
+    """Recetas del catálogo en columnas, ordenadas por ID."""
+    version: int
+    recipe_ids: np.ndarray                 # (n,) int64, ordenado (índice ID → fila por búsqueda binaria)
+    meal_type_codes: np.ndarray            # (n,) int8, índice en MEAL_TYPES
+    macros: np.ndarray                     # (n, 5) float32, columnas NUTRIENT_FIELDS
+    active: np.ndarray                     # (n,) bool
+    name_offsets: np.ndarray               # (n + 1,) int64 sobre name_bytes
+    name_bytes: np.ndarray                 # (total,) uint8, nombres en UTF-8
+    ingredient_offsets: np.ndarray         # (n + 1,) int64 sobre ingredient_ids
+    ingredient_ids: np.ndarray             # (links,) int64
+    ingredient_category_codes: np.ndarray  # (links,) int16, índice en categories o -1
+    tag_offsets: np.ndarray                # (n + 1,) int64 sobre tag_ids
+    tag_ids: np.ndarray                    # (tags,) int64
+    categories: Tuple[str, ...]            # Categorías normalizadas
+    shared: bool = False                   # Arreglos abiertos con mmap
+
+    def rows(self, recipe_ids: Iterable[int]) -> np.ndarray:
+        """
+        Filas de un conjunto de recetas.
+
+        Returns:
+            Arreglo de filas; -1 para las recetas que no están en la instantánea
+        """
+        ids = np.fromiter(recipe_ids, dtype=np.int64)
+        if not len(self.recipe_ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.recipe_ids, ids), len(self.recipe_ids) - 1)
+        return np.where(self.recipe_ids[rows] == ids, rows, -1)
+
+    def row(self, recipe_id: int) -> Optional[int]:
+        """Fila de una receta, o None si no está en la instantánea."""
+        row = int(self.rows((recipe_id,))[0])
+        return row if row >= 0 else None
+
+    def meal_macros(self, recipe_ids: Iterable[int],
+                    servings: Optional[Sequence[float]] = None) -> np.ndarray:
+        """
+        Macros por comida (opcionalmente multiplicadas por las porciones).
+
+        Returns:
+            Arreglo (n, 5) float64; ceros para recetas desconocidas
+        """
+        rows = self.rows(recipe_ids)
+        macros = np.zeros((len(rows), len(NUTRIENT_FIELDS)), dtype=np.float64)
+        known = rows >= 0
+        macros[known] = self.macros[rows[known]]
+        if servings is not None:
+            macros *= np.asarray(servings, dtype=np.float64)[:, None]
+        return macros
+
+    def totals(self, recipe_ids: Iterable[int],
+               servings: Optional[Sequence[float]] = None) -> Dict[str, float]:
+        """Totales de nutrientes de un conjunto de comidas."""
+        return nutrient_dict(self.meal_macros(recipe_ids, servings).sum(axis=0))
+
+    def name_at(self, row: int) -> str:
+        """Nombre de la receta de una fila."""
+        start, end = int(self.name_offsets[row]), int(self.name_offsets[row + 1])
+        return self.name_bytes[start:end].tobytes().decode('utf-8')
+
+    def name(self, recipe_id: int) -> Optional[str]:
+        row = self.row(recipe_id)
+        return self.name_at(row) if row is not None else None
+
+
+def nutrient_dict(values: np.ndarray, digits: int = 1) -> Dict[str, float]:
+    """Convierte un vector de nutrientes en dict redondeado."""
+    return {field: round(float(value), digits) for field, value in zip(NUTRIENT_FIELDS, values)}
+
+
+class RecipeCatalog:
+    """Mantiene la instantánea columnar del catálogo sincronizada con su versión."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot: Optional[RecipeCatalogSnapshot] = None
+
+    def snapshot(self) -> RecipeCatalogSnapshot:
+        """
+        Obtiene la instantánea vigente, reconstruyéndola si el catálogo cambió.
+
+        Returns:
+            Instantánea de solo lectura
+        """
+        version = catalog_version.current()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != version:
+                snapshot = self._refresh(version)
+                self._snapshot = snapshot
+            return snapshot
+
+    def invalidate(self):
+        """Descarta la instantánea actual; se reconstruirá en el próximo uso."""
+        with self._lock:
+            self._snapshot = None
+
+    def _refresh(self, version: int) -> RecipeCatalogSnapshot:
+        snapshot_dir = self._snapshot_dir()
+        if not snapshot_dir:
+            arrays, categories = self._read_catalog()
+            return self._make_snapshot(version, arrays, categories)
+
+        try:
+            return self._load_shared(snapshot_dir, version)
+        except OSError as e:
+            # Un directorio no escribible no debe impedir generar planes
+            logger.warning("No se pudo usar la instantánea compartida en %s: %s", snapshot_dir, e)
+            arrays, categories = self._read_catalog()
+            return self._make_snapshot(version, arrays, categories)
+
+    def _load_shared(self, snapshot_dir: str, version: int) -> RecipeCatalogSnapshot:
+        """Abre (publicando si hace falta) la instantánea de la versión actual con mmap."""
+        path = os.path.join(snapshot_dir, f'v-{catalog_version.fingerprint_key()}')
+        if not os.path.exists(os.path.join(path, 'manifest.json')):
+            self._publish(snapshot_dir, path)
+
+        with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+        arrays = {
+            field: np.load(os.path.join(path, f'{field}.npy'), mmap_mode='r', allow_pickle=False)
+            for field in ARRAY_FIELDS
+        }
+        return self._make_snapshot(version, arrays, tuple(manifest['categories']), shared=True)
+
+    def _publish(self, snapshot_dir: str, path: str):
+        """Escribe la instantánea en un directorio temporal y lo renombra a su versión."""
+        os.makedirs(snapshot_dir, exist_ok=True)
+        arrays, categories = self._read_catalog()
+
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=snapshot_dir)
+        try:
+            for field in ARRAY_FIELDS:
+                np.save(os.path.join(staging, f'{field}.npy'), arrays[field], allow_pickle=False)
+            # El manifiesto se escribe al final: su presencia marca la versión como completa
+            with open(os.path.join(staging, 'manifest.json'), 'w', encoding='utf-8') as manifest_file:
+                json.dump({
+                    'format': SNAPSHOT_FORMAT,
+                    'recipes': int(len(arrays['recipe_ids'])),
+                    'categories': list(categories)
+                }, manifest_file)
+            os.chmod(staging, 0o755)
+            os.rename(staging, path)
+        except OSError:
+            # Otro worker publicó la misma versión primero
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.exists(os.path.join(path, 'manifest.json')):
+                raise
+        else:
+            self._prune(snapshot_dir, keep=path)
+
+    def _prune(self, snapshot_dir: str, keep: str):
+        """Elimina las versiones antiguas (los workers que aún las usan conservan su mmap)."""
+        versions = sorted(
+            (entry.path for entry in os.scandir(snapshot_dir) if entry.is_dir() and entry.name.startswith('v-')),
+            key=os.path.getmtime,
+            reverse=True
+        )
+        for path in versions[self._keep_versions():]:
+            if path != keep:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _make_snapshot(self, version: int, arrays: Dict[str, np.ndarray],
+                       categories: Tuple[str, ...], shared: bool = False) -> RecipeCatalogSnapshot:
+        for array in arrays.values():
+            if array.flags.writeable:
+                array.flags.writeable = False
+        return RecipeCatalogSnapshot(version=version, categories=categories, shared=shared, **arrays)
+
+    def _read_catalog(self) -> Tuple[Dict[str, np.ndarray], Tuple[str, ...]]:
+        """Lee recetas, ingredientes y etiquetas del catálogo en tres consultas."""
+        rows = db.session.query(
+            Recipe.id, Recipe.meal_type, Recipe.is_active, Recipe.recipe_name,
+            Recipe.total_calories, Recipe.total_protein, Recipe.total_carbs, Recipe.total_fat,
+            Recipe.total_fiber
+        ).order_by(Recipe.id).all()
+
+        count = len(rows)
+        recipe_ids = np.empty(count, dtype=np.int64)
+        meal_type_codes = np.empty(count, dtype=np.int8)
+        active = np.empty(count, dtype=bool)
+        macros = np.empty((count, len(NUTRIENT_FIELDS)), dtype=np.float32)
+        names = []
+        for row, (recipe_id, meal_type, is_active, name, *values) in enumerate(rows):
+            recipe_ids[row] = recipe_id
+            meal_type_codes[row] = MEAL_TYPE_CODES[meal_type]
+            active[row] = bool(is_active)
+            macros[row] = [float(value or 0) for value in values]
+            names.append((name or '').encode('utf-8'))
+
+        name_offsets = np.zeros(count + 1, dtype=np.int64)
+        name_offsets[1:] = np.cumsum([len(name) for name in names])
+
+        links = db.session.query(
+            RecipeIngredient.recipe_id, RecipeIngredient.ingredient_id, Ingredient.category
+        ).join(
+            Ingredient, Ingredient.id == RecipeIngredient.ingredient_id
+        ).order_by(RecipeIngredient.recipe_id).all()
+        categories = tuple(sorted({normalize_category(category) for _, _, category in links} - {''}))
+        category_codes = {category: code for code, category in enumerate(categories)}
+
+        tag_links = db.session.query(RecipeTagAssignment.recipe_id, RecipeTagAssignment.tag_id).order_by(
+            RecipeTagAssignment.recipe_id
+        ).all()
+
+        ingredient_offsets, link_rows = _csr_offsets(recipe_ids, [link[0] for link in links])
+        tag_offsets, tag_rows = _csr_offsets(recipe_ids, [link[0] for link in tag_links])
+
+        arrays = {
+            'recipe_ids': recipe_ids,
+            'meal_type_codes': meal_type_codes,
+            'macros': macros,
+            'active': active,
+            'name_offsets': name_offsets,
+            'name_bytes': np.frombuffer(b''.join(names), dtype=np.uint8).copy(),
+            'ingredient_offsets': ingredient_offsets,
+            'ingredient_ids': np.asarray([links[i][1] for i in link_rows], dtype=np.int64),
+            'ingredient_category_codes': np.asarray(
+                [category_codes.get(normalize_category(links[i][2]), -1) for i in link_rows], dtype=np.int16
+            ),
+            'tag_offsets': tag_offsets,
+            'tag_ids': np.asarray([tag_links[i][1] for i in tag_rows], dtype=np.int64)
+        }
+        return arrays, categories
+
+    def _snapshot_dir(self) -> Optional[str]:
+        if has_app_context():
+            return current_app.config.get('RECIPE_SNAPSHOT_DIR')
+        return None
+
+    def _keep_versions(self) -> int:
+        if has_app_context():
+            return int(current_app.config.get('RECIPE_SNAPSHOT_KEEP', DEFAULT_KEEP_VERSIONS))
+        return DEFAULT_KEEP_VERSIONS
+
+
+def _csr_offsets(recipe_ids: np.ndarray, link_recipe_ids: list) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Desplazamientos CSR por receta para enlaces ordenados por receta.
+
+    Returns:
+        (desplazamientos (n + 1,), índices de los enlaces que pertenecen a recetas conocidas)
+    """
+    link_recipe_ids = np.asarray(link_recipe_ids, dtype=np.int64)
+    # Enlaces de recetas creadas después de leer las recetas se descartan
+    known = np.isin(link_recipe_ids, recipe_ids)
+    link_rows = np.flatnonzero(known)
+    offsets = np.searchsorted(link_recipe_ids[link_rows], recipe_ids, side='left')
+    offsets = np.append(offsets, len(link_rows)).astype(np.int64)
+    return offsets, link_rows
+
+
+# Instancia global
+recipe_catalog = RecipeCatalog()
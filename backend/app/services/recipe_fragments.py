@@ -0,0 +1,217 @@
+"""
+Fragmentos de presentación de las recetas, calculados al escribir.
+
+La vista pública de un plan muestra, por cada comida, las etiquetas de la
+receta, sus ingredientes como texto ("{cantidad} {unidad} de {nombre}") y las
+instrucciones en pasos numerados. Calcularlos en cada vista obliga a cargar
+``RecipeIngredient`` e ``Ingredient`` de todas las comidas y a volver a partir
+las instrucciones. Aquí se calculan una sola vez y se guardan en la columna
+JSON ``Recipe.view_fragments``.
+
+Un listener ``after_flush`` recalcula los fragmentos de las recetas afectadas
+por cada flush (cambios en la receta, en sus ingredientes o en el nombre de un
+ingrediente) con una sentencia UPDATE por lotes en la misma transacción. Las
+recetas insertadas sin ORM se completan con
+``scripts/add_recipe_view_fragments_column.py``.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import bindparam, event, inspect, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.models.sql_models import Ingredient, Recipe, RecipeIngredient
+
+# Columnas de la receta de las que dependen los fragmentos
+FRAGMENT_COLUMNS = ('meal_type', 'total_calories', 'total_protein', 'total_fiber', 'instructions')
+
+# Recetas por sentencia al recalcular
+BATCH_SIZE = 1000
+
+
+def build_view_fragments(meal_type: str, calories, protein, fiber, instructions: Optional[str],
+                         ingredients: Iterable[Tuple[Any, str, str]]) -> Dict[str, List[str]]:
+    """
+    Calcula las etiquetas, ingredientes e instrucciones de una receta para la vista pública.
+
+    Args:
+        meal_type: Tipo de comida de la receta
+        calories: Calorías totales (None se trata como 0)
+        protein: Proteína total
+        fiber: Fibra total
+        instructions: Texto de las instrucciones
+        ingredients: (cantidad, unidad, nombre del ingrediente) en orden
+
+    Returns:
+        Dict con 'tags', 'ingredients' e 'instructions'
+    """
+    calories, protein, fiber = (float(value or 0) for value in (calories, protein, fiber))
+
+    # Tags nutricionales básicos
+    tags = []
+    if calories and calories < 300:
+        tags.append("Bajo en Calorías")
+    if protein > 15:
+        tags.append("Alto en Proteína")
+    if fiber > 5:
+        tags.append("Rico en Fibra")
+
+    # Tags por defecto según tipo de comida
+    if meal_type == 'breakfast':
+        tags.append("Energético")
+    elif meal_type == 'lunch':
+        tags.append("Nutritivo")
+    elif meal_type == 'dinner':
+        tags.append("Ligero")
+
+    lines = []
+    for quantity, unit, name in ingredients:
+        quantity_str = f"{quantity:.1f}".rstrip('0').rstrip('.')
+        lines.append(f"{quantity_str} {unit} de {name}")
+
+    # Instrucciones en pasos (dividir por saltos de línea si ya están numeradas)
+    steps = []
+    if instructions:
+        if any(line.strip().startswith(('1.', '2.', '3.')) for line in instructions.split('\n')):
+            steps = [line.strip() for line in instructions.split('\n') if line.strip()]
+        else:
+            # Si no, crear pasos numerados básicos
+            instruction_text = instructions.strip()
+            if len(instruction_text) > 100:
+                # Dividir en pasos lógicos por puntos
+                sentences = instruction_text.split('. ')
+                steps = [f"{i+1}. {sentence.strip()}{'.' if not sentence.endswith('.') else ''}"
+                         for i, sentence in enumerate(sentences) if sentence.strip()]
+            else:
+                steps = [f"1. {instruction_text}"]
+
+    return {'tags': tags, 'ingredients': lines, 'instructions': steps}
+
+
+class RecipeFragmentService:
+    """Mantiene ``Recipe.view_fragments`` al día."""
+
+    def for_recipe(self, recipe: Recipe) -> Dict[str, List[str]]:
+        """
+        Fragmentos de una receta: los guardados o, si aún no existen, calculados de sus relaciones.
+
+        Args:
+            recipe: Receta (sus ingredientes solo se cargan si faltan los fragmentos)
+
+        Returns:
+            Dict con 'tags', 'ingredients' e 'instructions'
+        """
+        if recipe.view_fragments is not None:
+            return recipe.view_fragments
+        return build_view_fragments(
+            recipe.meal_type, recipe.total_calories, recipe.total_protein, recipe.total_fiber,
+            recipe.instructions,
+            [(ri.quantity, ri.unit, ri.ingredient.ingredient_name) for ri in recipe.ingredients if ri.ingredient]
+        )
+
+    def refresh(self, session: Session, recipe_ids: Iterable[int]) -> int:
+        """
+        Recalcula y guarda los fragmentos de unas recetas (sin commit).
+
+        Args:
+            session: Sesión cuya transacción se usa
+            recipe_ids: IDs de las recetas
+
+        Returns:
+            Número de recetas actualizadas
+        """
+        recipe_ids = sorted(set(recipe_ids))
+        updated = 0
+        for start in range(0, len(recipe_ids), BATCH_SIZE):
+            updated += self._refresh_batch(session, recipe_ids[start:start + BATCH_SIZE])
+        return updated
+
+    def _refresh_batch(self, session: Session, recipe_ids: Sequence[int]) -> int:
+        recipes = session.execute(
+            select(Recipe.id, Recipe.meal_type, Recipe.total_calories, Recipe.total_protein,
+                   Recipe.total_fiber, Recipe.instructions).where(Recipe.id.in_(recipe_ids))
+        ).all()
+        if not recipes:
+            return 0
+
+        lines: Dict[int, list] = {}
+        rows = session.execute(
+            select(RecipeIngredient.recipe_id, RecipeIngredient.quantity, RecipeIngredient.unit,
+                   Ingredient.ingredient_name).join(
+                Ingredient, Ingredient.id == RecipeIngredient.ingredient_id
+            ).where(
+                RecipeIngredient.recipe_id.in_(recipe_ids)
+            ).order_by(RecipeIngredient.recipe_id, RecipeIngredient.id)
+        )
+        for recipe_id, quantity, unit, name in rows:
+            lines.setdefault(recipe_id, []).append((quantity, unit, name))
+
+        params = [
+            {
+                'recipe_id': recipe.id,
+                'fragments': build_view_fragments(recipe.meal_type, recipe.total_calories, recipe.total_protein,
+                                                  recipe.total_fiber, recipe.instructions, lines.get(recipe.id, ()))
+            }
+            for recipe in recipes
+        ]
+        table = Recipe.__table__
+        # Datos derivados: no cuentan como edición de la receta (updated_at se mantiene)
+        session.execute(
+            update(table).where(table.c.id == bindparam('recipe_id')).values(
+                view_fragments=bindparam('fragments'), updated_at=table.c.updated_at
+            ),
+            params
+        )
+
+        # Las recetas ya cargadas en la sesión ven el valor nuevo sin volver a consultarlo
+        for param in params:
+            recipe = session.identity_map.get(Session.identity_key(Recipe, param['recipe_id']))
+            if recipe is not None:
+                set_committed_value(recipe, 'view_fragments', param['fragments'])
+        return len(params)
+
+
+def _changed(obj, columns: Sequence[str]) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[column].history.has_changes() for column in columns)
+
+
+def _collect_changed_recipes(session: Session) -> Set[int]:
+    """Recetas cuyos fragmentos cambian con los objetos del flush."""
+    recipe_ids, ingredient_ids = set(), set()
+    for obj in session.new:
+        if isinstance(obj, Recipe):
+            recipe_ids.add(obj.id)
+        elif isinstance(obj, RecipeIngredient):
+            recipe_ids.add(obj.recipe_id)
+    for obj in session.dirty:
+        if isinstance(obj, Recipe) and _changed(obj, FRAGMENT_COLUMNS):
+            recipe_ids.add(obj.id)
+        elif isinstance(obj, RecipeIngredient) and _changed(obj, ('recipe_id', 'ingredient_id', 'quantity', 'unit')):
+            # Un ingrediente movido de receta cambia la receta anterior y la nueva
+            history = inspect(obj).attrs.recipe_id.history
+            recipe_ids.update(history.deleted or ())
+            recipe_ids.add(obj.recipe_id)
+        elif isinstance(obj, Ingredient) and _changed(obj, ('ingredient_name',)):
+            ingredient_ids.add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, RecipeIngredient):
+            recipe_ids.add(obj.recipe_id)
+
+    if ingredient_ids:
+        recipe_ids.update(session.execute(
+            select(RecipeIngredient.recipe_id).where(RecipeIngredient.ingredient_id.in_(ingredient_ids))
+        ).scalars())
+    recipe_ids.discard(None)
+    return recipe_ids
+
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_changed_recipes(session, flush_context):
+    recipe_ids = _collect_changed_recipes(session)
+    if recipe_ids:
+        recipe_fragments.refresh(session, recipe_ids)
+
+
+# Instancia global
+recipe_fragments = RecipeFragmentService()
@@ -0,0 +1,334 @@
+"""
+Índice en memoria de compatibilidad de recetas.
+
+Cada receta activa se representa como un bitset empaquetado (``uint64``) de
+sus ingredientes, agrupado por tipo de comida. Comprobar la compatibilidad con
+un conjunto de ingredientes restringidos se reduce a un AND vectorizado sobre
+la matriz de bits, sin consultar ``recipe_ingredients`` en cada generación.
+
+Las reglas de condiciones médicas se compilan a una máscara booleana por tipo
+de comida (comparando las columnas de macros y un bitset de categorías de
+ingredientes) la primera vez que se usa cada combinación de condiciones, y se
+guardan junto al índice hasta que cambia la versión del catálogo.
+
+Cada etiqueta de receta se precalcula como un bitset de recetas por tipo de
+comida; las preferencias dietéticas se aplican como intersecciones de esos
+bitsets (etiquetas exigidas) y de sus complementos (etiquetas prohibidas).
+"""
+import threading
+from typing import Dict, FrozenSet, Iterable, NamedTuple, Optional
+
+import numpy as np
+
+from app.services.catalog_version import catalog_version
+from app.services.condition_rules import ConditionConstraints, condition_rule_set
+from app.services.preference_tags import PreferenceTags, preference_tag_rules
+from app.services.recipe_catalog import MEAL_TYPES, recipe_catalog
+
+WORD_BITS = 64
+
+
+class MealTypeGroup(NamedTuple):
+    """Recetas de un tipo de comida, sus bitsets de ingredientes y macros."""
+    recipe_ids: np.ndarray       # (n,) int64, ordenado
+    ingredient_bits: np.ndarray  # (n, words) uint64
+    macros: np.ndarray           # (n, 4) float64: calorías, proteína, carbohidratos, grasa (de la instantánea)
+    category_bits: np.ndarray    # (n, category_words) uint64
+    tag_sets: Dict[int, np.ndarray]  # tag_id -> bitset de recetas, (ceil(n / 8),) uint8
+
+
+class IndexState(NamedTuple):
+    version: int
+    ingredient_positions: Dict[int, int]
+    words: int
+    category_positions: Dict[str, int]
+    category_words: int
+    groups: Dict[str, MealTypeGroup]
+    # Máscaras compiladas por combinación de condiciones (None: sin reglas)
+    condition_masks: Dict[FrozenSet[int], Optional[Dict[str, np.ndarray]]]
+    # Máscaras por combinación de preferencias (None: sin reglas)
+    preference_masks: Dict[FrozenSet[int], Optional[Dict[str, np.ndarray]]]
+
+
+class RecipeCompatibilityIndex:
+    """Índice de recetas por tipo de comida con bitsets de ingredientes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state: Optional[IndexState] = None
+
+    def compatible_recipe_ids(self, restricted_ingredient_ids: Iterable[int],
+                              condition_ids: Iterable[int] = (),
+                              preference_ids: Iterable[int] = ()) -> Dict[str, np.ndarray]:
+        """
+        Obtiene las recetas activas que no contienen ingredientes restringidos
+        y que cumplen las reglas de las condiciones médicas y las preferencias.
+
+        Args:
+            restricted_ingredient_ids: IDs de ingredientes que el paciente no puede consumir
+            condition_ids: IDs de condiciones médicas del paciente
+            preference_ids: IDs de preferencias dietéticas del paciente
+
+        Returns:
+            Dict con los IDs de recetas compatibles por tipo de comida
+        """
+        state = self._get_state()
+        mask = self._build_mask(state, restricted_ingredient_ids)
+        allowed = [
+            masks for masks in (
+                self._condition_masks(state, condition_ids),
+                self._preference_masks(state, preference_ids)
+            ) if masks is not None
+        ]
+
+        if not mask.any() and not allowed:
+            return {meal_type: group.recipe_ids for meal_type, group in state.groups.items()}
+
+        compatible = {}
+        for meal_type, group in state.groups.items():
+            keep = ~(group.ingredient_bits & mask).any(axis=1)
+            for masks in allowed:
+                keep &= masks[meal_type]
+            compatible[meal_type] = group.recipe_ids[keep]
+        return compatible
+
+    def recipe_macros(self, meal_type: str, recipe_ids) -> np.ndarray:
+        """
+        Obtiene las macros de recetas de un tipo de comida.
+
+        Args:
+            meal_type: Tipo de comida
+            recipe_ids: IDs de recetas activas de ese tipo
+
+        Returns:
+            Arreglo (n, 4) con calorías, proteína, carbohidratos y grasa
+        """
+        group = self._get_state().groups[meal_type]
+        rows = np.searchsorted(group.recipe_ids, np.asarray(recipe_ids, dtype=np.int64))
+        return group.macros[rows]
+
+    def macro_tables(self) -> Dict[str, tuple]:
+        """
+        Obtiene los IDs y macros de las recetas activas por tipo de comida.
+
+        Returns:
+            Dict tipo de comida -> (IDs ordenados (n,), macros (n, 4))
+        """
+        return {meal_type: (group.recipe_ids, group.macros) for meal_type, group in self._get_state().groups.items()}
+
+    def excluded_recipe_bits(self, restrictions) -> Dict[str, tuple]:
+        """
+        Calcula, por restricción, el bitset de recetas activas que excluye.
+
+        Las reglas de intolerancias, condiciones y preferencias se combinan de
+        forma conjuntiva, así que las recetas compatibles con un conjunto de
+        restricciones son el complemento del OR de sus bitsets.
+
+        Args:
+            restrictions: Secuencia de tuplas (ingredientes restringidos,
+                condiciones, preferencias), una por restricción
+
+        Returns:
+            Dict tipo de comida -> (recetas activas del tipo, bitsets (m, ceil(n / 8)) uint8)
+        """
+        state = self._get_state()
+        restrictions = list(restrictions)
+        excluded = {}
+        for meal_type, group in state.groups.items():
+            count = len(group.recipe_ids)
+            bits = np.zeros((len(restrictions), -(-count // 8)), dtype=np.uint8)
+            for i, (ingredient_ids, condition_ids, preference_ids) in enumerate(restrictions):
+                rows = (group.ingredient_bits & self._build_mask(state, ingredient_ids)).any(axis=1)
+                for masks in (self._condition_masks(state, condition_ids),
+                              self._preference_masks(state, preference_ids)):
+                    if masks is not None:
+                        rows |= ~masks[meal_type]
+                bits[i] = np.packbits(rows)
+            excluded[meal_type] = (count, bits)
+        return excluded
+
+    def invalidate(self):
+        """Descarta el índice actual; se reconstruirá en el próximo uso."""
+        with self._lock:
+            self._state = None
+
+    def _get_state(self) -> IndexState:
+        version = catalog_version.current()
+        state = self._state
+        if state is not None and state.version == version:
+            return state
+
+        with self._lock:
+            state = self._state
+            if state is None or state.version != version:
+                state = self._build(version)
+                self._state = state
+            return state
+
+    def _condition_masks(self, state: IndexState,
+                         condition_ids: Iterable[int]) -> Optional[Dict[str, np.ndarray]]:
+        """Obtiene (compilando si hace falta) las máscaras de una combinación de condiciones."""
+        key = frozenset(condition_ids)
+        if not key:
+            return None
+        if key in state.condition_masks:
+            return state.condition_masks[key]
+
+        constraints = condition_rule_set.constraints_for(key)
+        masks = self._compile_constraints(state, constraints) if constraints is not None else None
+        state.condition_masks[key] = masks
+        return masks
+
+    def _compile_constraints(self, state: IndexState,
+                             constraints: ConditionConstraints) -> Dict[str, np.ndarray]:
+        """Compila una restricción a una máscara booleana por tipo de comida."""
+        category_mask = np.zeros(state.category_words, dtype=np.uint64)
+        for category in constraints.excluded_categories:
+            position = state.category_positions.get(category)
+            if position is not None:
+                category_mask[position // WORD_BITS] |= np.uint64(1) << np.uint64(position % WORD_BITS)
+
+        masks = {}
+        for meal_type, group in state.groups.items():
+            allowed = (group.macros <= constraints.max_macros).all(axis=1)
+            allowed &= (group.macros >= constraints.min_macros).all(axis=1)
+            if category_mask.any():
+                allowed &= ~(group.category_bits & category_mask).any(axis=1)
+            masks[meal_type] = allowed
+        return masks
+
+    def _preference_masks(self, state: IndexState,
+                          preference_ids: Iterable[int]) -> Optional[Dict[str, np.ndarray]]:
+        """Obtiene (calculando si hace falta) las máscaras de una combinación de preferencias."""
+        key = frozenset(preference_ids)
+        if not key:
+            return None
+        if key in state.preference_masks:
+            return state.preference_masks[key]
+
+        tags = preference_tag_rules.tags_for(key)
+        masks = self._intersect_tags(state, tags) if tags is not None else None
+        state.preference_masks[key] = masks
+        return masks
+
+    def _intersect_tags(self, state: IndexState, tags: PreferenceTags) -> Dict[str, np.ndarray]:
+        """Intersecta los bitsets de etiquetas exigidas y los complementos de las prohibidas."""
+        masks = {}
+        for meal_type, group in state.groups.items():
+            count = len(group.recipe_ids)
+            bits = np.packbits(np.ones(count, dtype=bool))
+            for tag_id in tags.required:
+                tag_set = group.tag_sets.get(tag_id)
+                if tag_set is None:
+                    bits = np.zeros_like(bits)
+                    break
+                bits &= tag_set
+            for tag_id in tags.forbidden:
+                tag_set = group.tag_sets.get(tag_id)
+                if tag_set is not None:
+                    bits &= ~tag_set
+            masks[meal_type] = np.unpackbits(bits, count=count).astype(bool)
+        return masks
+
+    def _build_mask(self, state: IndexState, ingredient_ids: Iterable[int]) -> np.ndarray:
+        mask = np.zeros(state.words, dtype=np.uint64)
+        for ingredient_id in ingredient_ids:
+            position = state.ingredient_positions.get(ingredient_id)
+            # Ingredientes que no aparecen en ninguna receta activa no afectan al filtro
+            if position is not None:
+                mask[position // WORD_BITS] |= np.uint64(1) << np.uint64(position % WORD_BITS)
+        return mask
+
+    def _build(self, version: int) -> IndexState:
+        """Construye el índice a partir de las recetas activas de la instantánea del catálogo."""
+        snapshot = recipe_catalog.snapshot()
+
+        # Filas de la instantánea por tipo de comida
+        group_rows: Dict[str, np.ndarray] = {}
+        for code, meal_type in enumerate(MEAL_TYPES):
+            rows = np.flatnonzero(snapshot.active & (snapshot.meal_type_codes == code))
+            if len(rows):
+                group_rows[meal_type] = rows
+
+        active_rows = np.flatnonzero(snapshot.active)
+        _, active_links = _link_rows(snapshot.ingredient_offsets, active_rows)
+        ingredient_ids = np.unique(snapshot.ingredient_ids[active_links])
+        ingredient_positions = {ingredient_id: i for i, ingredient_id in enumerate(ingredient_ids.tolist())}
+        words = max(1, -(-len(ingredient_ids) // WORD_BITS))
+
+        # Los códigos de categoría de la instantánea son directamente las posiciones del bitset
+        category_positions = {category: i for i, category in enumerate(snapshot.categories)}
+        category_words = max(1, -(-len(snapshot.categories) // WORD_BITS))
+
+        groups = {}
+        for meal_type, rows in group_rows.items():
+            count = len(rows)
+            positions, links = _link_rows(snapshot.ingredient_offsets, rows)
+            slots = np.searchsorted(ingredient_ids, snapshot.ingredient_ids[links])
+            category_codes = snapshot.ingredient_category_codes[links]
+            categorized = category_codes >= 0
+
+            tag_positions, tag_links = _link_rows(snapshot.tag_offsets, rows)
+            tag_ids = snapshot.tag_ids[tag_links]
+
+            groups[meal_type] = MealTypeGroup(
+                recipe_ids=snapshot.recipe_ids[rows],
+                ingredient_bits=_pack_bits(count, words, positions, slots),
+                macros=snapshot.macros[rows, :4].astype(np.float64),
+                category_bits=_pack_bits(
+                    count, category_words, positions[categorized], category_codes[categorized]
+                ),
+                tag_sets={
+                    int(tag_id): _pack_rows(count, tag_positions[tag_ids == tag_id])
+                    for tag_id in np.unique(tag_ids)
+                }
+            )
+
+        return IndexState(
+            version=version,
+            ingredient_positions=ingredient_positions,
+            words=words,
+            category_positions=category_positions,
+            category_words=category_words,
+            groups=groups,
+            condition_masks={},
+            preference_masks={}
+        )
+
+
+def _link_rows(offsets: np.ndarray, rows: np.ndarray):
+    """
+    Expande los rangos CSR de un conjunto de filas de la instantánea.
+
+    Returns:
+        (posición de la fila dentro de ``rows`` por enlace, índices de los enlaces)
+    """
+    starts = offsets[rows]
+    counts = offsets[rows + 1] - starts
+    positions = np.repeat(np.arange(len(rows), dtype=np.int64), counts)
+    # Índice de cada enlace = inicio de su fila + desplazamiento dentro de la fila
+    first = np.cumsum(counts) - counts
+    links = np.repeat(starts, counts) + np.arange(int(counts.sum()), dtype=np.int64) - np.repeat(first, counts)
+    return positions, links
+
+
+def _pack_bits(count: int, words: int, rows, positions) -> np.ndarray:
+    """Arma una matriz (count, words) de bitsets a partir de pares (fila, posición)."""
+    bits = np.zeros((count, words), dtype=np.uint64)
+    if len(rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        positions = np.asarray(positions, dtype=np.int64)
+        values = np.left_shift(np.uint64(1), (positions % WORD_BITS).astype(np.uint64))
+        np.bitwise_or.at(bits, (rows, positions // WORD_BITS), values)
+    return bits
+
+
+def _pack_rows(count: int, rows) -> np.ndarray:
+    """Arma el bitset empaquetado (uint8) de un conjunto de filas de un grupo."""
+    members = np.zeros(count, dtype=bool)
+    members[rows] = True
+    return np.packbits(members)
+
+
+# Instancia global del índice
+recipe_compatibility_index = RecipeCompatibilityIndex()
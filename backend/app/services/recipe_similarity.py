@@ -0,0 +1,324 @@
+"""
+Índice de similitud de recetas para sugerir sustitutos de una comida.
+
+Cada receta se describe con su conjunto de ingredientes (vector disperso) y
+sus macros. La similitud con una receta de referencia combina el índice de
+Jaccard de los ingredientes y la cercanía relativa de las macros, y solo se
+compara con recetas activas del mismo tipo de comida.
+
+Por tipo de comida se guardan listas invertidas ingrediente → filas, así que
+puntuar una receta contra todo el grupo es un ``bincount`` sobre unas pocas
+listas más operaciones vectorizadas sobre las macros. Los vecinos más
+cercanos de cada receta consultada se guardan; cuando cambia la versión del
+catálogo solo se descartan las listas afectadas por recetas nuevas,
+modificadas o eliminadas (reconstrucción incremental).
+"""
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app.services.catalog_version import catalog_version
+from app.services.recipe_catalog import MEAL_TYPES, RecipeCatalogSnapshot, nutrient_dict, recipe_catalog
+from app.services.meal_plan_generator import meal_plan_generator
+from app.services.plan_optimizer import MACRO_WEIGHTS
+
+# Peso de los ingredientes y de las macros en la similitud final
+INGREDIENT_WEIGHT = 0.6
+MACRO_SIMILARITY_WEIGHT = 0.4
+
+# Vecinos guardados por receta consultada
+NEIGHBOR_COUNT = 32
+
+# Si cambia más de esta fracción del catálogo se descartan todos los vecinos guardados
+FULL_RESET_FRACTION = 0.1
+
+
+class MealTypeFeatures(NamedTuple):
+    """Rasgos de las recetas activas de un tipo de comida."""
+    recipe_ids: np.ndarray              # (n,) int64, ordenado
+    ingredient_counts: np.ndarray       # (n,) int64
+    postings: Dict[int, np.ndarray]     # ingredient_id -> filas que lo contienen
+    macros: np.ndarray                  # (n, 4) float64
+
+
+class Neighbors(NamedTuple):
+    """Vecinos más cercanos de una receta, ordenados por similitud descendente."""
+    recipe_ids: np.ndarray
+    scores: np.ndarray
+    ingredient_scores: np.ndarray
+    macro_scores: np.ndarray
+
+
+class SimilarityState(NamedTuple):
+    version: int
+    snapshot: RecipeCatalogSnapshot
+    features: Dict[str, MealTypeFeatures]
+    signatures: Dict[int, tuple]
+    # Vecinos por receta consultada; se conservan entre versiones si no les afecta ningún cambio
+    neighbors: Dict[int, Neighbors]
+
+
+class RecipeSimilarityIndex:
+    """Busca las recetas más parecidas a una dada dentro de su tipo de comida."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state: Optional[SimilarityState] = None
+
+    def similar_recipes(self, recipe_id: int, limit: int = 10,
+                        allowed_ids: Optional[Iterable[int]] = None,
+                        exclude_ids: Iterable[int] = ()) -> List[Dict]:
+        """
+        Obtiene las recetas más parecidas a una receta.
+
+        Args:
+            recipe_id: Receta de referencia (puede estar inactiva)
+            limit: Máximo de recetas a devolver
+            allowed_ids: Solo estas recetas (p. ej. las compatibles con el paciente)
+            exclude_ids: Recetas a descartar (p. ej. las que ya están en el plan)
+
+        Returns:
+            Lista de dicts con recipe_id, similarity, ingredient_similarity y
+            macro_similarity, de mayor a menor similitud
+        """
+        state = self._get_state()
+        neighbors = self._neighbors(state, recipe_id)
+        if neighbors is None:
+            return []
+
+        keep = self._candidate_mask(neighbors.recipe_ids, recipe_id, allowed_ids, exclude_ids)
+        if keep.sum() < limit and len(neighbors.recipe_ids) == NEIGHBOR_COUNT:
+            # Los vecinos guardados no alcanzan tras filtrar: puntuar todo el grupo
+            neighbors = self._score(state, recipe_id, count=None)
+            keep = self._candidate_mask(neighbors.recipe_ids, recipe_id, allowed_ids, exclude_ids)
+
+        rows = np.flatnonzero(keep)[:limit]
+        return [
+            {
+                'recipe_id': int(neighbors.recipe_ids[row]),
+                'similarity': round(float(neighbors.scores[row]), 4),
+                'ingredient_similarity': round(float(neighbors.ingredient_scores[row]), 4),
+                'macro_similarity': round(float(neighbors.macro_scores[row]), 4)
+            }
+            for row in rows
+        ]
+
+    def substitutes_for_meal(self, meal, plan_meals, patient, limit: int = 10) -> List[Dict]:
+        """
+        Sugiere recetas para reemplazar una comida de un plan.
+
+        Solo se proponen recetas compatibles con las restricciones del paciente
+        que no estén ya en el plan para el mismo tipo de comida.
+
+        Args:
+            meal: ``MealPlanMeal`` a reemplazar
+            plan_meals: Comidas del plan
+            patient: Paciente con restricciones cargadas
+            limit: Máximo de sustitutos
+
+        Returns:
+            Sustitutos con nombre, macros y similitud, de mayor a menor similitud
+        """
+        compatible = meal_plan_generator.filter_compatible_recipes(patient).get(meal.meal_type, [])
+        used = {other.recipe_id for other in plan_meals if other.meal_type == meal.meal_type}
+        substitutes = self.similar_recipes(meal.recipe_id, limit, allowed_ids=compatible, exclude_ids=used)
+
+        snapshot = self._get_state().snapshot
+        macros = snapshot.meal_macros([substitute['recipe_id'] for substitute in substitutes])
+        for substitute, values in zip(substitutes, macros):
+            substitute['recipe_name'] = snapshot.name(substitute['recipe_id'])
+            substitute.update(nutrient_dict(values[:4]))
+        return substitutes
+
+    def invalidate(self):
+        """Descarta el índice actual; se reconstruirá en el próximo uso."""
+        with self._lock:
+            self._state = None
+
+    def _candidate_mask(self, candidate_ids: np.ndarray, recipe_id: int,
+                        allowed_ids: Optional[Iterable[int]], exclude_ids: Iterable[int]) -> np.ndarray:
+        keep = candidate_ids != recipe_id
+        if allowed_ids is not None:
+            keep &= np.isin(candidate_ids, np.fromiter(allowed_ids, dtype=np.int64))
+        exclude = np.fromiter(exclude_ids, dtype=np.int64)
+        if len(exclude):
+            keep &= ~np.isin(candidate_ids, exclude)
+        return keep
+
+    def _neighbors(self, state: SimilarityState, recipe_id: int) -> Optional[Neighbors]:
+        neighbors = state.neighbors.get(recipe_id)
+        if neighbors is None:
+            neighbors = self._score(state, recipe_id, count=NEIGHBOR_COUNT)
+            if neighbors is not None:
+                state.neighbors[recipe_id] = neighbors
+        return neighbors
+
+    def _score(self, state: SimilarityState, recipe_id: int, count: Optional[int]) -> Optional[Neighbors]:
+        """Puntúa una receta contra su grupo y devuelve los ``count`` mejores (todos si es None)."""
+        query = self._query(state.snapshot, recipe_id)
+        if query is None:
+            return None
+        meal_type, ingredient_ids, macros = query
+        features = state.features.get(meal_type)
+        if features is None:
+            return None
+
+        ingredient_scores = _jaccard(features, ingredient_ids)
+        macro_scores = _macro_similarity(features.macros, macros)
+        scores = INGREDIENT_WEIGHT * ingredient_scores + MACRO_SIMILARITY_WEIGHT * macro_scores
+        # La propia receta no es su sustituta
+        scores[features.recipe_ids == recipe_id] = -np.inf
+
+        if count is not None and count < len(scores):
+            rows = np.argpartition(-scores, count)[:count]
+        else:
+            rows = np.arange(len(scores))
+        rows = rows[np.argsort(-scores[rows], kind='stable')]
+        rows = rows[np.isfinite(scores[rows])]
+        return Neighbors(
+            recipe_ids=features.recipe_ids[rows],
+            scores=scores[rows],
+            ingredient_scores=ingredient_scores[rows],
+            macro_scores=macro_scores[rows]
+        )
+
+    def _query(self, snapshot: RecipeCatalogSnapshot, recipe_id: int) -> Optional[Tuple[str, np.ndarray, np.ndarray]]:
+        """Tipo de comida, ingredientes y macros de una receta de la instantánea."""
+        row = snapshot.row(recipe_id)
+        if row is None:
+            return None
+        ingredient_ids = np.unique(
+            snapshot.ingredient_ids[snapshot.ingredient_offsets[row]:snapshot.ingredient_offsets[row + 1]]
+        )
+        return (
+            MEAL_TYPES[int(snapshot.meal_type_codes[row])],
+            ingredient_ids,
+            snapshot.macros[row, :4].astype(np.float64)
+        )
+
+    def _get_state(self) -> SimilarityState:
+        version = catalog_version.current()
+        state = self._state
+        if state is not None and state.version == version:
+            return state
+
+        with self._lock:
+            state = self._state
+            if state is None or state.version != version:
+                state = self._build(version, state)
+                self._state = state
+            return state
+
+    def _build(self, version: int, previous: Optional[SimilarityState]) -> SimilarityState:
+        """Construye los rasgos por tipo de comida y conserva los vecinos no afectados."""
+        snapshot = recipe_catalog.snapshot()
+
+        # Ingredientes de cada receta y firma para detectar cambios en la próxima versión
+        ingredient_lists = []
+        signatures = {}
+        for row, recipe_id in enumerate(snapshot.recipe_ids.tolist()):
+            ingredient_ids = np.unique(
+                snapshot.ingredient_ids[snapshot.ingredient_offsets[row]:snapshot.ingredient_offsets[row + 1]]
+            ).tolist()
+            ingredient_lists.append(ingredient_ids)
+            signatures[recipe_id] = (
+                bool(snapshot.active[row]), int(snapshot.meal_type_codes[row]),
+                snapshot.macros[row, :4].tobytes(), tuple(ingredient_ids)
+            )
+
+        features = {}
+        for code, meal_type in enumerate(MEAL_TYPES):
+            rows = np.flatnonzero(snapshot.active & (snapshot.meal_type_codes == code))
+            if not len(rows):
+                continue
+
+            postings: Dict[int, List[int]] = {}
+            counts = np.zeros(len(rows), dtype=np.int64)
+            for position, row in enumerate(rows.tolist()):
+                counts[position] = len(ingredient_lists[row])
+                for ingredient_id in ingredient_lists[row]:
+                    postings.setdefault(ingredient_id, []).append(position)
+
+            features[meal_type] = MealTypeFeatures(
+                recipe_ids=snapshot.recipe_ids[rows],
+                ingredient_counts=counts,
+                postings={ingredient_id: np.asarray(positions, dtype=np.int64)
+                          for ingredient_id, positions in postings.items()},
+                macros=snapshot.macros[rows, :4].astype(np.float64)
+            )
+
+        state = SimilarityState(
+            version=version,
+            snapshot=snapshot,
+            features=features,
+            signatures=signatures,
+            neighbors={}
+        )
+        if previous is not None and previous.neighbors:
+            state.neighbors.update(self._surviving_neighbors(previous, state))
+        return state
+
+    def _surviving_neighbors(self, previous: SimilarityState, state: SimilarityState) -> Dict[int, Neighbors]:
+        """Vecinos guardados que siguen siendo válidos tras un cambio del catálogo."""
+        changed = {
+            recipe_id for recipe_id in previous.signatures.keys() | state.signatures.keys()
+            if previous.signatures.get(recipe_id) != state.signatures.get(recipe_id)
+        }
+        if not changed:
+            return dict(previous.neighbors)
+        if len(changed) > FULL_RESET_FRACTION * max(1, len(state.signatures)):
+            return {}
+
+        changed_ids = np.fromiter(changed, dtype=np.int64)
+        surviving = {
+            recipe_id: neighbors for recipe_id, neighbors in previous.neighbors.items()
+            # La consulta o alguno de sus vecinos cambió o dejó de estar activo
+            if recipe_id not in changed and not np.isin(neighbors.recipe_ids, changed_ids).any()
+        }
+
+        # Recetas nuevas o modificadas que ahora entrarían en una lista guardada
+        queries = {recipe_id: self._query(state.snapshot, recipe_id) for recipe_id in surviving}
+        entering = [recipe_id for recipe_id in changed if state.signatures.get(recipe_id, (False,))[0]]
+        for recipe_id in entering:
+            meal_type, ingredient_ids, macros = self._query(state.snapshot, recipe_id)
+            for cached_id in list(surviving):
+                reference = queries[cached_id]
+                if reference is None or reference[0] != meal_type:
+                    continue
+                neighbors = surviving[cached_id]
+                score = _pair_score(reference[1], reference[2], ingredient_ids, macros)
+                if len(neighbors.scores) < NEIGHBOR_COUNT or score > neighbors.scores[-1]:
+                    del surviving[cached_id]
+        return surviving
+
+
+def _jaccard(features: MealTypeFeatures, ingredient_ids: np.ndarray) -> np.ndarray:
+    """Índice de Jaccard entre un conjunto de ingredientes y cada receta del grupo."""
+    lists = [features.postings[i] for i in ingredient_ids.tolist() if i in features.postings]
+    count = len(features.recipe_ids)
+    if not lists:
+        return np.zeros(count)
+    intersection = np.bincount(np.concatenate(lists), minlength=count).astype(np.float64)
+    union = features.ingredient_counts + len(ingredient_ids) - intersection
+    return np.divide(intersection, union, out=np.zeros(count), where=union > 0)
+
+
+def _pair_score(reference_ingredients: np.ndarray, reference_macros: np.ndarray,
+                candidate_ingredients: np.ndarray, candidate_macros: np.ndarray) -> float:
+    """Similitud de una receta candidata con la de referencia."""
+    intersection = len(np.intersect1d(reference_ingredients, candidate_ingredients, assume_unique=True))
+    union = len(reference_ingredients) + len(candidate_ingredients) - intersection
+    ingredient_score = intersection / union if union else 0.0
+    macro_score = _macro_similarity(candidate_macros[None, :], reference_macros)[0]
+    return INGREDIENT_WEIGHT * ingredient_score + MACRO_SIMILARITY_WEIGHT * macro_score
+
+
+def _macro_similarity(candidates: np.ndarray, reference: np.ndarray) -> np.ndarray:
+    """Cercanía de macros (1 = iguales) relativa a las macros de la receta de referencia."""
+    relative = (candidates - reference) / np.maximum(reference, 1.0)
+    return 1.0 / (1.0 + (np.square(relative) * MACRO_WEIGHTS).sum(axis=1))
+
+
+# Instancia global
+recipe_similarity_index = RecipeSimilarityIndex()
@@ -0,0 +1,59 @@
+"""
+Resolución de ingredientes restringidos a partir de las intolerancias del paciente.
+
+El mapeo intolerancia → ingredientes vive en la tabla ``intolerance_ingredients``
+y se consulta con un único join indexado. El resultado se guarda en caché por
+conjunto de intolerancias hasta que cambia la versión del catálogo.
+"""
+import threading
+from typing import Dict, FrozenSet, Iterable
+
+from app.services.database_service import db
+from app.services.catalog_version import catalog_version
+from app.models.sql_models import IntoleranceIngredient
+
+
+class RestrictionResolver:
+    """Obtiene los IDs de ingredientes restringidos por intolerancia."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._closures: Dict[FrozenSet[int], FrozenSet[int]] = {}
+
+    def for_intolerances(self, intolerance_ids: Iterable[int]) -> FrozenSet[int]:
+        """
+        Obtiene los ingredientes restringidos para un conjunto de intolerancias.
+
+        Args:
+            intolerance_ids: IDs de ``FoodIntolerance``
+
+        Returns:
+            Conjunto de IDs de ingredientes restringidos
+        """
+        key = frozenset(intolerance_ids)
+        if not key:
+            return frozenset()
+
+        version = catalog_version.current()
+        with self._lock:
+            if self._version != version:
+                self._closures = {}
+                self._version = version
+            cached = self._closures.get(key)
+        if cached is not None:
+            return cached
+
+        rows = db.session.query(IntoleranceIngredient.ingredient_id).filter(
+            IntoleranceIngredient.intolerance_id.in_(key)
+        ).distinct().all()
+        closure = frozenset(row.ingredient_id for row in rows)
+
+        with self._lock:
+            if self._version == version:
+                self._closures[key] = closure
+        return closure
+
+
+# Instancia global
+restriction_resolver = RestrictionResolver()
@@ -1,7 +1,7 @@
 """Authentication utilities for the application."""
 
 from functools import wraps
-from flask import request, jsonify
+from flask import current_app, request, jsonify
 from ..services.firebase_service import FirebaseService
 from .responses import error_response
 
@@ -36,6 +36,17 @@ def require_auth(f):
     
     return decorated_function
 
+def require_admin(f):
+    """Decorator that requires a verified Firebase token whose UID is listed in ADMIN_UIDS."""
+    @wraps(f)
+    @require_auth
+    def decorated_function(*args, **kwargs):
+        if get_current_user_uid() not in current_app.config.get('ADMIN_UIDS', []):
+            return error_response('Admin access required', 403)
+        return f(*args, **kwargs)
+    
+    return decorated_function
+
 def get_current_user_uid():
     """Get the current authenticated user's UID from the request context."""
     if hasattr(request, 'user') and request.user:
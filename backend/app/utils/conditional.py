@@ -0,0 +1,21 @@
+"""Conditional GET helpers (ETag / If-None-Match) for patient-facing views."""
+
+from flask import Response, make_response, request
+
+
+def not_modified_response(etag):
+    """Return a 304 response if the request's If-None-Match matches ``etag``, else None."""
+    if etag is None or not request.if_none_match.contains_weak(etag):
+        return None
+    return with_etag(Response(status=304), etag)
+
+
+def with_etag(response, etag):
+    """Add the ETag and revalidation Cache-Control headers to a successful response."""
+    response = make_response(response)
+    if etag is not None and response.status_code in (200, 304):
+        response.set_etag(etag)
+        # Personal data: browsers may keep it but must revalidate on every use
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    return response
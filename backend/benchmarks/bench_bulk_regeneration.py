@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Benchmark bulk plan regeneration throughput against the number of worker processes.
+
+Seeds a synthetic catalog and patients (each with a latest weekly plan and a
+random set of intolerances), then runs ``plan_regeneration_service.regenerate``
+with 1, 2, 4... workers. Grid building runs in the process pool; the parent
+does the bulk writes, reported separately so the parallel part's scaling is
+visible even when the database becomes the bottleneck.
+
+Usage (from backend/):
+    python -m benchmarks.bench_bulk_regeneration [--patients 50000] [--workers 1 2 4 8] [--budget-ms 5]
+"""
+import argparse
+import os
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.db import create_benchmark_app
+from benchmarks.synthetic import synthetic_macros
+
+INGREDIENT_COUNT = 60
+INGREDIENTS_PER_RECIPE = 4
+INTOLERANCE_COUNT = 8
+INGREDIENTS_PER_INTOLERANCE = 3
+
+
+def seed_catalog(recipes: int, rng: np.random.Generator):
+    """Insert synthetic recipes, ingredients and intolerances."""
+    from sqlalchemy import insert
+
+    from app.services.database_service import db
+    from app.models.sql_models import (
+        FoodIntolerance, Ingredient, IntoleranceIngredient, Recipe, RecipeIngredient
+    )
+
+    ingredients = [Ingredient(ingredient_name=f'Bench ingredient {i}') for i in range(INGREDIENT_COUNT)]
+    intolerances = [FoodIntolerance(intolerance_name=f'Bench intolerance {i}') for i in range(INTOLERANCE_COUNT)]
+    db.session.add_all(ingredients + intolerances)
+    db.session.flush()
+    for intolerance in intolerances:
+        for i in rng.choice(INGREDIENT_COUNT, size=INGREDIENTS_PER_INTOLERANCE, replace=False):
+            db.session.add(IntoleranceIngredient(intolerance_id=intolerance.id, ingredient_id=ingredients[int(i)].id))
+
+    links = []
+    for meal_type, macros in synthetic_macros(recipes).items():
+        rows = [
+            {
+                'recipe_name': f'Bench {meal_type} {i}', 'meal_type': meal_type,
+                'total_calories': float(c), 'total_protein': float(p), 'total_carbs': float(cb), 'total_fat': float(f),
+                'is_active': True
+            }
+            for i, (c, p, cb, f) in enumerate(macros)
+        ]
+        for row in db.session.execute(insert(Recipe).returning(Recipe.id), rows):
+            for i in rng.choice(INGREDIENT_COUNT, size=INGREDIENTS_PER_RECIPE, replace=False):
+                links.append({'recipe_id': row.id, 'ingredient_id': ingredients[int(i)].id, 'quantity': 1, 'unit': 'g'})
+    db.session.execute(insert(RecipeIngredient), links)
+    db.session.commit()
+    return [intolerance.id for intolerance in intolerances]
+
+
+def seed_patients(count: int, intolerance_ids, rng: np.random.Generator):
+    """Insert patients with a latest approved weekly plan and 0-2 intolerances each."""
+    from sqlalchemy import insert
+
+    from app.services.database_service import db
+    from app.models.sql_models import MealPlan, Patient, PatientIntolerance
+
+    patient_rows = [
+        {
+            'first_name': 'Bench', 'last_name': str(i), 'date_of_birth': date(1950 + i % 50, 1, 1),
+            'gender': ('female', 'male', 'other')[i % 3], 'is_active': True
+        }
+        for i in range(count)
+    ]
+    patient_ids = [row.id for row in db.session.execute(insert(Patient).returning(Patient.id), patient_rows)]
+
+    start = date.today() + timedelta(days=7 - date.today().weekday())
+    db.session.execute(insert(MealPlan), [
+        {
+            'patient_id': patient_id, 'plan_name': 'Bench plan', 'start_date': start,
+            'end_date': start + timedelta(days=6), 'status': 'approved', 'generated_by_uid': 'bench',
+            'version': 1, 'is_latest': True
+        }
+        for patient_id in patient_ids
+    ])
+
+    restrictions = []
+    for patient_id in patient_ids:
+        for i in rng.choice(len(intolerance_ids), size=int(rng.integers(0, 3)), replace=False):
+            restrictions.append({'patient_id': patient_id, 'intolerance_id': intolerance_ids[int(i)]})
+    if restrictions:
+        db.session.execute(insert(PatientIntolerance), restrictions)
+    db.session.commit()
+
+
+def discard_drafts():
+    from sqlalchemy import delete, select
+    from app.services.database_service import db
+    from app.models.sql_models import MealPlan, MealPlanMeal, MealPlanNutrition
+
+    drafts = select(MealPlan.id).where(MealPlan.status == 'draft', MealPlan.parent_plan_id.isnot(None))
+    db.session.execute(delete(MealPlanMeal).where(MealPlanMeal.plan_id.in_(drafts)))
+    db.session.execute(delete(MealPlanNutrition).where(MealPlanNutrition.plan_id.in_(drafts)))
+    db.session.execute(delete(MealPlan).where(MealPlan.id.in_(drafts)))
+    db.session.commit()
+
+
+def run(patients: int, recipes: int, workers_list, budget_ms: float):
+    from app.services.plan_regeneration import plan_regeneration_service
+
+    app = create_benchmark_app()
+    app.config['MEAL_PLAN_OPTIMIZER_BUDGET_MS'] = budget_ms
+    rng = np.random.default_rng(11)
+    intolerance_ids = seed_catalog(recipes, rng)
+    seed_patients(patients, intolerance_ids, rng)
+
+    print(f"{patients} patients, {recipes} recipes, optimizer budget {budget_ms} ms, {os.cpu_count()} CPUs")
+    header = (f"{'workers':>7} {'plans':>7} {'groups':>6} {'total s':>8} {'writes s':>8} "
+              f"{'build s':>8} {'plans/s':>8} {'build speedup':>13}")
+    print(header)
+    print('-' * len(header))
+
+    baseline = None
+    for workers in workers_list:
+        # Each run regenerates every patient: drop the drafts of the previous run,
+        # which regenerate() would otherwise skip as already done
+        discard_drafts()
+        summary = plan_regeneration_service.regenerate(workers=workers, seed=7)
+        build_seconds = summary['elapsed_seconds'] - summary['persist_seconds']
+        baseline = baseline or build_seconds
+        print(f"{workers:>7} {summary['generated']:>7} {summary['restriction_groups']:>6} "
+              f"{summary['elapsed_seconds']:>8.1f} {summary['persist_seconds']:>8.1f} {build_seconds:>8.1f} "
+              f"{summary['plans_per_second'] or 0:>8.0f} {baseline / build_seconds:>12.2f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--patients', type=int, default=50_000)
+    parser.add_argument('--recipes', type=int, default=600, help='Recipes in the catalog (split across meal types).')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--budget-ms', type=float, default=5.0, help='Optimizer time budget per plan.')
+    args = parser.parse_args()
+    run(args.patients, args.recipes, args.workers, args.budget_ms)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark multi-week plan scheduling with a no-repeat window.
+
+Times 30-day (and longer) schedules on a synthetic 5k-recipe catalog, both
+the random no-repeat schedule and the macro-targeted optimizer, checks that
+no recipe repeats inside the window and reports deviation from the targets.
+
+Usage (from backend/):
+    python -m benchmarks.bench_long_plans [--plans 50] [--budget-ms 50]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.plan_optimizer import (
+    WeeklyPlanOptimizer, random_schedule, plan_deviation, DEFAULT_DAILY_TARGETS
+)
+from benchmarks.synthetic import synthetic_macros
+
+CATALOG_SIZE = 5_000
+CASES = ((30, 7), (30, 14), (30, 30), (90, 14))
+
+
+def window_violations(rows: np.ndarray, window: int) -> int:
+    """Count pairs of days closer than ``window`` that share a recipe."""
+    violations = 0
+    for day in range(len(rows)):
+        violations += int((rows[day + 1:day + window] == rows[day]).sum())
+    return violations
+
+
+def run(plans: int, budget_ms: float):
+    targets = np.array(DEFAULT_DAILY_TARGETS['female'])
+    catalog = synthetic_macros(CATALOG_SIZE, seed=7)
+    meal_types = list(catalog.keys())
+    rng = np.random.default_rng(42)
+
+    print(f"{CATALOG_SIZE} recipes, {plans} plans per case, optimizer budget {budget_ms:.0f} ms")
+    header = f"{'days':>5} {'window':>7} {'mode':>10} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'kcal dev':>9} {'repeats':>8}"
+    print(header)
+    print('-' * len(header))
+
+    for days, window in CASES:
+        optimizer = WeeklyPlanOptimizer(time_budget_ms=budget_ms, seed=days * window)
+        modes = (
+            ('random', lambda: dict(zip(meal_types, random_schedule(
+                [len(catalog[m]) for m in meal_types], days, window, rng)))),
+            ('optimized', lambda: optimizer.optimize(catalog, targets, days=days, no_repeat_days=window)),
+        )
+        for mode, schedule in modes:
+            timings = []
+            deviation = []
+            repeats = 0
+            for _ in range(plans):
+                started = time.perf_counter()
+                assignment = schedule()
+                timings.append((time.perf_counter() - started) * 1000)
+                deviation.append(plan_deviation(catalog, assignment, targets)[0])
+                repeats += sum(window_violations(rows, window) for rows in assignment.values())
+            print(
+                f"{days:>5} {window:>7} {mode:>10} {np.percentile(timings, 50):>8.2f} "
+                f"{np.percentile(timings, 95):>8.2f} {max(timings):>8.2f} "
+                f"{np.mean(deviation) * 100:>8.1f}% {repeats:>8}"
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--plans', type=int, default=50)
+    parser.add_argument('--budget-ms', type=float, default=50.0)
+    args = parser.parse_args()
+    run(args.plans, args.budget_ms)
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Benchmark the meal plan generator stage by stage on synthetic catalogs.
+
+For each catalog scale, seeds ingredients (with categories), recipes (with
+ingredients and tags), intolerances, a medical condition rule, a dietary
+preference and patients with random restrictions, then generates one weekly
+plan per patient the way ``MealPlanGeneratorService`` does and times every
+stage separately:
+
+    load_patient   get_patient_with_restrictions
+    filter         filter_compatible_recipes (cache starts empty per scale)
+    distribute     _distribute_recipes_across_week
+    persist        bulk_persist_plans (plan + meals)
+    token          _create_tokens
+    commit         db.session.commit
+
+Reports p50/p95/mean latency and SQL statements per plan for each stage and
+plans/sec overall. The human-readable table goes to stderr and the results
+as JSON to stdout (or --output). With --compare, stages whose p95 got slower
+than a previous result by more than --tolerance exit with status 1, so the
+run can gate a release.
+
+Runs on in-memory SQLite by default; set BENCHMARK_DATABASE_URL to a scratch
+Postgres database to include real pg8000 round trips.
+
+Usage (from backend/):
+    python -m benchmarks.bench_plan_generation [--scales 500 5000 20000] [--patients 200] \\
+        [--output results.json] [--compare baseline.json --tolerance 0.25]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import date, datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.db import create_benchmark_app, StatementCounter
+from benchmarks.synthetic import synthetic_macros
+
+STAGES = ('load_patient', 'filter', 'distribute', 'persist', 'token', 'commit')
+INGREDIENTS_PER_RECIPE = 5
+INTOLERANCE_COUNT = 10
+INGREDIENTS_PER_INTOLERANCE = 3
+CATEGORIES = ('cereales', 'lácteos', 'proteínas', 'vegetales', 'frutas', 'embutidos', 'azúcares')
+
+
+def seed_restrictions():
+    """Create the catalog-independent restrictions: intolerances, a condition and a preference."""
+    from app.services.database_service import db
+    from app.models.sql_models import (
+        DietaryPreference, DietaryPreferenceTag, FoodIntolerance, MedicalCondition,
+        MedicalConditionRule, RecipeTag
+    )
+
+    intolerances = [FoodIntolerance(intolerance_name=f'Bench intolerance {i}') for i in range(INTOLERANCE_COUNT)]
+    condition = MedicalCondition(condition_name='Bench condition')
+    preference = DietaryPreference(preference_name='Bench preference')
+    tag = RecipeTag(tag_name='Bench forbidden tag')
+    db.session.add_all(intolerances + [condition, preference, tag])
+    db.session.flush()
+    db.session.add_all([
+        MedicalConditionRule(condition_id=condition.id, rule_type='max_nutrient', nutrient='carbs', value=80),
+        MedicalConditionRule(condition_id=condition.id, rule_type='exclude_category', category='embutidos'),
+        DietaryPreferenceTag(preference_id=preference.id, tag_id=tag.id, mode='forbid')
+    ])
+    db.session.commit()
+    return [intolerance.id for intolerance in intolerances], condition.id, preference.id, tag.id
+
+
+def seed_catalog(start: int, stop: int, intolerance_ids, tag_id: int, rng: np.random.Generator):
+    """Grow the catalog to ``stop`` recipes, with ingredients scaling alongside."""
+    from sqlalchemy import insert
+
+    from app.services.database_service import db
+    from app.models.sql_models import (
+        Ingredient, IntoleranceIngredient, Recipe, RecipeIngredient, RecipeTagAssignment
+    )
+
+    ingredient_count = max(100, stop // 10)
+    existing = Ingredient.query.count()
+    if ingredient_count > existing:
+        db.session.execute(insert(Ingredient), [
+            {'ingredient_name': f'Bench ingredient {i}', 'category': CATEGORIES[i % len(CATEGORIES)]}
+            for i in range(existing, ingredient_count)
+        ])
+    ingredient_ids = [row.id for row in db.session.query(Ingredient.id).order_by(Ingredient.id)]
+
+    if not existing:
+        db.session.execute(insert(IntoleranceIngredient), [
+            {'intolerance_id': intolerance_id, 'ingredient_id': ingredient_ids[int(i)]}
+            for intolerance_id in intolerance_ids
+            for i in rng.choice(len(ingredient_ids), size=INGREDIENTS_PER_INTOLERANCE, replace=False)
+        ])
+
+    links, tags = [], []
+    for meal_type, macros in synthetic_macros(stop - start, seed=start).items():
+        rows = [
+            {
+                'recipe_name': f'Bench {meal_type} {start + i}', 'meal_type': meal_type,
+                'total_calories': float(c), 'total_protein': float(p), 'total_carbs': float(cb),
+                'total_fat': float(f), 'is_active': True
+            }
+            for i, (c, p, cb, f) in enumerate(macros)
+        ]
+        for row in db.session.execute(insert(Recipe).returning(Recipe.id), rows):
+            for i in rng.choice(len(ingredient_ids), size=INGREDIENTS_PER_RECIPE, replace=False):
+                links.append({'recipe_id': row.id, 'ingredient_id': ingredient_ids[int(i)], 'quantity': 1, 'unit': 'g'})
+            if rng.random() < 0.3:
+                tags.append({'recipe_id': row.id, 'tag_id': tag_id})
+    db.session.execute(insert(RecipeIngredient), links)
+    if tags:
+        db.session.execute(insert(RecipeTagAssignment), tags)
+    db.session.commit()
+    return len(ingredient_ids)
+
+
+def seed_patients(count: int, intolerance_ids, condition_id: int, preference_id: int,
+                  rng: np.random.Generator):
+    """Insert patients with 0-2 intolerances and occasionally the condition or the preference."""
+    from sqlalchemy import insert
+
+    from app.services.database_service import db
+    from app.models.sql_models import (
+        Patient, PatientDietaryPreference, PatientIntolerance, PatientMedicalCondition
+    )
+
+    patient_ids = [row.id for row in db.session.execute(insert(Patient).returning(Patient.id), [
+        {
+            'first_name': 'Bench', 'last_name': str(i), 'date_of_birth': date(1950 + i % 50, 1, 1),
+            'gender': ('female', 'male', 'other')[i % 3], 'is_active': True
+        }
+        for i in range(count)
+    ])]
+
+    intolerances, conditions, preferences = [], [], []
+    for patient_id in patient_ids:
+        for i in rng.choice(len(intolerance_ids), size=int(rng.integers(0, 3)), replace=False):
+            intolerances.append({'patient_id': patient_id, 'intolerance_id': intolerance_ids[int(i)]})
+        if rng.random() < 0.2:
+            conditions.append({'patient_id': patient_id, 'condition_id': condition_id})
+        if rng.random() < 0.2:
+            preferences.append({'patient_id': patient_id, 'preference_id': preference_id})
+    for model, rows in ((PatientIntolerance, intolerances), (PatientMedicalCondition, conditions),
+                        (PatientDietaryPreference, preferences)):
+        if rows:
+            db.session.execute(insert(model), rows)
+    db.session.commit()
+    return patient_ids
+
+
+def generate_timed(patient_ids, counter: StatementCounter):
+    """Generate one plan per patient, recording time and statements per stage."""
+    from app.services.database_service import db
+    from app.services.meal_plan_generator import meal_plan_generator
+    from app.services.plan_optimizer import daily_targets_for_patient
+
+    timings = {stage: [] for stage in STAGES}
+    plan_totals = []
+    statements = {stage: 0 for stage in STAGES}
+    start_date, end_date = meal_plan_generator.get_next_week_dates()
+    failed = 0
+
+    def timed(stage, call):
+        before = counter.round_trips
+        started = time.perf_counter()
+        result = call()
+        timings[stage].append((time.perf_counter() - started) * 1000)
+        statements[stage] += counter.round_trips - before
+        return result
+
+    started = time.perf_counter()
+    for patient_id in patient_ids:
+        patient = timed('load_patient', lambda: meal_plan_generator.get_patient_with_restrictions(patient_id))
+        compatible = timed('filter', lambda: meal_plan_generator.filter_compatible_recipes(patient))
+        try:
+            meal_plan_generator.validate_recipe_availability(compatible)
+        except ValueError:
+            failed += 1
+            continue
+        meals = timed('distribute', lambda: meal_plan_generator._distribute_recipes_across_week(
+            compatible, targets=daily_targets_for_patient(patient), start_date=start_date
+        ))
+        spec = meal_plan_generator.build_plan_spec(
+            patient_id=patient_id, start_date=start_date, end_date=end_date,
+            generated_by_uid='benchmark', meals=meals
+        )
+        [(plan_id, _)] = timed('persist', lambda: meal_plan_generator.bulk_persist_plans([spec], create_tokens=False))
+        timed('token', lambda: meal_plan_generator._create_tokens([plan_id]))
+        timed('commit', db.session.commit)
+        plan_totals.append(sum(timings[stage][-1] for stage in STAGES))
+    elapsed = time.perf_counter() - started
+
+    generated = len(patient_ids) - failed
+    return timings, plan_totals, statements, generated, failed, elapsed
+
+
+def stage_stats(timings, plan_totals, statements, plans: int) -> dict:
+    stats = {}
+    for stage in STAGES:
+        values = timings[stage]
+        stats[stage] = {
+            'p50_ms': round(float(np.percentile(values, 50)), 3) if values else None,
+            'p95_ms': round(float(np.percentile(values, 95)), 3) if values else None,
+            'mean_ms': round(float(np.mean(values)), 3) if values else None,
+            'queries_per_plan': round(statements[stage] / max(1, len(values)), 2)
+        }
+    stats['total'] = {
+        'p50_ms': round(float(np.percentile(plan_totals, 50)), 3) if plan_totals else None,
+        'p95_ms': round(float(np.percentile(plan_totals, 95)), 3) if plan_totals else None,
+        'mean_ms': round(float(np.mean(plan_totals)), 3) if plan_totals else None,
+        'queries_per_plan': round(sum(statements.values()) / max(1, plans), 2)
+    }
+    return stats
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list:
+    """Stages whose p95 regressed by more than ``tolerance`` (and ``min_delta_ms``) against the baseline."""
+    previous = {scale['recipes']: scale for scale in baseline.get('scales', [])}
+    regressions = []
+    for scale in results['scales']:
+        before = previous.get(scale['recipes'])
+        if not before:
+            continue
+        for stage, stats in scale['stages'].items():
+            old = before['stages'].get(stage, {}).get('p95_ms')
+            new = stats['p95_ms']
+            if old is None or new is None:
+                continue
+            if new > old * (1 + tolerance) and new - old > min_delta_ms:
+                regressions.append({
+                    'recipes': scale['recipes'], 'stage': stage, 'baseline_p95_ms': old, 'p95_ms': new,
+                    'change': round(new / old - 1, 3)
+                })
+    return regressions
+
+
+def run(scales, patients: int, budget_ms: float) -> dict:
+    from app.services.database_service import db
+    from app.services.catalog_version import catalog_version
+
+    app = create_benchmark_app()
+    app.config['MEAL_PLAN_OPTIMIZER_BUDGET_MS'] = budget_ms
+    rng = np.random.default_rng(21)
+    intolerance_ids, condition_id, preference_id, tag_id = seed_restrictions()
+
+    results = {
+        'benchmark': 'plan_generation',
+        'created_at': datetime.utcnow().isoformat() + 'Z',
+        'database': db.engine.url.get_backend_name(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'settings': {
+            'patients_per_scale': patients,
+            'optimizer_budget_ms': budget_ms,
+            'distribution_mode': app.config.get('MEAL_PLAN_DISTRIBUTION_MODE')
+        },
+        'scales': []
+    }
+
+    header = (f"{'recipes':>8} {'stage':>13} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8} {'queries':>8}")
+    print(header, file=sys.stderr)
+    print('-' * len(header), file=sys.stderr)
+
+    seeded = 0
+    for size in scales:
+        ingredients = seed_catalog(seeded, size, intolerance_ids, tag_id, rng)
+        seeded = size
+        catalog_version.mark_changed()
+        patient_ids = seed_patients(patients, intolerance_ids, condition_id, preference_id, rng)
+
+        with StatementCounter() as counter:
+            timings, plan_totals, statements, generated, failed, elapsed = generate_timed(patient_ids, counter)
+        stats = stage_stats(timings, plan_totals, statements, generated)
+        results['scales'].append({
+            'recipes': size,
+            'ingredients': ingredients,
+            'patients': patients,
+            'generated': generated,
+            'failed': failed,
+            'elapsed_seconds': round(elapsed, 3),
+            'plans_per_second': round(generated / elapsed, 1) if elapsed else None,
+            'stages': stats
+        })
+
+        for stage, values in stats.items():
+            print(f"{size:>8} {stage:>13} {values['p50_ms'] or 0:>8.2f} {values['p95_ms'] or 0:>8.2f} "
+                  f"{values['mean_ms'] or 0:>8.2f} {values['queries_per_plan']:>8.1f}", file=sys.stderr)
+        print(f"{size:>8} {'plans/sec':>13} {results['scales'][-1]['plans_per_second']:>8}", file=sys.stderr)
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[500, 5_000, 20_000],
+                        help='Catalog sizes (recipes) to benchmark, cumulative.')
+    parser.add_argument('--patients', type=int, default=200, help='Plans generated per scale.')
+    parser.add_argument('--budget-ms', type=float, default=50.0, help='Optimizer time budget per plan.')
+    parser.add_argument('--output', help='Write the JSON results to this file instead of stdout.')
+    parser.add_argument('--compare', help='Previous JSON results to check for regressions.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative p95 slowdown.')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5, help='Ignore p95 slowdowns smaller than this.')
+    args = parser.parse_args()
+
+    results = run(sorted(args.scales), args.patients, args.budget_ms)
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance, args.min_delta_ms)
+        results['regressions'] = regressions
+        for regression in regressions:
+            print(f"❌ {regression['recipes']} recipes, {regression['stage']}: p95 "
+                  f"{regression['baseline_p95_ms']} → {regression['p95_ms']} ms "
+                  f"(+{regression['change'] * 100:.0f}%)", file=sys.stderr)
+        exit_code = 1 if regressions else 0
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    sys.exit(exit_code)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Benchmark plan read paths: the previous loading (chained joinedload or lazy
+loads) against the selectinload loader profiles in ``app.services.plan_loading``.
+
+Seeds the sample catalog and one patient with a generated plan of ``--weeks``
+weeks, then gives the patient several conditions, intolerances and
+preferences. For each read path (public view, patient view, version
+comparison, workflow / PDF data) it reports SQL statements, rows fetched
+from the database and wall time per read. Rows are counted by re-running
+each captured SELECT after the timed loop.
+
+Usage (from backend/):
+    python -m benchmarks.bench_plan_loading [--weeks 1] [--restrictions 4] [--repeat 50]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from benchmarks.db import create_benchmark_app
+
+
+class RowCounter:
+    """Capture SELECT statements issued through ``db.engine`` and count the rows they return."""
+
+    def __init__(self):
+        self.captured = []
+
+    def __enter__(self):
+        from app.services.database_service import db
+
+        event.listen(db.engine, 'before_cursor_execute', self._on_statement)
+        return self
+
+    def __exit__(self, *exc):
+        from app.services.database_service import db
+
+        event.remove(db.engine, 'before_cursor_execute', self._on_statement)
+        return False
+
+    def rows(self) -> int:
+        from app.services.database_service import db
+
+        connection = db.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            total = 0
+            for statement, parameters in self.captured:
+                cursor.execute(statement, parameters)
+                total += len(cursor.fetchall())
+            return total
+        finally:
+            connection.close()
+
+    def _on_statement(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            self.captured.append((statement, parameters))
+
+
+def seed(weeks: int, restrictions: int):
+    """Sample catalog, one patient with a plan of ``weeks`` weeks and ``restrictions`` of each kind."""
+    from app.services.database_service import db
+    from app.services.meal_plan_generator import meal_plan_generator
+    from app.services.meal_plan_versioning_service import MealPlanVersioningService
+    from app.models.sql_models import (
+        DietaryPreference, FoodIntolerance, MealPlan, MedicalCondition, Nutritionist, Patient,
+        PatientDietaryPreference, PatientIntolerance, PatientInvitation, PatientMedicalCondition
+    )
+    from seed_data import seed_all_data
+
+    seed_all_data()
+    nutritionist = Nutritionist(firebase_uid='benchmark', email='bench@example.com', first_name='Bench', last_name='N')
+    db.session.add(nutritionist)
+    db.session.flush()
+    invitation = PatientInvitation(email='patient@example.com', invited_by_uid='benchmark',
+                                   nutritionist_id=nutritionist.id, status='completed')
+    db.session.add(invitation)
+    db.session.flush()
+    patient = Patient(first_name='Bench', last_name='Patient', date_of_birth=date(1990, 1, 1), gender='female',
+                      invitation_id=invitation.id)
+    db.session.add(patient)
+    db.session.commit()
+
+    # Generate before adding restrictions so the small sample catalog always has recipes
+    start_date, _ = meal_plan_generator.get_next_week_dates()
+    result = meal_plan_generator.generate_plan(
+        patient.id, start_date, start_date + timedelta(days=7 * weeks - 1), 'benchmark',
+        nutritionist_id=nutritionist.id
+    )
+    plan_id = result['plan_id']
+    MealPlanVersioningService.approve_meal_plan_version(plan_id, nutritionist.id)
+    version = MealPlanVersioningService.create_new_version_from_existing(plan_id, nutritionist.id, {})[1]
+    MealPlanVersioningService.approve_meal_plan_version(version.id, nutritionist.id)
+
+    for model, link, column in (
+        (MedicalCondition, PatientMedicalCondition, 'condition_id'),
+        (FoodIntolerance, PatientIntolerance, 'intolerance_id'),
+        (DietaryPreference, PatientDietaryPreference, 'preference_id')
+    ):
+        for item in model.query.order_by(model.id).limit(restrictions):
+            db.session.add(link(patient_id=patient.id, **{column: item.id}))
+    db.session.commit()
+    return nutritionist.id, patient.id, plan_id, version.id, len(db.session.get(MealPlan, plan_id).meals)
+
+
+def cases(nutritionist_id: int, patient_id: int, plan_id: int, version_id: int):
+    """(name, before, after) read functions for each plan read path."""
+    from sqlalchemy.orm import joinedload
+
+    from app.services.database_service import db
+    from app.services.meal_plan_generator import meal_plan_generator
+    from app.services.meal_plan_versioning_service import MealPlanVersioningService
+    from app.services.meal_plan_workflow_service import MealPlanWorkflowService
+    from app.services.plan_loading import PATIENT_PLAN_VIEW, PUBLIC_PLAN_VIEW, patient_restriction_options
+    from app.models.sql_models import (
+        MealPlan, MealPlanMeal, Patient, PatientIntolerance, PatientMedicalCondition, Recipe, RecipeIngredient
+    )
+
+    def public_before():
+        plan = MealPlan.query.options(
+            joinedload(MealPlan.patient).joinedload(Patient.medical_conditions).joinedload(PatientMedicalCondition.condition),
+            joinedload(MealPlan.patient).joinedload(Patient.intolerances).joinedload(PatientIntolerance.intolerance),
+            joinedload(MealPlan.meals).joinedload(MealPlanMeal.recipe).joinedload(Recipe.ingredients).joinedload(RecipeIngredient.ingredient)
+        ).filter(MealPlan.id == plan_id).first()
+        return meal_plan_generator._format_plan_for_public_view(plan)
+
+    def public_after():
+        plan = MealPlan.query.options(*PUBLIC_PLAN_VIEW).filter(MealPlan.id == plan_id).first()
+        return meal_plan_generator._format_plan_for_public_view(plan)
+
+    def patient_view(options):
+        def read():
+            plan = MealPlanVersioningService.get_patient_latest_meal_plan(patient_id, options=options)
+            patient = plan.patient
+            return (
+                [mc.condition.condition_name for mc in patient.medical_conditions],
+                [pi.intolerance.intolerance_name for pi in patient.intolerances],
+                [dp.preference.preference_name for dp in patient.dietary_preferences],
+                plan.nutritionist.first_name if plan.nutritionist else None,
+                [[ri.ingredient.ingredient_name for ri in meal.recipe.ingredients] for meal in plan.meals]
+            )
+        return read
+
+    def compare_before():
+        plans = [db.session.get(MealPlan, plan_id), db.session.get(MealPlan, version_id)]
+        return plans[0].patient.first_name, [[meal.to_dict() for meal in plan.meals] for plan in plans]
+
+    def compare_after():
+        success, comparison, error = MealPlanVersioningService.get_version_comparison(
+            plan_id, version_id, nutritionist_id
+        )
+        assert success, error
+        return comparison
+
+    def workflow(options):
+        def read():
+            patient = Patient.query.options(*options).filter(Patient.id == patient_id).first()
+            plan = MealPlan.query.filter_by(patient_id=patient_id).order_by(MealPlan.created_at).first()
+            return MealPlanWorkflowService._get_meal_plan_data(plan, patient)
+        return read
+
+    return [
+        ('public view', public_before, public_after),
+        ('patient view', patient_view(()), patient_view(PATIENT_PLAN_VIEW)),
+        ('version compare', compare_before, compare_after),
+        ('workflow / pdf', workflow(()), workflow(patient_restriction_options()))
+    ]
+
+
+def measure(read, repeat: int):
+    """Statements and rows of one cold read, and mean milliseconds over ``repeat`` cold reads."""
+    from app.services.database_service import db
+
+    db.session.expunge_all()
+    with RowCounter() as counter:
+        read()
+    statements = len(counter.captured)
+    rows = counter.rows()
+
+    elapsed = 0.0
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        read()
+        elapsed += time.perf_counter() - started
+    return statements, rows, elapsed * 1000 / repeat
+
+
+def run(weeks: int, restrictions: int, repeat: int):
+    from app.services.database_service import db
+    from app.services.recipe_catalog import recipe_catalog
+
+    nutritionist_id, patient_id, plan_id, version_id, meal_count = seed(weeks, restrictions)
+    recipe_catalog.snapshot()
+
+    print(f"{meal_count} meals, {restrictions} restrictions of each kind, {db.engine.url.get_backend_name()}")
+    header = f"{'path':>16} {'mode':>7} {'stmts':>6} {'rows':>7} {'ms/read':>9}"
+    print(header)
+    print('-' * len(header))
+    for name, before, after in cases(nutritionist_id, patient_id, plan_id, version_id):
+        for mode, read in (('before', before), ('after', after)):
+            statements, rows, ms = measure(read, repeat)
+            print(f"{name:>16} {mode:>7} {statements:>6} {rows:>7} {ms:>9.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--weeks', type=int, default=1)
+    parser.add_argument('--restrictions', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    create_benchmark_app()
+    run(args.weeks, args.restrictions, args.repeat)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark meal plan persistence: the previous three-commit ORM path against
+the single-transaction bulk insert used by the generator.
+
+Reports SQL statements, commits and wall time per persisted plan. Runs on an
+in-memory SQLite database by default; set BENCHMARK_DATABASE_URL to a scratch
+Postgres database to measure real pg8000 round trips.
+
+Usage (from backend/):
+    python -m benchmarks.bench_plan_persistence [--plans 200]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.db import create_benchmark_app, StatementCounter
+
+
+def legacy_persist(spec):
+    """Plan, meals and token persisted the way the generator used to: one commit each."""
+    from app.services.database_service import db
+    from app.models.sql_models import MealPlan, MealPlanMeal, MealPlanToken
+
+    meals = spec.pop('meals')
+    plan = MealPlan(**spec)
+    db.session.add(plan)
+    db.session.commit()
+
+    db.session.add_all([MealPlanMeal(plan_id=plan.id, **meal) for meal in meals])
+    db.session.commit()
+
+    token = MealPlanToken(plan_id=plan.id, expires_at=None)
+    db.session.add(token)
+    db.session.commit()
+    return plan.id, token.token
+
+
+def pipeline_persist(spec):
+    from app.services.database_service import db
+    from app.services.meal_plan_generator import meal_plan_generator
+
+    [(plan_id, token)] = meal_plan_generator.bulk_persist_plans([spec])
+    db.session.commit()
+    return plan_id, token
+
+
+def create_patients(count):
+    from app.services.database_service import db
+    from app.models.sql_models import Patient
+
+    patients = [
+        Patient(first_name='Bench', last_name=str(i), date_of_birth=date(1990, 1, 1), gender='female')
+        for i in range(count)
+    ]
+    db.session.add_all(patients)
+    db.session.commit()
+    return [patient.id for patient in patients]
+
+
+def run(plans: int):
+    from app.services.database_service import db
+    from app.services.meal_plan_generator import meal_plan_generator
+    from seed_data import seed_all_data
+
+    seed_all_data()
+    patient_ids = create_patients(plans)
+    start_date, end_date = meal_plan_generator.get_next_week_dates()
+    compatible = meal_plan_generator.filter_compatible_recipes(
+        meal_plan_generator.get_patient_with_restrictions(patient_ids[0])
+    )
+    week_meals = meal_plan_generator._distribute_recipes_across_week(compatible)
+
+    def make_spec(patient_id):
+        return meal_plan_generator.build_plan_spec(
+            patient_id=patient_id,
+            start_date=start_date,
+            end_date=end_date,
+            generated_by_uid='benchmark',
+            meals=[dict(meal) for meal in week_meals],
+            notes="Plan generado automáticamente al completar perfil"
+        )
+
+    print(f"{len(week_meals)} meals per plan, {plans} plans, {db.engine.url.get_backend_name()}")
+    header = f"{'mode':>10} {'stmts/plan':>11} {'commits/plan':>13} {'trips/plan':>11} {'ms/plan':>9}"
+    print(header)
+    print('-' * len(header))
+
+    for mode, persist in (('legacy', legacy_persist), ('pipeline', pipeline_persist)):
+        specs = [make_spec(patient_id) for patient_id in patient_ids]
+        with StatementCounter() as counter:
+            started = time.perf_counter()
+            for spec in specs:
+                persist(spec)
+            elapsed = time.perf_counter() - started
+        print(
+            f"{mode:>10} {counter.statements / plans:>11.1f} {counter.commits / plans:>13.1f} "
+            f"{counter.round_trips / plans:>11.1f} {elapsed * 1000 / plans:>9.2f}"
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--plans', type=int, default=200)
+    args = parser.parse_args()
+    create_benchmark_app()
+    run(args.plans)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark dietary preference filtering against catalog size.
+
+Seeds recipes with random tag assignments and preference → tag rules, then
+compares the per-tag recipe bitsets held by the recipe index (cold: first use
+of a preference combination, warm: cached masks) with the equivalent
+EXISTS / NOT EXISTS join on recipe_tag_assignments.
+
+Usage (from backend/):
+    python -m benchmarks.bench_preference_filter [--sizes 1000 5000 20000] [--repeat 50]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.db import create_benchmark_app
+from benchmarks.synthetic import MEAL_TYPES
+
+TAG_COUNT = 24
+TAGS_PER_RECIPE = 3
+# (required tags, forbidden tags) per synthetic preference
+PREFERENCES = (((0,), ()), ((), (1, 2)), ((3,), (4,)))
+
+
+def seed_catalog(start: int, stop: int, rng: np.random.Generator):
+    """Insert recipes ``start..stop`` with random tags."""
+    from sqlalchemy import insert
+
+    from app.services.database_service import db
+    from app.models.sql_models import Recipe, RecipeTag, RecipeTagAssignment
+
+    tag_ids = [tag.id for tag in RecipeTag.query.order_by(RecipeTag.id)]
+    recipe_rows = [
+        {
+            'recipe_name': f'Bench {i}',
+            'meal_type': MEAL_TYPES[i % len(MEAL_TYPES)],
+            'total_calories': 400, 'total_protein': 25, 'total_carbs': 45, 'total_fat': 15,
+            'is_active': True
+        }
+        for i in range(start, stop)
+    ]
+    recipe_ids = [row.id for row in db.session.execute(insert(Recipe).returning(Recipe.id), recipe_rows)]
+
+    assignments = []
+    for recipe_id in recipe_ids:
+        for tag in rng.choice(len(tag_ids), size=TAGS_PER_RECIPE, replace=False):
+            assignments.append({'recipe_id': recipe_id, 'tag_id': tag_ids[int(tag)]})
+    db.session.execute(insert(RecipeTagAssignment), assignments)
+    db.session.commit()
+
+
+def seed_preferences():
+    """Create the tags and the synthetic preferences with their tag rules."""
+    from sqlalchemy import text
+
+    from app.services.database_service import db
+    from app.models.sql_models import DietaryPreference, DietaryPreferenceTag, RecipeTag
+
+    # Give the join baseline an index so it is not penalised by a full scan per recipe
+    db.session.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_bench_recipe_tag_assignments ON recipe_tag_assignments (recipe_id, tag_id)"
+    ))
+
+    tags = [RecipeTag(tag_name=f'Bench tag {i}') for i in range(TAG_COUNT)]
+    db.session.add_all(tags)
+    db.session.flush()
+
+    preference_ids = []
+    for i, (required, forbidden) in enumerate(PREFERENCES):
+        preference = DietaryPreference(preference_name=f'Bench preference {i}')
+        db.session.add(preference)
+        db.session.flush()
+        for tag, mode in [(t, 'require') for t in required] + [(t, 'forbid') for t in forbidden]:
+            db.session.add(DietaryPreferenceTag(preference_id=preference.id, tag_id=tags[tag].id, mode=mode))
+        preference_ids.append(preference.id)
+    db.session.commit()
+    return preference_ids, [tag.id for tag in tags]
+
+
+def join_filter(required, forbidden):
+    """Same filter expressed as joins on recipe_tag_assignments."""
+    from sqlalchemy import and_, exists
+
+    from app.services.database_service import db
+    from app.models.sql_models import Recipe, RecipeTagAssignment
+
+    def has_tag(tag_id):
+        return exists().where(and_(RecipeTagAssignment.recipe_id == Recipe.id, RecipeTagAssignment.tag_id == tag_id))
+
+    query = db.session.query(Recipe.id, Recipe.meal_type).filter(Recipe.is_active == True)
+    for tag_id in required:
+        query = query.filter(has_tag(tag_id))
+    for tag_id in forbidden:
+        query = query.filter(~has_tag(tag_id))
+    return query.all()
+
+
+def run(sizes, repeat: int):
+    from app.services.catalog_version import catalog_version
+    from app.services.recipe_index import recipe_compatibility_index
+
+    create_benchmark_app()
+    rng = np.random.default_rng(3)
+    preference_ids, tag_ids = seed_preferences()
+    combination = preference_ids[1:]
+    required = [tag_ids[t] for rule in PREFERENCES[1:] for t in rule[0]]
+    forbidden = [tag_ids[t] for rule in PREFERENCES[1:] for t in rule[1]]
+
+    header = f"{'recipes':>8} {'build ms':>9} {'cold ms':>8} {'warm µs':>8} {'join ms':>8} {'kept':>6}"
+    print(header)
+    print('-' * len(header))
+
+    seeded = 0
+    for size in sizes:
+        seed_catalog(seeded, size, rng)
+        seeded = size
+        catalog_version.mark_changed()
+
+        started = time.perf_counter()
+        recipe_compatibility_index.compatible_recipe_ids([])
+        build_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        compatible = recipe_compatibility_index.compatible_recipe_ids([], preference_ids=combination)
+        cold_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            recipe_compatibility_index.compatible_recipe_ids([], preference_ids=combination)
+        warm_us = (time.perf_counter() - started) / repeat * 1e6
+
+        started = time.perf_counter()
+        for _ in range(max(1, repeat // 10)):
+            rows = join_filter(required, forbidden)
+        join_ms = (time.perf_counter() - started) / max(1, repeat // 10) * 1000
+
+        kept = sum(len(ids) for ids in compatible.values())
+        assert kept == len(rows), (kept, len(rows))
+        print(f"{size:>8} {build_ms:>9.1f} {cold_ms:>8.2f} {warm_us:>8.1f} {join_ms:>8.2f} {kept:>6}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 5_000, 20_000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    run(sorted(args.sizes), args.repeat)
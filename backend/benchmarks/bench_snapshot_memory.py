@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-worker memory of the recipe catalog snapshot.
+
+Seeds a synthetic catalog, publishes the snapshot as .npy files (the
+RECIPE_SNAPSHOT_DIR path), then starts K worker processes that each load it
+either as private in-memory arrays (what every gunicorn worker holds without a
+snapshot directory) or memory-mapped read-only. All workers stay alive until
+each has touched every array and read its own RssAnon / Pss from
+/proc/self/smaps_rollup, so shared pages are split across them as they would
+be in a running server.
+
+Linux only (smaps_rollup). Usage (from backend/):
+    python -m benchmarks.bench_snapshot_memory [--sizes 10000 50000 200000] [--workers 4]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.db import create_benchmark_app
+from benchmarks.synthetic import MEAL_TYPES
+
+INGREDIENT_COUNT = 400
+INGREDIENTS_PER_RECIPE = 6
+TAG_COUNT = 24
+TAGS_PER_RECIPE = 3
+CATEGORIES = ('cereales', 'lácteos', 'proteínas', 'vegetales', 'frutas', 'embutidos', 'azúcares')
+
+
+def seed_catalog(start: int, stop: int, rng: np.random.Generator):
+    """Insert recipes ``start..stop`` with random ingredients and tags."""
+    from sqlalchemy import insert
+
+    from app.services.database_service import db
+    from app.models.sql_models import (
+        Ingredient, Recipe, RecipeIngredient, RecipeTag, RecipeTagAssignment
+    )
+
+    if not start:
+        db.session.add_all([
+            Ingredient(ingredient_name=f'Bench ingredient {i}', category=CATEGORIES[i % len(CATEGORIES)])
+            for i in range(INGREDIENT_COUNT)
+        ])
+        db.session.add_all([RecipeTag(tag_name=f'Bench tag {i}') for i in range(TAG_COUNT)])
+        db.session.flush()
+    ingredient_ids = [row.id for row in Ingredient.query.order_by(Ingredient.id)]
+    tag_ids = [row.id for row in RecipeTag.query.order_by(RecipeTag.id)]
+
+    recipe_rows = [
+        {
+            'recipe_name': f'Receta de prueba número {i}',
+            'meal_type': MEAL_TYPES[i % len(MEAL_TYPES)],
+            'total_calories': 400, 'total_protein': 25, 'total_carbs': 45, 'total_fat': 15,
+            'total_fiber': 6, 'is_active': True
+        }
+        for i in range(start, stop)
+    ]
+    recipe_ids = [row.id for row in db.session.execute(insert(Recipe).returning(Recipe.id), recipe_rows)]
+
+    links, assignments = [], []
+    for recipe_id in recipe_ids:
+        for i in rng.choice(len(ingredient_ids), size=INGREDIENTS_PER_RECIPE, replace=False):
+            links.append({'recipe_id': recipe_id, 'ingredient_id': ingredient_ids[int(i)], 'quantity': 1, 'unit': 'g'})
+        for i in rng.choice(len(tag_ids), size=TAGS_PER_RECIPE, replace=False):
+            assignments.append({'recipe_id': recipe_id, 'tag_id': tag_ids[int(i)]})
+    db.session.execute(insert(RecipeIngredient), links)
+    db.session.execute(insert(RecipeTagAssignment), assignments)
+    db.session.commit()
+
+
+def memory_kb() -> dict:
+    """RssAnon and Pss of the current process, in kB."""
+    values = {}
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('RssAnon:'):
+                values['rss_anon'] = int(line.split()[1])
+    with open('/proc/self/smaps_rollup') as rollup:
+        for line in rollup:
+            if line.startswith('Pss:'):
+                values['pss'] = int(line.split()[1])
+    return values
+
+
+def worker(path: str, fields, mmap: bool, barrier, results):
+    """Load the snapshot arrays, touch every page and report memory growth."""
+    before = memory_kb()
+    arrays = {
+        field: np.load(os.path.join(path, f'{field}.npy'), mmap_mode='r' if mmap else None)
+        for field in fields
+    }
+    # Read every byte in place so no temporary copies count towards the worker's memory
+    checksum = sum(int(array.reshape(-1).view(np.uint8).sum(dtype=np.uint64)) for array in arrays.values())
+    barrier.wait()
+    after = memory_kb()
+    results.put({key: after[key] - before[key] for key in after})
+    # Keep the mapping alive until every worker has measured
+    barrier.wait()
+    return checksum
+
+
+def measure(path: str, fields, workers: int, mmap: bool) -> dict:
+    """Mean per-worker growth of RssAnon and Pss across ``workers`` live processes."""
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(path, fields, mmap, barrier, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {key: sum(sample[key] for sample in samples) / len(samples) for key in samples[0]}
+
+
+def run(sizes, workers: int):
+    from app.services.recipe_catalog import ARRAY_FIELDS, recipe_catalog
+    from app.services.catalog_version import catalog_version
+
+    app = create_benchmark_app()
+    snapshot_dir = tempfile.mkdtemp(prefix='recipe-snapshot-bench-')
+    app.config['RECIPE_SNAPSHOT_DIR'] = snapshot_dir
+    rng = np.random.default_rng(5)
+
+    header = (f"{'recipes':>8} {'files MB':>9} {'publish ms':>10} {'map ms':>8} "
+              f"{'private RssAnon':>16} {'private Pss':>12} {'mmap RssAnon':>13} {'mmap Pss':>9}")
+    print(f"{workers} workers, memory growth per worker in MB")
+    print(header)
+    print('-' * len(header))
+
+    seeded = 0
+    for size in sizes:
+        seed_catalog(seeded, size, rng)
+        seeded = size
+        catalog_version.mark_changed()
+
+        started = time.perf_counter()
+        recipe_catalog.snapshot()
+        publish_ms = (time.perf_counter() - started) * 1000
+
+        # A second worker finds the published version and only maps it
+        recipe_catalog.invalidate()
+        catalog_version.current()
+        started = time.perf_counter()
+        recipe_catalog.snapshot()
+        load_ms = (time.perf_counter() - started) * 1000
+
+        path = os.path.join(snapshot_dir, f'v-{catalog_version.fingerprint_key()}')
+        files_mb = sum(entry.stat().st_size for entry in os.scandir(path)) / 2 ** 20
+        private = measure(path, ARRAY_FIELDS, workers, mmap=False)
+        shared = measure(path, ARRAY_FIELDS, workers, mmap=True)
+        print(f"{size:>8} {files_mb:>9.1f} {publish_ms:>10.0f} {load_ms:>8.1f} "
+              f"{private['rss_anon'] / 1024:>16.1f} {private['pss'] / 1024:>12.1f} "
+              f"{shared['rss_anon'] / 1024:>13.1f} {shared['pss'] / 1024:>9.1f}")
+
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 50_000, 200_000])
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    run(sorted(args.sizes), args.workers)
@@ -0,0 +1,65 @@
+"""
+Database helpers for benchmarks: an app bound to a throwaway database and a
+statement / commit counter.
+"""
+import os
+
+from sqlalchemy import event
+
+from app import create_app
+from app.services.database_service import db, create_tables
+
+DEFAULT_DATABASE_URL = 'sqlite://'
+
+
+def create_benchmark_app(database_url: str = None):
+    """
+    Create an app with an application context pushed and the schema created.
+
+    ``database_url`` defaults to ``BENCHMARK_DATABASE_URL`` or an in-memory SQLite
+    database. Point it at a scratch Postgres database to measure pg8000 round trips.
+    """
+    database_url = database_url or os.getenv('BENCHMARK_DATABASE_URL') or DEFAULT_DATABASE_URL
+
+    if database_url.startswith('sqlite'):
+        # The Postgres engine options in create_app do not apply to SQLite
+        os.environ.pop('DATABASE_URL', None)
+        app = create_app('testing')
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(app)
+    else:
+        os.environ['DATABASE_URL'] = database_url
+        app = create_app('testing')
+
+    app.app_context().push()
+    create_tables()
+    return app
+
+
+class StatementCounter:
+    """Count SQL statements and commits issued through ``db.engine``."""
+
+    def __init__(self):
+        self.statements = 0
+        self.commits = 0
+
+    def __enter__(self):
+        event.listen(db.engine, 'before_cursor_execute', self._on_statement)
+        event.listen(db.engine, 'commit', self._on_commit)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(db.engine, 'before_cursor_execute', self._on_statement)
+        event.remove(db.engine, 'commit', self._on_commit)
+        return False
+
+    @property
+    def round_trips(self) -> int:
+        return self.statements + self.commits
+
+    def _on_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements += 1
+
+    def _on_commit(self, conn):
+        self.commits += 1
@@ -0,0 +1,27 @@
+"""
+Synthetic recipe catalogs for benchmarks.
+"""
+from typing import Dict
+
+import numpy as np
+
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner')
+
+# Mean calories / protein / carbs / fat per meal type, roughly matching seed_data.py
+MEAL_TYPE_PROFILES = {
+    'breakfast': (330.0, 15.0, 45.0, 10.0),
+    'lunch': (600.0, 35.0, 65.0, 20.0),
+    'dinner': (450.0, 30.0, 40.0, 17.0),
+}
+
+
+def synthetic_macros(n_recipes: int, seed: int = 0) -> Dict[str, np.ndarray]:
+    """Build (n, 4) macro arrays per meal type for a catalog of ``n_recipes`` recipes."""
+    rng = np.random.default_rng(seed)
+    per_type = max(7, n_recipes // len(MEAL_TYPES))
+    catalog = {}
+    for meal_type in MEAL_TYPES:
+        means = np.array(MEAL_TYPE_PROFILES[meal_type])
+        # Wide spread so a random week can swing far from the daily targets
+        catalog[meal_type] = np.clip(rng.normal(means, means * 0.35, size=(per_type, 4)), 0, None)
+    return catalog
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Background job worker.
+
+Processes the background_jobs queue (e.g. meal plan generation after a patient
+completes their profile). Run one or more of these alongside the API with
+JOB_QUEUE_MODE=worker.
+
+Usage:
+    python run_worker.py [--poll-interval 2] [--once] [--type generate_meal_plan]
+"""
+import argparse
+import signal
+import threading
+
+from app import create_app
+from app.services.job_queue import job_queue
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Process background jobs')
+    parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+    parser.add_argument('--once', action='store_true', help='Process available jobs and exit')
+    parser.add_argument('--type', dest='job_types', action='append', help='Only process this job type (repeatable)')
+    args = parser.parse_args()
+
+    app = create_app()
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        print("🛑 Stopping worker after the current job...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    with app.app_context():
+        if args.once:
+            processed = job_queue.run_pending(job_types=args.job_types)
+            print(f"✅ Processed {processed} jobs")
+        else:
+            print(f"🚀 Worker started (poll interval {args.poll_interval}s)")
+            job_queue.work(poll_interval=args.poll_interval, stop_event=stop_event, job_types=args.job_types)
+
+
+if __name__ == '__main__':
+    main()
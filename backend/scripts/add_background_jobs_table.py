@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Migration: Create the background_jobs table used by the job queue
+(asynchronous meal plan generation after profile completion).
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.services.database_service import db
+from app.models.sql_models import BackgroundJob
+
+def add_background_jobs_table():
+    """Create the background_jobs table and its indexes."""
+
+    app = create_app()
+
+    with app.app_context():
+        try:
+            print("🔧 Creating background_jobs table (if missing)...")
+            BackgroundJob.__table__.create(db.engine, checkfirst=True)
+
+            total = db.session.query(BackgroundJob).count()
+            print(f"✅ background_jobs ready ({total} jobs)")
+            print("ℹ️  Run `python run_worker.py` with JOB_QUEUE_MODE=worker to process jobs out of process")
+            return True
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Migration failed: {e}")
+            return False
+
+if __name__ == "__main__":
+    success = add_background_jobs_table()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Migration: Create dietary_preference_tags table and seed the default
+preference → recipe tag rules (plus the tags and sample recipe tagging they use).
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.services.database_service import db
+from app.models.sql_models import DietaryPreferenceTag
+
+def add_dietary_preference_tags_table():
+    """Create the dietary_preference_tags table and seed the default rules."""
+
+    app = create_app()
+
+    with app.app_context():
+        try:
+            print("🔧 Creating dietary_preference_tags table (if missing)...")
+            DietaryPreferenceTag.__table__.create(db.engine, checkfirst=True)
+
+            from seed_data import seed_recipe_tags, seed_dietary_preference_tags, seed_recipe_tag_assignments
+
+            print("🌱 Seeding dietary preference → recipe tag rules...")
+            seed_recipe_tags()
+            seed_dietary_preference_tags()
+            seed_recipe_tag_assignments()
+            db.session.commit()
+
+            total = db.session.query(DietaryPreferenceTag).count()
+            print(f"✅ dietary_preference_tags ready ({total} rules)")
+            print("ℹ️  Rules can be managed via /api/catalogs/dietary-preferences/<id>/tags")
+            return True
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Migration failed: {e}")
+            return False
+
+if __name__ == "__main__":
+    success = add_dietary_preference_tags_table()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Migration: Create intolerance_ingredients table and seed it from the
+intolerance → ingredient mapping previously hardcoded in the meal plan generator.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.services.database_service import db
+from app.models.sql_models import IntoleranceIngredient
+
+def add_intolerance_ingredients_table():
+    """Create the intolerance_ingredients table and seed the default mapping."""
+
+    app = create_app()
+
+    with app.app_context():
+        try:
+            print("🔧 Creating intolerance_ingredients table (if missing)...")
+            IntoleranceIngredient.__table__.create(db.engine, checkfirst=True)
+
+            from seed_data import seed_intolerance_ingredients
+
+            print("🌱 Seeding intolerance → ingredient mapping...")
+            seed_intolerance_ingredients()
+            db.session.commit()
+
+            total = db.session.query(IntoleranceIngredient).count()
+            print(f"✅ intolerance_ingredients ready ({total} mappings)")
+            print("ℹ️  Ingredient name variants can be mapped via /api/catalogs/food-intolerances/<id>/ingredients")
+            return True
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Migration failed: {e}")
+            return False
+
+if __name__ == "__main__":
+    success = add_intolerance_ingredients_table()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Migration: Add meal_plan_meals.meal_date so plans can span more than one week,
+and backfill it for existing single-week plans from start_date + day_of_week.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app import create_app
+from app.services.database_service import db
+
+def add_meal_date_column():
+    """Add and backfill the meal_date column."""
+
+    app = create_app()
+
+    with app.app_context():
+        try:
+            print("🔧 Adding meal_date column to meal_plan_meals (if missing)...")
+            db.session.execute(text("ALTER TABLE meal_plan_meals ADD COLUMN IF NOT EXISTS meal_date DATE"))
+
+            print("🔄 Backfilling meal_date for single-week plans...")
+            result = db.session.execute(text("""
+                UPDATE meal_plan_meals m
+                SET meal_date = p.start_date + ((
+                    array_position(
+                        ARRAY['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday'],
+                        m.day_of_week::text
+                    ) - EXTRACT(ISODOW FROM p.start_date)::int + 7
+                ) % 7)
+                FROM meal_plans p
+                WHERE m.plan_id = p.id
+                  AND m.meal_date IS NULL
+                  AND p.end_date - p.start_date < 7
+            """))
+
+            db.session.commit()
+            print(f"✅ meal_date ready ({result.rowcount} meals backfilled)")
+            return True
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Migration failed: {e}")
+            return False
+
+if __name__ == "__main__":
+    success = add_meal_date_column()
+    sys.exit(0 if success else 1)
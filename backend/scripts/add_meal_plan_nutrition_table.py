@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Migration: Create the meal_plan_nutrition table (per-plan, per-day nutrition
+totals) and backfill it for existing meal plans.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.services.database_service import db
+from app.services.plan_nutrition import plan_nutrition
+from app.models.sql_models import MealPlan, MealPlanNutrition
+
+BACKFILL_BATCH = 2000
+
+def add_meal_plan_nutrition_table():
+    """Create and backfill the meal_plan_nutrition table."""
+
+    app = create_app()
+
+    with app.app_context():
+        try:
+            print("🔧 Creating meal_plan_nutrition table (if missing)...")
+            MealPlanNutrition.__table__.create(db.engine, checkfirst=True)
+
+            print("🔄 Backfilling per-day nutrition for existing plans...")
+            plan_ids = db.session.execute(
+                db.select(MealPlan.id).where(
+                    ~MealPlan.id.in_(db.select(MealPlanNutrition.plan_id).distinct())
+                ).order_by(MealPlan.id)
+            ).scalars().all()
+
+            rows = 0
+            for start in range(0, len(plan_ids), BACKFILL_BATCH):
+                rows += plan_nutrition.refresh(db.session, plan_ids[start:start + BACKFILL_BATCH])
+                db.session.commit()
+                print(f"   {min(start + BACKFILL_BATCH, len(plan_ids))}/{len(plan_ids)} plans")
+
+            print(f"✅ meal_plan_nutrition ready ({len(plan_ids)} plans, {rows} day rows backfilled)")
+            print("ℹ️  Per-day nutrition is available via /api/nutritionist/meal-plans/<plan_id>/nutrition")
+            return True
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Migration failed: {e}")
+            return False
+
+if __name__ == "__main__":
+    success = add_meal_plan_nutrition_table()
+    sys.exit(0 if success else 1)
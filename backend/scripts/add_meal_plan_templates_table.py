@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Migration: Create the meal_plan_templates table used by bulk template assignment.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.services.database_service import db
+from app.models.sql_models import MealPlanTemplate
+
+def add_meal_plan_templates_table():
+    """Create the meal_plan_templates table."""
+
+    app = create_app()
+
+    with app.app_context():
+        try:
+            print("🔧 Creating meal_plan_templates table (if missing)...")
+            MealPlanTemplate.__table__.create(db.engine, checkfirst=True)
+
+            total = db.session.query(MealPlanTemplate).count()
+            print(f"✅ meal_plan_templates ready ({total} templates)")
+            print("ℹ️  Templates can be managed via /api/nutritionist/meal-plan-templates")
+            return True
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Migration failed: {e}")
+            return False
+
+if __name__ == "__main__":
+    success = add_meal_plan_templates_table()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Migration: Create medical_condition_rules table and seed the default
+per-meal dietary rules for the medical conditions catalog.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.services.database_service import db
+from app.models.sql_models import MedicalConditionRule
+
+def add_medical_condition_rules_table():
+    """Create the medical_condition_rules table and seed the default rules."""
+
+    app = create_app()
+
+    with app.app_context():
+        try:
+            print("🔧 Creating medical_condition_rules table (if missing)...")
+            MedicalConditionRule.__table__.create(db.engine, checkfirst=True)
+
+            from seed_data import seed_medical_condition_rules
+
+            print("🌱 Seeding medical condition rules...")
+            seed_medical_condition_rules()
+            db.session.commit()
+
+            total = db.session.query(MedicalConditionRule).count()
+            print(f"✅ medical_condition_rules ready ({total} rules)")
+            print("ℹ️  Rules can be managed via /api/catalogs/medical-conditions/<id>/rules")
+            return True
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Migration failed: {e}")
+            return False
+
+if __name__ == "__main__":
+    success = add_medical_condition_rules_table()
+    sys.exit(0 if success else 1)
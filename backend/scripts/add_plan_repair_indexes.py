@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Migration: Add the indexes behind the ingredient → recipe → meal plan slot
+reverse lookup used by automatic plan repair.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app import create_app
+from app.services.database_service import db
+
+INDEXES = [
+    ("ix_meal_plan_meals_recipe_id", "meal_plan_meals", "recipe_id"),
+    ("ix_recipe_ingredients_ingredient_id", "recipe_ingredients", "ingredient_id"),
+]
+
+def add_plan_repair_indexes():
+    """Create the reverse lookup indexes if they are missing."""
+
+    app = create_app()
+
+    with app.app_context():
+        try:
+            for index_name, table, column in INDEXES:
+                print(f"🔧 Creating {index_name} on {table}({column}) (if missing)...")
+                db.session.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({column})"))
+
+            db.session.commit()
+            print("✅ Plan repair indexes ready")
+            return True
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Migration failed: {e}")
+            return False
+
+if __name__ == "__main__":
+    success = add_plan_repair_indexes()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Migration: Add recipes.view_fragments (tags, ingredient lines and instruction
+steps for the public plan view) and backfill it for existing recipes.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app import create_app
+from app.services.database_service import db
+from app.services.recipe_fragments import recipe_fragments
+from app.models.sql_models import Recipe
+
+def add_recipe_view_fragments_column():
+    """Add and backfill the view_fragments column."""
+
+    app = create_app()
+
+    with app.app_context():
+        try:
+            print("🔧 Adding view_fragments column to recipes (if missing)...")
+            db.session.execute(text("ALTER TABLE recipes ADD COLUMN IF NOT EXISTS view_fragments JSON"))
+            db.session.commit()
+
+            print("🔄 Backfilling view_fragments...")
+            recipe_ids = db.session.execute(
+                db.select(Recipe.id).where(Recipe.view_fragments.is_(None))
+            ).scalars().all()
+            updated = recipe_fragments.refresh(db.session, recipe_ids)
+
+            db.session.commit()
+            print(f"✅ view_fragments ready ({updated} recipes backfilled)")
+            return True
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Migration failed: {e}")
+            return False
+
+if __name__ == "__main__":
+    success = add_recipe_view_fragments_column()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Test script to verify that plan repair sees catalog changes made by another process.
+
+Runs against a throwaway in-memory database: generates a plan, warms the
+recipe indexes, deactivates one of the plan's recipes without going through
+this process's session listeners (as the web process would) and runs the
+repair job right away, well inside CATALOG_VERSION_TTL.
+"""
+import os
+import sys
+from datetime import date, datetime
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.db import create_benchmark_app
+
+
+def test_plan_repair():
+    """Test that a repair job enqueued right after a recipe is deactivated replaces the slot."""
+    app = create_benchmark_app()
+    app.config['JOB_QUEUE_MODE'] = 'worker'
+    app.config['CATALOG_VERSION_TTL'] = 3600
+
+    from sqlalchemy import update
+    from app.services.database_service import db
+    from app.services.job_queue import job_queue
+    from app.services.meal_plan_generator import meal_plan_generator
+    from app.services.plan_repair import plan_repair_service
+    from app.models.sql_models import BackgroundJob, MealPlan, Patient, Recipe
+    from seed_data import seed_all_data
+
+    print("🔍 Testing Plan Repair")
+    print("=" * 50)
+
+    seed_all_data()
+    patient = Patient(first_name='Repair', last_name='Patient', date_of_birth=date(1990, 1, 1), gender='female')
+    db.session.add(patient)
+    db.session.commit()
+
+    result = meal_plan_generator.generate_for_new_patient(patient.id, 'repair')
+    plan = db.session.get(MealPlan, result['plan_id'])
+    recipe_id = plan.meals[0].recipe_id
+
+    # Warm the cached indexes while the recipe is still active
+    meal_plan_generator.filter_compatible_recipes(meal_plan_generator.get_patient_with_restrictions(patient.id))
+
+    # Test 1: deactivate the recipe "from another process" (Core update, no session listeners)
+    db.session.execute(
+        update(Recipe).where(Recipe.id == recipe_id).values(is_active=False, updated_at=datetime.utcnow())
+    )
+    plan_repair_service.enqueue_repair(recipe_ids=[recipe_id])
+    db.session.commit()
+    job_queue.run_pending()
+
+    job = BackgroundJob.query.filter_by(job_type='repair_plans').one()
+    if job.status != 'completed' or not job.result.get('plans_repaired'):
+        print(f"❌ Repair job did not repair the plan: {job.status} {job.result}")
+        return False
+    print(f"✅ Repair job repaired the plan: {job.result}")
+
+    # Test 2: the latest version no longer uses the deactivated recipe
+    latest = MealPlan.query.filter_by(patient_id=patient.id, is_latest=True).one()
+    if latest.id == plan.id or any(meal.recipe_id == recipe_id for meal in latest.meals):
+        print("❌ Latest plan still uses the deactivated recipe")
+        return False
+    print("✅ Deactivated recipe replaced in the latest plan")
+
+    return True
+
+
+if __name__ == "__main__":
+    success = test_plan_repair()
+    print("\n" + ("🎉 Repair test passed" if success else "❌ Repair test failed"))
+    sys.exit(0 if success else 1)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test script to verify that plan rollover keeps serving the approved plan.
+
+Runs against a throwaway in-memory database: generates an approved plan for a
+patient, runs the rollover, and checks that the patient endpoints still return
+the approved plan until the nutritionist approves the successor draft.
+"""
+import os
+import sys
+from datetime import date
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.db import create_benchmark_app
+
+
+def test_plan_rollover():
+    """Test that the patient view keeps the approved plan while its successor is a draft."""
+    app = create_benchmark_app()
+
+    from app.services.database_service import db
+    from app.services.meal_plan_generator import meal_plan_generator
+    from app.services.meal_plan_versioning_service import MealPlanVersioningService
+    from app.services.plan_rollover import plan_rollover_service
+    from app.models.sql_models import MealPlan, Nutritionist, Patient, PatientInvitation
+    from seed_data import seed_all_data
+
+    print("🔍 Testing Plan Rollover")
+    print("=" * 50)
+
+    seed_all_data()
+    nutritionist = Nutritionist(firebase_uid='rollover', email='rollover@example.com', first_name='Roll', last_name='Over')
+    db.session.add(nutritionist)
+    db.session.flush()
+    invitation = PatientInvitation(email='patient@example.com', invited_by_uid='rollover',
+                                   nutritionist_id=nutritionist.id)
+    db.session.add(invitation)
+    db.session.flush()
+    patient = Patient(first_name='Roll', last_name='Patient', date_of_birth=date(1990, 1, 1), gender='female',
+                      invitation_id=invitation.id)
+    db.session.add(patient)
+    db.session.commit()
+
+    result = meal_plan_generator.generate_for_new_patient(patient.id, 'rollover')
+    approved_plan = db.session.get(MealPlan, result['plan_id'])
+    approved_plan.nutritionist_id = nutritionist.id
+    db.session.commit()
+
+    client = app.test_client()
+
+    def served_plan_id():
+        response = client.get(f'/api/patient/meal-plan/{invitation.token}')
+        summary = client.get(f'/api/patient/meal-plan/{invitation.token}/summary')
+        if response.status_code != 200 or summary.status_code != 200:
+            print(f"❌ Patient endpoints answered {response.status_code} / {summary.status_code}")
+            return None
+        return response.get_json()['data']['meal_plan']['id']
+
+    if served_plan_id() != approved_plan.id:
+        print("❌ Approved plan not served before the rollover")
+        return False
+    print("✅ Approved plan served before the rollover")
+
+    # Test 1: the rollover creates a draft successor
+    summary = plan_rollover_service.rollover(today=approved_plan.end_date)
+    successor = MealPlan.query.filter_by(parent_plan_id=approved_plan.id).first()
+    if summary['generated'] != 1 or successor is None or successor.status != 'draft':
+        print(f"❌ Rollover did not create a draft successor: {summary}")
+        return False
+    print(f"✅ Draft successor created ({successor.start_date} - {successor.end_date})")
+
+    # Test 2: the patient still sees the approved plan
+    if served_plan_id() != approved_plan.id:
+        print("❌ Approved plan no longer served after the rollover")
+        return False
+    print("✅ Approved plan still served after the rollover")
+
+    # Test 3: running the rollover again does not duplicate the successor
+    summary = plan_rollover_service.rollover(today=approved_plan.end_date)
+    if summary['generated'] != 0 or MealPlan.query.filter_by(parent_plan_id=approved_plan.id).count() != 1:
+        print(f"❌ Second rollover generated another successor: {summary}")
+        return False
+    print("✅ Second rollover skipped the plan that already has a successor")
+
+    # Test 4: approving the successor makes it the plan the patient sees
+    success, _, error = MealPlanVersioningService.approve_meal_plan_version(successor.id, nutritionist.id)
+    if not success or served_plan_id() != successor.id:
+        print(f"❌ Approved successor not served: {error}")
+        return False
+    print("✅ Approved successor served")
+
+    return True
+
+
+if __name__ == "__main__":
+    success = test_plan_rollover()
+    print("\n" + ("🎉 Rollover test passed" if success else "❌ Rollover test failed"))
+    sys.exit(0 if success else 1)
@@ -3,11 +3,62 @@ Datos de ejemplo para el sistema de recetas dietéticas.
 """
 from app.services.database_service import db
 from app.models.sql_models import (
-    MedicalCondition, FoodIntolerance, DietaryPreference,
-    Ingredient, Recipe, RecipeIngredient, RecipeTag, RecipeTagAssignment
+    MedicalCondition, MedicalConditionRule, FoodIntolerance, DietaryPreference,
+    Ingredient, IntoleranceIngredient, Recipe, RecipeIngredient, RecipeTag, RecipeTagAssignment,
+    DietaryPreferenceTag
 )
+from sqlalchemy import func
 from decimal import Decimal
 
+# Mapeo inicial de intolerancias a ingredientes restringidos
+INTOLERANCE_INGREDIENTS = {
+    'Lactosa': ['leche', 'queso', 'yogur', 'mantequilla', 'crema'],
+    'Gluten': ['harina de trigo', 'avena', 'cebada', 'centeno'],
+    'Nueces': ['nueces', 'almendras', 'pistachos', 'avellanas'],
+    'Mariscos': ['camarones', 'langosta', 'cangrejo', 'mejillones'],
+    'Huevo': ['huevo', 'clara de huevo', 'yema de huevo'],
+    'Soya': ['salsa de soya', 'tofu', 'tempeh', 'leche de soya']
+}
+
+# Reglas iniciales por condición médica (valores por comida)
+MEDICAL_CONDITION_RULES = {
+    'Diabetes Tipo 1': [
+        {'rule_type': 'max_nutrient', 'nutrient': 'carbs', 'value': 60},
+        {'rule_type': 'exclude_category', 'category': 'azúcares'}
+    ],
+    'Diabetes Tipo 2': [
+        {'rule_type': 'max_nutrient', 'nutrient': 'carbs', 'value': 45},
+        {'rule_type': 'exclude_category', 'category': 'azúcares'}
+    ],
+    'Hipertensión': [
+        {'rule_type': 'exclude_category', 'category': 'embutidos'},
+        {'rule_type': 'exclude_category', 'category': 'enlatados'}
+    ],
+    'Enfermedad Cardiovascular': [
+        {'rule_type': 'max_nutrient', 'nutrient': 'fat', 'value': 20},
+        {'rule_type': 'exclude_category', 'category': 'embutidos'}
+    ],
+    'Enfermedad Renal': [
+        {'rule_type': 'max_nutrient', 'nutrient': 'protein', 'value': 40}
+    ],
+    'Obesidad': [
+        {'rule_type': 'max_nutrient', 'nutrient': 'calories', 'value': 600}
+    ]
+}
+
+# Etiquetas exigidas / prohibidas por preferencia dietética
+PREFERENCE_TAGS = {
+    'Vegetariano': {'forbid': ['Con Carne', 'Con Pescado']},
+    'Vegano': {'require': ['Vegano']},
+    'Pescetariano': {'forbid': ['Con Carne']}
+}
+
+# Etiquetas que se asignan a las recetas que contienen el ingrediente
+INGREDIENT_RECIPE_TAGS = {
+    'pechuga de pollo': ['Con Carne'],
+    'salmón': ['Con Pescado']
+}
+
 def seed_all_data():
     """Sembrar todos los datos de ejemplo."""
     try:
@@ -16,8 +67,12 @@ def seed_all_data():
         seed_food_intolerances()
         seed_dietary_preferences()
         seed_ingredients()
+        seed_intolerance_ingredients()
+        seed_medical_condition_rules()
         seed_recipe_tags()
+        seed_dietary_preference_tags()
         seed_sample_recipes()
+        seed_recipe_tag_assignments()
         
         db.session.commit()
         print("✅ Todos los datos fueron sembrados exitosamente")
@@ -109,6 +164,54 @@ def seed_ingredients():
             ingredient = Ingredient(**ingredient_data)
             db.session.add(ingredient)
 
+def seed_intolerance_ingredients():
+    """Sembrar el mapeo de intolerancias a ingredientes."""
+    db.session.flush()  # Para obtener los IDs de intolerancias e ingredientes
+    
+    for intolerance_name, ingredient_names in INTOLERANCE_INGREDIENTS.items():
+        intolerance = db.session.query(FoodIntolerance).filter(
+            FoodIntolerance.intolerance_name == intolerance_name
+        ).first()
+        if not intolerance:
+            continue
+        
+        # Coincidencia sin distinguir mayúsculas; las variantes se agregan desde el catálogo
+        ingredients = db.session.query(Ingredient).filter(
+            func.lower(Ingredient.ingredient_name).in_(ingredient_names)
+        ).all()
+        
+        for ingredient in ingredients:
+            existing = db.session.query(IntoleranceIngredient).filter(
+                IntoleranceIngredient.intolerance_id == intolerance.id,
+                IntoleranceIngredient.ingredient_id == ingredient.id
+            ).first()
+            if not existing:
+                db.session.add(IntoleranceIngredient(
+                    intolerance_id=intolerance.id,
+                    ingredient_id=ingredient.id
+                ))
+
+def seed_medical_condition_rules():
+    """Sembrar las reglas dietéticas de las condiciones médicas."""
+    db.session.flush()  # Para obtener los IDs de condiciones
+    
+    for condition_name, rules in MEDICAL_CONDITION_RULES.items():
+        condition = db.session.query(MedicalCondition).filter(
+            MedicalCondition.condition_name == condition_name
+        ).first()
+        if not condition:
+            continue
+        
+        for rule_data in rules:
+            existing = db.session.query(MedicalConditionRule).filter(
+                MedicalConditionRule.condition_id == condition.id,
+                MedicalConditionRule.rule_type == rule_data['rule_type'],
+                MedicalConditionRule.nutrient == rule_data.get('nutrient'),
+                MedicalConditionRule.category == rule_data.get('category')
+            ).first()
+            if not existing:
+                db.session.add(MedicalConditionRule(condition_id=condition.id, **rule_data))
+
 def seed_recipe_tags():
     """Sembrar tags de recetas."""
     tags = [
@@ -121,7 +224,9 @@ def seed_recipe_tags():
         {'tag_name': 'Vegano', 'color': '#22c55e'},
         {'tag_name': 'Energético', 'color': '#f97316'},
         {'tag_name': 'Nutritivo', 'color': '#059669'},
-        {'tag_name': 'Ligero', 'color': '#7c3aed'}
+        {'tag_name': 'Ligero', 'color': '#7c3aed'},
+        {'tag_name': 'Con Carne', 'color': '#b91c1c'},
+        {'tag_name': 'Con Pescado', 'color': '#0369a1'}
     ]
     
     for tag_data in tags:
@@ -132,6 +237,50 @@ def seed_recipe_tags():
             tag = RecipeTag(**tag_data)
             db.session.add(tag)
 
+def seed_dietary_preference_tags():
+    """Sembrar el mapeo de preferencias dietéticas a etiquetas de recetas."""
+    db.session.flush()  # Para obtener los IDs de preferencias y etiquetas
+    
+    for preference_name, modes in PREFERENCE_TAGS.items():
+        preference = db.session.query(DietaryPreference).filter(
+            DietaryPreference.preference_name == preference_name
+        ).first()
+        if not preference:
+            continue
+        
+        for mode, tag_names in modes.items():
+            tags = db.session.query(RecipeTag).filter(RecipeTag.tag_name.in_(tag_names)).all()
+            for tag in tags:
+                existing = db.session.query(DietaryPreferenceTag).filter(
+                    DietaryPreferenceTag.preference_id == preference.id,
+                    DietaryPreferenceTag.tag_id == tag.id
+                ).first()
+                if not existing:
+                    db.session.add(DietaryPreferenceTag(
+                        preference_id=preference.id,
+                        tag_id=tag.id,
+                        mode=mode
+                    ))
+
+def seed_recipe_tag_assignments():
+    """Etiquetar las recetas según los ingredientes que contienen."""
+    db.session.flush()  # Para obtener los IDs de recetas
+    
+    for ingredient_name, tag_names in INGREDIENT_RECIPE_TAGS.items():
+        recipe_ids = [row.recipe_id for row in db.session.query(RecipeIngredient.recipe_id).join(
+            Ingredient, Ingredient.id == RecipeIngredient.ingredient_id
+        ).filter(func.lower(Ingredient.ingredient_name) == ingredient_name).distinct()]
+        
+        for tag in db.session.query(RecipeTag).filter(RecipeTag.tag_name.in_(tag_names)).all():
+            tagged = {
+                row.recipe_id for row in db.session.query(RecipeTagAssignment.recipe_id).filter(
+                    RecipeTagAssignment.tag_id == tag.id
+                )
+            }
+            for recipe_id in recipe_ids:
+                if recipe_id not in tagged:
+                    db.session.add(RecipeTagAssignment(recipe_id=recipe_id, tag_id=tag.id))
+
 def seed_sample_recipes():
     """Sembrar recetas de ejemplo."""
     db.session.flush()  # Para obtener los IDs de ingredientes
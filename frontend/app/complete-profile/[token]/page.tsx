@@ -158,6 +158,24 @@ export default function CompleteProfile() {
     return null;
   };
 
+  const waitForMealPlan = async (): Promise<string | null> => {
+    // Consultar el estado de la generación hasta ~60 segundos
+    for (let attempt = 0; attempt < 30; attempt++) {
+      await new Promise(resolve => setTimeout(resolve, 2000));
+      try {
+        const statusResponse = await fetch(`${API_BASE_URL}/api/public/profiles/${token}/plan-status`);
+        if (!statusResponse.ok) continue;
+        
+        const statusData = await statusResponse.json();
+        if (statusData.plan_status === 'completed') return statusData.meal_plan_token;
+        if (statusData.plan_status === 'failed') return null;
+      } catch (error) {
+        console.error('Error checking plan status:', error);
+      }
+    }
+    return null;
+  };
+
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     
@@ -182,9 +200,12 @@ export default function CompleteProfile() {
       const data = await response.json();
       
       if (response.ok && data.success) {
+        // El plan se genera en segundo plano: esperar a que esté listo
+        const mealPlanToken = data.meal_plan_token || (data.plan_status_url ? await waitForMealPlan() : null);
+        
         // Redirigir al plan de comidas si se generó exitosamente
-        if (data.meal_plan_token) {
-          router.push(`/my-meal-plan/${data.meal_plan_token}`);
+        if (mealPlanToken) {
+          router.push(`/my-meal-plan/${mealPlanToken}`);
         } else {
           // Mostrar mensaje de éxito sin plan
           setError(null);
@@ -39,6 +39,7 @@ interface Meal {
 interface DayMeals {
   day: string;
   day_of_week: string;
+  date: string;
   meals: Meal[];
 }
 
@@ -337,7 +338,9 @@ export default function ViewMealPlan() {
             <div key={dayIndex} className="bg-white rounded-2xl shadow-sm overflow-hidden">
               {/* Day Header */}
               <div className="bg-gray-50 px-6 py-4 border-b border-gray-100">
-                <h2 className="text-xl font-semibold text-gray-900">{dayMeals.day}</h2>
+                <h2 className="text-xl font-semibold text-gray-900">
+                  {dayMeals.day} {new Date(`${dayMeals.date}T00:00:00`).toLocaleDateString('es-ES', { day: 'numeric', month: 'short' })}
+                </h2>
               </div>
               
               {/* Meals */}
@@ -629,7 +629,7 @@ export default function PatientInvitationPage() {
               {Object.entries(calendar).map(([day, meals]) => (
                 <div key={day} className="meal-day">
                   <h3 className="text-xl font-medium text-gray-900 mb-4 capitalize">
-                    {day}
+                    {new Date(`${day}T00:00:00`).toLocaleDateString(undefined, { weekday: 'long', day: 'numeric', month: 'short' })}
                   </h3>
                   
                   <div className="grid grid-cols-1 md:grid-cols-3 gap-4">